@@ -1,6 +1,14 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+import pandas as pd
 from pathlib import Path
 
 DataFolder = Path("./sample_datasets/")
+ProcessedDataFolder = Path("./data/")
 
 ## Color global variables
 TO_OTHER = "#556B2F"
@@ -85,4 +93,393 @@ US_STATE_ABBRV = {
     "West Virginia": "WV",
     "Wisconsin": "WI",
     "Wyoming": "WY",
-}
\ No newline at end of file
+}
+
+########################################################################################
+# Registry of the raw source files
+#
+# The same raw files (e.g. countypres_2000-2020.csv) are read by several ETL functions during a packaging run.
+# readSourceData parses each file once per process and keeps the dataframe in memory for the following calls.
+########################################################################################
+_source_cache = {}
+_source_cache_stats = {}
+
+
+def readSourceData(source, copy: bool = True, **read_kwargs):
+    """
+    This function reads a raw source file (CSV, zipped CSV or Excel file, local path or URL) only once per process
+    and returns the cached dataframe for the following calls with the same read arguments. URLs are downloaded
+    through the HTTP cache of EtlFetch.fetchUrl.
+
+    :param source: The path or URL of the raw file
+    :param copy: If True, return a copy that the caller is free to modify. If False, return the shared cached
+                 dataframe itself: this avoids the copy but the caller must then only read it (filter, select columns,
+                 merge) and never modify it in place
+    :param read_kwargs: Keyword arguments passed to pandas read_csv or read_excel
+    :return: The dataframe of the raw file
+    """
+    from .EtlFetch import isUrl, fetchUrl
+
+    key = (str(source), json.dumps(read_kwargs, sort_keys=True, default=str))
+    stats = _source_cache_stats.setdefault(str(source), {"hits": 0, "misses": 0})
+    with profileStep(f"read {Path(str(source)).name}", "read") as step:
+        step["cached"] = key in _source_cache
+        if key in _source_cache:
+            stats["hits"] += 1
+        else:
+            stats["misses"] += 1
+            # Remote files are read from their local copy in the HTTP cache (see EtlFetch.py)
+            if isUrl(source):
+                source = fetchUrl(str(source))
+            if str(source).endswith((".xlsx", ".xls")):
+                _source_cache[key] = pd.read_excel(source, **read_kwargs)
+            else:
+                _source_cache[key] = pd.read_csv(source, **read_kwargs)
+        df = _source_cache[key].copy() if copy else _source_cache[key]
+        step["rows_out"] = len(df)
+    return df
+
+
+def getSourceCacheStats():
+    """
+    This function reports how many times each raw source file was served from the registry (hits) or parsed (misses)
+
+    :return: Dictionary of source -> {"hits": int, "misses": int}
+    """
+    return {source: dict(stats) for source, stats in _source_cache_stats.items()}
+
+
+def clearSourceCache():
+    """
+    This function empties the registry of the raw source files, e.g. after a source file was refreshed on disk
+
+    :return: None
+    """
+    _source_cache.clear()
+    _source_cache_stats.clear()
+
+
+########################################################################################
+# Instrumentation of the ETL functions
+#
+# When profiling is enabled (setProfiling or the ETL_PROFILE=1 environment variable), the ETL functions decorated with
+# @profiled, the steps wrapped in profileStep (reading the raw files, writing the processed datasets) and the pandas
+# merges and groupby aggregations record their duration, their input and output row counts and the change of the
+# resident memory of the process. The steps are nested: a merge is recorded under the ETL function calling it, itself
+# under the pipeline stage. writeProfileReport saves them as a JSON report with the time spent in each step, and
+# writeProfileTrace as a Chrome trace-event file showing them as a flame graph (chrome://tracing, Perfetto, speedscope).
+# When profiling is disabled, the decorated functions only check a flag.
+# recordProfile records the steps of the current thread only, e.g. one rerun of a Streamlit session, in its own list.
+########################################################################################
+PROFILE_ENVIRONMENT_VARIABLE = "ETL_PROFILE"
+# Methods of the pandas groupby objects recorded as "groupby" steps
+GROUPBY_METHODS = ["agg", "aggregate", "apply", "transform", "filter", "sum", "mean", "median", "min", "max",
+                   "count", "size", "nunique", "first", "last", "std", "var", "corr", "rank", "idxmax", "idxmin",
+                   "cumsum", "shift"]
+
+_profile = {"enabled": os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, "") not in ("", "0"), "records": [], "next_id": 0,
+            "recordings": 0}
+_profile_lock = threading.Lock()
+_profile_stack = threading.local()
+_pandas_originals = {}
+
+
+def isProfiling():
+    """
+    This function tells if the ETL steps of the current thread are being recorded
+
+    :return: True if profiling is enabled for the process or the current thread is in recordProfile
+    """
+    return _profile["enabled"] or getattr(_profile_stack, "records", None) is not None
+
+
+def setProfiling(enabled: bool):
+    """
+    This function enables or disables the recording of the ETL steps, including the pandas merges and groupby
+    aggregations
+
+    :param enabled: True to record the steps
+    :return: None
+    """
+    _profile["enabled"] = enabled
+    _instrumentPandas()
+
+
+def countRows(value):
+    """
+    This function counts the rows of a dataframe, a series or of all the dataframes of a tuple, list or dictionary
+
+    :param value: The value (e.g. the result of an ETL function)
+    :return: The number of rows or None if the value holds no dataframe
+    """
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        counts = [count for count in map(countRows, value) if count is not None]
+        return sum(counts) if counts else None
+    return None
+
+
+def getResidentMemoryMb():
+    """
+    This function returns the resident memory of the process: the current RSS on Linux, the peak RSS elsewhere
+
+    :return: The resident memory in MB
+    """
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss / 2 ** 20 if sys.platform == "darwin" else max_rss / 2 ** 10
+
+
+def _getStack():
+    if not hasattr(_profile_stack, "steps"):
+        _profile_stack.steps = []
+    return _profile_stack.steps
+
+
+@contextmanager
+def profileStep(name: str, category: str = "step", rows_in: int = None):
+    """
+    This context manager records a step of the ETL (duration, rows, memory delta) when profiling is enabled.
+    The step dictionary it yields can be completed by the caller, e.g. step["rows_out"] = len(df).
+
+    :param name: The name of the step (e.g. "read countypres_2000-2020.csv")
+    :param category: The kind of step: "stage", "function", "read", "merge", "groupby", "write"
+    :param rows_in: The number of input rows
+    :return: The step dictionary
+    """
+    if not isProfiling():
+        yield {}
+        return
+    stack = _getStack()
+    with _profile_lock:
+        step_id = _profile["next_id"]
+        _profile["next_id"] += 1
+    step = {"id": step_id, "parent": stack[-1]["id"] if stack else None, "name": name, "category": category,
+            "path": ";".join([parent["name"] for parent in stack] + [name]), "pid": os.getpid(),
+            "tid": threading.get_ident(), "rows_in": rows_in, "rows_out": None}
+    stack.append(step)
+    rss_before = getResidentMemoryMb()
+    step["start"] = time.time()
+    start = time.perf_counter()
+    try:
+        yield step
+    finally:
+        step["seconds"] = time.perf_counter() - start
+        step["rss_mb"] = getResidentMemoryMb()
+        step["rss_delta_mb"] = step["rss_mb"] - rss_before
+        stack.pop()
+        records = getattr(_profile_stack, "records", None)
+        (_profile["records"] if records is None else records).append(step)
+
+
+def profiled(function=None, category: str = "function"):
+    """
+    This decorator records each call of an ETL function as a step when profiling is enabled: the input rows are the
+    rows of the dataframes passed as arguments and the output rows the rows of the returned dataframes.
+
+    :param function: The decorated function
+    :param category: The kind of step
+    :return: The decorated function
+    """
+    if function is None:
+        return functools.partial(profiled, category=category)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not isProfiling():
+            return function(*args, **kwargs)
+        with profileStep(function.__name__, category, countRows(list(args) + list(kwargs.values()))) as step:
+            result = function(*args, **kwargs)
+            step["rows_out"] = countRows(result)
+        return result
+
+    return wrapper
+
+
+def _profilePandasMethod(method, category: str, name: str):
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        stack = _getStack()
+        # The merges and aggregations made by pandas inside a recorded one are part of it
+        if not isProfiling() or (stack and stack[-1]["category"] in ("merge", "groupby")):
+            return method(*args, **kwargs)
+        if category == "merge":
+            rows_in = countRows(list(args[:2]) + [kwargs.get(side) for side in ["left", "right", "other"]])
+        else:
+            rows_in = countRows(args[0].obj)
+        with profileStep(name, category, rows_in) as step:
+            result = method(*args, **kwargs)
+            step["rows_out"] = countRows(result)
+        return result
+
+    return wrapper
+
+
+def _instrumentPandas(recordings: int = 0):
+    """
+    This function replaces pandas merge and the groupby aggregation methods with recording ones while profiling is
+    enabled for the process or a thread is in recordProfile, and restores them otherwise
+
+    :param recordings: The change of the number of threads in recordProfile (1 on entering it, -1 on exiting it)
+    :return: None
+    """
+    from pandas.core.groupby.generic import DataFrameGroupBy, SeriesGroupBy
+
+    # The lock prevents two threads from wrapping the methods twice, or one from restoring them while another one
+    # enters recordProfile
+    with _profile_lock:
+        _profile["recordings"] += recordings
+        enabled = _profile["enabled"] or _profile["recordings"] > 0
+        if enabled and not _pandas_originals:
+            _wrapPandasMethods(DataFrameGroupBy, SeriesGroupBy)
+        elif not enabled:
+            for (owner, attribute), original in _pandas_originals.items():
+                if original is None:
+                    delattr(owner, attribute)
+                else:
+                    setattr(owner, attribute, original)
+            _pandas_originals.clear()
+
+
+def _wrapPandasMethods(*groupby_classes):
+    targets = [(pd, "merge", "merge", "merge"), (pd.DataFrame, "merge", "merge", "merge"),
+               (pd.DataFrame, "join", "merge", "join")]
+    for groupby_class in groupby_classes:
+        targets += [(groupby_class, method, "groupby", f"groupby.{method}") for method in GROUPBY_METHODS]
+    for owner, attribute, category, name in targets:
+        if owner is pd:
+            method, original = pd.merge, pd.merge
+        else:
+            # Only plain methods are replaced (some groupby methods are generated properties in older pandas)
+            method = next((klass.__dict__[attribute] for klass in owner.__mro__ if attribute in klass.__dict__), None)
+            original = owner.__dict__.get(attribute)
+        if callable(method):
+            _pandas_originals[(owner, attribute)] = original
+            setattr(owner, attribute, _profilePandasMethod(method, category, name))
+
+
+@contextmanager
+def recordProfile():
+    """
+    This context manager records the steps run by the current thread until its exit, whether or not profiling is
+    enabled for the process, in the list it yields rather than in the records of the process. The pandas methods are
+    restored when the last thread recording exits, unless profiling is enabled for the process.
+
+    :return: The list of the step dictionaries, filled as the steps end
+    """
+    _instrumentPandas(1)
+    previous_records = getattr(_profile_stack, "records", None)
+    _profile_stack.records = []
+    try:
+        yield _profile_stack.records
+    finally:
+        _profile_stack.records = previous_records
+        _instrumentPandas(-1)
+
+
+def getProfileRecords(records: list = None):
+    """
+    This function returns the recorded steps, with the time spent in each step outside of its nested steps
+
+    :param records: The step dictionaries (default all the steps recorded in this process outside of recordProfile)
+    :return: The list of the step dictionaries, in the order they ended
+    """
+    records = [dict(record) for record in (_profile["records"] if records is None else records)]
+    children_seconds = {}
+    for record in records:
+        key = (record["pid"], record["parent"])
+        children_seconds[key] = children_seconds.get(key, 0) + record["seconds"]
+    for record in records:
+        record["self_seconds"] = max(record["seconds"] - children_seconds.get((record["pid"], record["id"]), 0), 0)
+    return records
+
+
+def addProfileRecords(records: list):
+    """
+    This function adds the steps recorded by another process (e.g. a worker of the pipeline)
+
+    :param records: The step dictionaries returned by getProfileRecords in the other process
+    :return: None
+    """
+    _profile["records"].extend(records)
+
+
+def clearProfileRecords():
+    """
+    This function forgets the recorded steps
+
+    :return: None
+    """
+    _profile["records"] = []
+
+
+def summarizeProfile(records: list):
+    """
+    This function aggregates the recorded steps by category and name, sorted by decreasing time spent in the steps
+    themselves (outside of their nested steps)
+
+    :param records: The step dictionaries returned by getProfileRecords
+    :return: List of dictionaries with the calls, seconds, self seconds, rows, memory delta, bytes and cached calls
+             (of the steps setting step["bytes"] and step["cached"]) of each kind of step
+    """
+    summary = {}
+    for record in records:
+        entry = summary.setdefault((record["category"], record["name"]), {
+            "category": record["category"], "name": record["name"], "calls": 0, "seconds": 0, "self_seconds": 0,
+            "rows_in": 0, "rows_out": 0, "rss_delta_mb": 0, "bytes": 0, "cached": 0})
+        entry["calls"] += 1
+        for field in ["seconds", "self_seconds", "rows_in", "rows_out", "rss_delta_mb", "bytes", "cached"]:
+            entry[field] += record.get(field) or 0
+    return sorted(summary.values(), key=lambda entry: entry["self_seconds"], reverse=True)
+
+
+def writeProfileReport(path: Path, records: list = None):
+    """
+    This function saves the recorded steps and their summary in a JSON report
+
+    :param path: The path of the JSON report
+    :param records: The step dictionaries (default all the steps recorded in this process)
+    :return: None
+    """
+    records = getProfileRecords() if records is None else records
+    start = min((record["start"] for record in records), default=time.time())
+    end = max((record["start"] + record["seconds"] for record in records), default=start)
+    report = {"started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(start)), "seconds": end - start,
+              "summary": summarizeProfile(records), "sources": getSourceCacheStats(),
+              "steps": sorted(records, key=lambda record: record["start"])}
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(report, file, indent=2, default=str)
+
+
+def writeProfileTrace(path: Path, records: list = None):
+    """
+    This function saves the recorded steps in the Chrome trace-event format, to be opened as a flame graph in
+    chrome://tracing, https://ui.perfetto.dev or https://www.speedscope.app
+
+    :param path: The path of the JSON trace
+    :param records: The step dictionaries (default all the steps recorded in this process)
+    :return: None
+    """
+    records = getProfileRecords() if records is None else records
+    start = min((record["start"] for record in records), default=0)
+    events = [{"name": record["name"], "cat": record["category"], "ph": "X", "pid": record["pid"],
+               "tid": record["tid"], "ts": round((record["start"] - start) * 1e6),
+               "dur": round(record["seconds"] * 1e6),
+               "args": {field: record.get(field) for field in ["rows_in", "rows_out", "rss_delta_mb", "rss_mb", "bytes"]}}
+              for record in records]
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, file)
+
+
+if _profile["enabled"]:
+    _instrumentPandas()
@@ -0,0 +1,133 @@
+import sys
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+#
+# In-memory least recently used cache bounded by a number of entries and a total size in bytes, shared by the threads
+# of the Streamlit sessions. It keeps the counts of hits, misses and evictions for the cache metrics.
+#
+
+
+########################################################################################
+def estimateBytes(value, seen: set = None):
+    """
+    This function estimates the memory used by a cached value: the deep memory usage of the dataframes it holds
+    (each counted once) plus the size of the containers
+
+    :param value: The value (dataframe, list, tuple, dictionary or any object)
+    :param seen: The ids of the objects already counted
+    :return: The estimated number of bytes
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimateBytes(item, seen) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimateBytes(item, seen) for item in value)
+    return sys.getsizeof(value)
+
+
+class LruCache:
+    """
+    Least recently used cache bounded by a number of entries and a total size in bytes
+    """
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        """
+        :param max_entries: The maximum number of entries (None for no limit)
+        :param max_bytes: The maximum total size of the entries in bytes (None for no limit)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """
+        This function returns the value of a key and marks it as the most recently used
+
+        :param key: The key
+        :param default: The value returned if the key is not in the cache
+        :return: The cached value or default
+        """
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def put(self, key, value, size: int = None):
+        """
+        This function adds a value, evicting the least recently used entries above the limits. A value larger than
+        max_bytes on its own is not cached.
+
+        :param key: The key
+        :param value: The value
+        :param size: The size of the value in bytes (default estimated with estimateBytes)
+        :return: The value
+        """
+        size = estimateBytes(value) if size is None else size
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            if self.max_bytes is not None and size > self.max_bytes:
+                return value
+            self._entries[key] = (value, size)
+            self._bytes += size
+            self._evict()
+        return value
+
+    def setLimits(self, max_entries: int = None, max_bytes: int = None):
+        """
+        This function changes the limits of the cache, evicting the least recently used entries above them
+
+        :param max_entries: The new maximum number of entries (None to keep the current limit)
+        :param max_bytes: The new maximum total size in bytes (None to keep the current limit)
+        :return: None
+        """
+        with self._lock:
+            self.max_entries = self.max_entries if max_entries is None else max_entries
+            self.max_bytes = self.max_bytes if max_bytes is None else max_bytes
+            self._evict()
+
+    def _evict(self):
+        # Called with the lock held
+        while self._entries and ((self.max_entries is not None and len(self._entries) > self.max_entries)
+                                 or (self.max_bytes is not None and self._bytes > self.max_bytes)):
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def clear(self):
+        """
+        This function removes all the entries (the counters are kept)
+
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        This function reports the cache metrics
+
+        :return: Dictionary of the hits, misses, evictions, number of entries and resident bytes
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "entries": len(self._entries), "bytes": self._bytes}
@@ -7,7 +7,8 @@ import sys
 
 sys.path.append("../ETL")
 from .EtlElection import *
-from .EtlBase import DataFolder, segment_color_dict, color_segment_dict
+from .EtlBase import DataFolder, segment_color_dict, color_segment_dict, readSourceData, profiled
+from .EtlFetch import readSocrataPages
 
 
 ########################################################################################
@@ -37,12 +38,13 @@ def getCDCConfirmedCasesWithAPIQuery():
     # ### Read the pickle file with stored token
     pickle_in = open("APIToken.pickle", "rb")
     APITokenIn = pickle.load(pickle_in)
-    url = f"https://data.cdc.gov/resource/9mfq-cb36.csv?$$app_token={APITokenIn}&$where=submission_date between '2020-01-01T00:00:00' and '2021-01-01T00:00:00'"
-    response = requests.request("GET", url)
-    df = csv_to_dataframe(response)
+    # The rows are read by pages fetched in parallel (the API only returns 1000 rows per query)
+    df = readSocrataPages("https://data.cdc.gov/resource/9mfq-cb36.csv", APITokenIn,
+                          where="submission_date between '2020-01-01T00:00:00' and '2021-01-01T00:00:00'")
     return df
 
 
+@profiled
 def getRollingCaseAverageSegmentLevel(case_rolling_df:pd.DataFrame()=None,
                                       election_winners_df:pd.DataFrame()=None):
     """
@@ -97,6 +99,7 @@ def getRollingCaseAverageSegmentLevel(case_rolling_df:pd.DataFrame()=None,
 
 
 ########################################################################################
+@profiled
 def getCasesRollingAveragePer100K():
     """ 
         THIS FUNCTION reads in the county cases/deaths rolling averages and
@@ -119,7 +122,7 @@ def getCasesRollingAveragePer100K():
     # This is the source of the data. This was then stored in a local drive for better speed.
     # case_rolling_df = pd.read_csv(r"https://raw.githubusercontent.com/nytimes/ \
     #                                    covid-19-data/master/rolling-averages/us-counties.csv")
-    case_rolling_df = pd.read_csv(
+    case_rolling_df = readSourceData(
         DataFolder / r"sept_4_rolling_average_us-counties.zip",
         compression="zip"
     )
@@ -138,6 +141,7 @@ def getCasesRollingAveragePer100K():
 
 
 ########################################################################################
+@profiled
 def getPercentilePointChageDeathsData(cases_rolling_df:pd.DataFrame() = None,
                                       election_df:pd.DataFrame() = None):
     """
@@ -202,6 +206,7 @@ def getPercentilePointChageDeathsData(cases_rolling_df:pd.DataFrame() = None,
 
 
 ########################################################################################
+@profiled
 def getDailyVaccinationPercentData():
     """
         This function retrieves the daily percentage of vaccinated people in each state
@@ -225,8 +230,8 @@ def getDailyVaccinationPercentData():
                  'day_num'
       
     """
-    vaccination_df = pd.read_csv(
-        DataFolder / r"COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv"
+    vaccination_df = readSourceData(
+        DataFolder / r"COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv", copy=False
     )
     ## Percent of population with at lease one dose based on the jurisdiction where recipient lives
     vaccination_df = vaccination_df[
@@ -244,8 +249,9 @@ def getDailyVaccinationPercentData():
     )
 
     # Read the persidential election CSV from local disk
-    population_df = pd.read_csv(
+    population_df = readSourceData(
         DataFolder / r"County Data Till 2020 co-est2020-alldata.csv",
+        copy=False,
         encoding="latin-1",
     )
     state_pop_df = population_df[population_df["SUMLEV"] != 50].copy()
@@ -4,10 +4,11 @@ from pathlib import Path
 import sys
 
 sys.path.append("../ETL")
-from .EtlBase import DataFolder, segment_color_dict
+from .EtlBase import DataFolder, segment_color_dict, readSourceData, profiled
 
 
 ########################################################################################
+@profiled
 def getElectionSegmentsData(segment_color_dict:dict=segment_color_dict,
                             election_winners_df:pd.DataFrame()=None):
     """
@@ -67,6 +68,7 @@ def getElectionSegmentsData(segment_color_dict:dict=segment_color_dict,
 
 
 ########################################################################################
+@profiled
 def getElectionData(election_df:pd.DataFrame()=None):
     """
         THIS FUNCTION reads in county-level presidential election vote data from 2000 to 2020,
@@ -95,7 +97,7 @@ def getElectionData(election_df:pd.DataFrame()=None):
 
     # Read in presidential election data by county, then select only after 2016 (i.e. 2016 and 2020).
     if election_df is None:
-        election_df = pd.read_csv(DataFolder / r"countypres_2000-2020.csv")
+        election_df = readSourceData(DataFolder / r"countypres_2000-2020.csv", copy=False)
     election_df = election_df[election_df["year"] >= 2016].copy()
 
     election_df.rename(
@@ -198,6 +200,7 @@ def getElectionData(election_df:pd.DataFrame()=None):
 
 
 ########################################################################################
+@profiled
 def getStateLevelElectionData2020():
     """
         THIS FUNCTION gets the winning party of the 2020 presidential election by state.
@@ -218,7 +221,7 @@ def getStateLevelElectionData2020():
                  fractionalvotes         (candidatevotes / totalvotes)
     """
     # Join with state level election data to color the circles
-    state_election_df = pd.read_csv(DataFolder / r"1976-2020-president.csv")
+    state_election_df = readSourceData(DataFolder / r"1976-2020-president.csv", copy=False)
     state_election_df = state_election_df[state_election_df["year"] == 2020].copy()
     state_election_df.drop(
         columns=[
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import math
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+
+from .EtlBase import DataFolder
+from .EtlStore import writeAtomically
+
+#
+# This module is the fetch layer of the remote raw inputs (New York Times GitHub files, CDC Socrata API).
+# Each remote file is downloaded once into a local cache folder and then revalidated with a conditional GET
+# (ETag / Last-Modified), so that unchanged multi-MB files are not downloaded again by every packaging run.
+# In offline mode (setOfflineMode(True) or the ETL_OFFLINE environment variable set to 1), the files are only served
+# from the cache, e.g. for builds without network access.
+# The HTTP transport can be replaced with setTransport, e.g. to serve the files from a fake server in tests.
+#
+
+# The default folder of the cached files, read at each call so that it can be changed (e.g. by the tests)
+HttpCacheFolder = DataFolder / "http_cache"
+
+_offline = os.environ.get("ETL_OFFLINE", "0") == "1"
+
+
+def _requestsTransport(url: str, headers: dict):
+    """
+    This function is the default HTTP transport: a streamed GET request through the requests package
+
+    :param url: The URL to get
+    :param headers: The request headers
+    :return: The requests Response (status_code, headers, iter_content)
+    """
+    return requests.get(url, headers=headers, stream=True, timeout=60)
+
+
+_transport = _requestsTransport
+
+
+########################################################################################
+def setOfflineMode(offline: bool):
+    """
+    This function switches the offline mode, where remote files are only served from the cache
+
+    :param offline: True to never access the network
+    :return: None
+    """
+    global _offline
+    _offline = offline
+
+
+def setTransport(transport):
+    """
+    This function replaces the HTTP transport used to download the remote files
+
+    :param transport: Function (url, headers) -> response with status_code, headers and iter_content(chunk_size),
+                      or None to restore the default requests transport
+    :return: None
+    """
+    global _transport
+    _transport = transport or _requestsTransport
+
+
+def isUrl(source):
+    """
+    This function checks if a raw input is a remote file
+
+    :param source: A file path or URL
+    :return: True if the source is an HTTP(S) URL
+    """
+    return str(source).startswith(("http://", "https://"))
+
+
+def getCachePaths(url: str, cache_folder: Path = None):
+    """
+    This function returns the paths of the cached content and metadata of a URL. The content file keeps the
+    extension of the URL so that pandas can still infer the compression from it. The metadata file being
+    <hash>.json, the content of a JSON file is named <hash>.content.json so that the two files never collide.
+
+    :param url: The URL of the remote file
+    :param cache_folder: The folder of the cached files (default HttpCacheFolder)
+    :return: The path of the cached content and the path of its metadata (ETag, Last-Modified)
+    """
+    cache_folder = HttpCacheFolder if cache_folder is None else cache_folder
+    name = hashlib.sha256(url.encode()).hexdigest()
+    extension = Path(urlparse(url).path).suffix
+    content_name = f"{name}.content{extension}" if extension == ".json" else f"{name}{extension}"
+    return Path(cache_folder) / content_name, Path(cache_folder) / f"{name}.json"
+
+
+def isCached(url: str, cache_folder: Path = None):
+    """
+    This function checks if a remote file is in the cache, e.g. to know if it can be read in offline mode
+
+    :param url: The URL of the remote file
+    :param cache_folder: The folder of the cached files (default HttpCacheFolder)
+    :return: True if the cache holds a copy of the remote file
+    """
+    return all(path.exists() for path in getCachePaths(url, cache_folder))
+
+
+########################################################################################
+def fetchUrl(url: str, headers: dict = None, cache_folder: Path = None):
+    """
+    This function returns the local path of a remote file, downloading it only when the cached copy is missing or
+    the server reports it changed (conditional GET on the ETag and Last-Modified of the cached copy).
+    If the server cannot be reached or answers with an error, the cached copy is used when there is one.
+
+    :param url: The URL of the remote file
+    :param headers: Additional request headers (e.g. an API token), not part of the cache key
+    :param cache_folder: The folder of the cached files (default HttpCacheFolder)
+    :return: The path of the local copy of the remote file
+    """
+    cache_folder = HttpCacheFolder if cache_folder is None else cache_folder
+    content_path, metadata_path = getCachePaths(url, cache_folder)
+    cached = isCached(url, cache_folder)
+    if _offline:
+        if not cached:
+            raise FileNotFoundError(f"{url} is not in the cache folder {cache_folder} and the offline mode is on")
+        return content_path
+
+    request_headers = dict(headers or {})
+    metadata = {}
+    if cached:
+        with open(metadata_path) as file:
+            metadata = json.load(file)
+        if metadata.get("etag"):
+            request_headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            request_headers["If-Modified-Since"] = metadata["last_modified"]
+
+    try:
+        response = _transport(url, request_headers)
+    except requests.RequestException as error:
+        if cached:
+            print(f"{url} - {error}, using the cached copy")
+            return content_path
+        raise
+    if response.status_code == 304:
+        return content_path
+    if response.status_code != 200:
+        if cached:
+            print(f"{url} - ERROR - code = {response.status_code}, using the cached copy")
+            return content_path
+        raise requests.HTTPError(f"{url} - ERROR - code = {response.status_code}")
+
+    # Download and record the validators through temporary files, so that an interrupted download never replaces
+    # the cached copy and that concurrent fetches of the same URL (--jobs workers) never see a torn metadata file
+    Path(cache_folder).mkdir(parents=True, exist_ok=True)
+
+    def writeContent(path):
+        with open(path, "wb") as file:
+            for block in response.iter_content(chunk_size=1 << 20):
+                file.write(block)
+
+    writeAtomically(content_path, writeContent)
+    metadata = {"url": url,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified")}
+    writeAtomically(metadata_path, lambda path: path.write_text(json.dumps(metadata, indent=2)))
+    return content_path
+
+
+########################################################################################
+# Paged Socrata (data.cdc.gov) queries
+#
+# Without $limit, the Socrata API only returns the first 1000 rows. Large datasets are read by pages of $limit rows
+# at increasing $offset, fetched in parallel. Each page goes through fetchUrl, so it is streamed to the HTTP cache on
+# disk and then parsed straight into typed columns, without holding the whole answer as a string.
+########################################################################################
+def getSocrataUrl(resource_url: str, **parameters):
+    """
+    This function builds a Socrata query URL from SoQL parameters
+
+    :param resource_url: The URL of the Socrata resource (e.g. "https://data.cdc.gov/resource/unsk-b7fc.csv")
+    :param parameters: SoQL parameters without the $ prefix (e.g. where="...", limit=1000), None values are ignored
+    :return: The query URL
+    """
+    query = "&".join(f"${name}={value}" for name, value in parameters.items() if value is not None)
+    return f"{resource_url}?{query}" if query else resource_url
+
+
+def getSocrataRowCount(resource_url: str, where: str = None, headers: dict = None):
+    """
+    This function returns the number of rows of a Socrata resource matching a where clause
+
+    :param resource_url: The URL of the Socrata resource (CSV format)
+    :param where: The SoQL where clause (None for all the rows)
+    :param headers: Additional request headers (e.g. {"X-App-Token": token})
+    :return: The number of rows
+    """
+    count_df = pd.read_csv(fetchUrl(getSocrataUrl(resource_url, select="count(*)", where=where), headers))
+    return int(count_df.iloc[0, 0])
+
+
+def readSocrataPages(resource_url: str, app_token: str = None, where: str = None, columns: list = None,
+                     dtype: dict = None, page_size: int = 500000, max_workers: int = 4, shard_path: str = None):
+    """
+    This function reads all the rows of a Socrata resource matching a where clause, by pages of page_size rows
+    fetched in parallel. Each page is parsed with only the given columns and types.
+
+    :param resource_url: The URL of the Socrata resource (CSV format)
+    :param app_token: The Socrata application token (None to query without token)
+    :param where: The SoQL where clause (None for all the rows)
+    :param columns: The columns to keep (None for all the columns)
+    :param dtype: The column types
+    :param page_size: The number of rows per page
+    :param max_workers: The number of pages fetched concurrently
+    :param shard_path: If given, each page is written to a CSV shard file instead of being returned, the shard path
+                       being formatted with the page number starting at 1 (e.g. "StateVaccineDataFile{}.csv")
+    :return: The dataframe of all the rows, or the list of the shard paths if shard_path is given. The shards of a
+             previous read with more pages are deleted.
+    """
+    headers = {"X-App-Token": app_token} if app_token else None
+    page_count = max(1, math.ceil(getSocrataRowCount(resource_url, where, headers) / page_size))
+    select = ",".join(columns) if columns else None
+
+    def readPage(page):
+        # Order by the row identifier so that the pages do not overlap
+        url = getSocrataUrl(resource_url, select=select, where=where, order=":id", limit=page_size,
+                            offset=page * page_size)
+        page_df = pd.read_csv(fetchUrl(url, headers), usecols=columns, dtype=dtype)
+        if shard_path is None:
+            return page_df
+        path = Path(str(shard_path).format(page + 1))
+        writeAtomically(path, lambda temporary_path: page_df.to_csv(temporary_path, index=False))
+        return path
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pages = list(executor.map(readPage, range(page_count)))
+    if shard_path is not None:
+        removeStaleShards(shard_path, page_count)
+        return pages
+    return pd.concat(pages, ignore_index=True)
+
+
+def removeStaleShards(shard_path: str, page_count: int):
+    """
+    This function deletes the shards numbered beyond the page count, left by a previous read with more pages, so that
+    the readers of the shard files do not count their rows twice
+
+    :param shard_path: The shard path formatted with the page number (e.g. "StateVaccineDataFile{}.csv")
+    :param page_count: The number of pages of the last read
+    :return: The list of the deleted shard paths
+    """
+    shard_path = Path(str(shard_path))
+    number_pattern = re.compile(re.escape(shard_path.name).replace(re.escape("{}"), r"(\d+)"))
+    stale_paths = []
+    for path in shard_path.parent.glob(shard_path.name.format("*")):
+        match = number_pattern.fullmatch(path.name)
+        if match is not None and int(match.group(1)) > page_count:
+            path.unlink(missing_ok=True)
+            stale_paths.append(path)
+    return stale_paths
@@ -0,0 +1,168 @@
+import json
+import numpy as np
+from pathlib import Path
+
+from .EtlBase import ProcessedDataFolder
+from .EtlFetch import fetchUrl
+from .EtlStore import writeAtomically
+
+#
+# This module builds the local geometry bundle used by the choropleth maps instead of the us-10m TopoJSON file of the
+# vega-datasets CDN. The us-10m topology is downloaded once (through the HTTP cache of EtlFetch), then each of its
+# arcs is simplified (Douglas-Peucker) and quantized at several zoom levels. Simplifying the shared arcs rather than
+# each polygon keeps the borders of neighbouring counties and states aligned.
+#
+
+US_10M_URL = "https://cdn.jsdelivr.net/npm/vega-datasets@v1.29.0/data/us-10m.json"
+GeometryFolder = ProcessedDataFolder / "geometry"
+
+# Zoom level -> simplification tolerance in degrees (0.05 degree is less than a pixel on the 550 pixels wide maps)
+ZOOM_LEVELS = {
+    "low": 0.1,
+    "medium": 0.05,
+    "high": 0.01,
+}
+QUANTIZATION = 10000
+
+
+########################################################################################
+def getGeometryPath(level: str, folder: Path = GeometryFolder):
+    """
+    This function returns the path of the geometry bundle file of a zoom level
+
+    :param level: The zoom level (a key of ZOOM_LEVELS)
+    :param folder: The folder of the geometry bundle
+    :return: The path of the TopoJSON file
+    """
+    return Path(folder) / f"us-10m-{level}.json"
+
+
+def decodeArcs(topology: dict):
+    """
+    This function decodes the delta-encoded and quantized arcs of a TopoJSON topology into absolute coordinates
+
+    :param topology: The TopoJSON topology
+    :return: List of (n, 2) arrays of longitude and latitude
+    """
+    transform = topology.get("transform")
+    arcs = []
+    for arc in topology["arcs"]:
+        points = np.asarray(arc, dtype="float64")[:, :2]
+        if transform is not None:
+            points = np.cumsum(points, axis=0) * transform["scale"] + transform["translate"]
+        arcs.append(points)
+    return arcs
+
+
+def simplifyArc(points: np.ndarray, tolerance: float):
+    """
+    This function simplifies an arc with the Douglas-Peucker algorithm, always keeping its two end points so that
+    the arc still joins its neighbours. A closed arc (ring) also keeps its point farthest from the start, so that
+    it cannot collapse.
+
+    :param points: (n, 2) array of coordinates
+    :param tolerance: The maximum distance between the arc and its simplification
+    :return: The simplified (m, 2) array of coordinates
+    """
+    if tolerance <= 0 or len(points) <= 2:
+        return points
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    ranges = [(0, len(points) - 1)]
+    if np.array_equal(points[0], points[-1]):
+        farthest = int(np.argmax(np.hypot(*(points - points[0]).T)))
+        keep[farthest] = True
+        ranges = [(0, farthest), (farthest, len(points) - 1)]
+    while ranges:
+        start, end = ranges.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        offsets = points[start + 1:end] - points[start]
+        length = np.hypot(*segment)
+        if length == 0:
+            distances = np.hypot(*offsets.T)
+        else:
+            distances = np.abs(segment[0] * offsets[:, 1] - segment[1] * offsets[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            middle = start + 1 + index
+            keep[middle] = True
+            ranges.extend([(start, middle), (middle, end)])
+    return points[keep]
+
+
+def encodeArcs(arcs: list, quantization: int = QUANTIZATION):
+    """
+    This function quantizes arcs on a quantization x quantization grid and delta-encodes them, as in TopoJSON files
+
+    :param arcs: List of (n, 2) arrays of coordinates
+    :param quantization: The number of grid steps along each axis
+    :return: The TopoJSON transform and the list of encoded arcs
+    """
+    all_points = np.concatenate(arcs)
+    translate = all_points.min(axis=0)
+    scale = (all_points.max(axis=0) - translate) / (quantization - 1)
+    scale[scale == 0] = 1
+    encoded_arcs = []
+    for points in arcs:
+        grid = np.round((points - translate) / scale).astype("int64")
+        # Remove the points falling on the same grid position as the previous one
+        grid = grid[np.r_[True, np.any(np.diff(grid, axis=0) != 0, axis=1)]]
+        if len(grid) == 1:
+            grid = np.vstack([grid, grid])
+        encoded_arcs.append(np.vstack([grid[:1], np.diff(grid, axis=0)]).tolist())
+    return {"scale": scale.tolist(), "translate": translate.tolist()}, encoded_arcs
+
+
+def simplifyTopology(topology: dict, tolerance: float, quantization: int = QUANTIZATION):
+    """
+    This function simplifies and quantizes all the arcs of a topology. The objects keep referencing the same arc
+    indices.
+
+    :param topology: The TopoJSON topology
+    :param tolerance: The simplification tolerance, in the units of the coordinates
+    :param quantization: The number of grid steps along each axis
+    :return: The simplified TopoJSON topology
+    """
+    arcs = [simplifyArc(points, tolerance) for points in decodeArcs(topology)]
+    transform, encoded_arcs = encodeArcs(arcs, quantization)
+    return {
+        "type": "Topology",
+        "transform": transform,
+        "objects": topology["objects"],
+        "arcs": encoded_arcs,
+    }
+
+
+def buildGeometryBundle(folder: Path = GeometryFolder, source_url: str = US_10M_URL):
+    """
+    This function writes the simplified us-10m topology of each zoom level in the geometry folder
+
+    :param folder: The folder of the geometry bundle
+    :param source_url: The URL of the us-10m TopoJSON file
+    :return: The list of the written files
+    """
+    with open(fetchUrl(source_url)) as file:
+        topology = json.load(file)
+    Path(folder).mkdir(parents=True, exist_ok=True)
+    paths = []
+    for level, tolerance in ZOOM_LEVELS.items():
+        simplified = simplifyTopology(topology, tolerance)
+        path = getGeometryPath(level, folder)
+        writeAtomically(path, lambda temporary_path: temporary_path.write_text(
+            json.dumps(simplified, separators=(",", ":"))))
+        paths.append(path)
+    return paths
+
+
+def packageGeometryBundle(output_folder: Path = ProcessedDataFolder, source_url: str = US_10M_URL):
+    """
+    This function writes the geometry bundle in the geometry folder of the processed datasets folder (the geometry
+    stage of package_processed_datasets.py)
+
+    :param output_folder: The folder of the processed datasets
+    :param source_url: The URL of the us-10m TopoJSON file
+    :return: None, the stage produces no dataset
+    """
+    buildGeometryBundle(Path(output_folder) / GeometryFolder.name, source_url)
@@ -10,15 +10,19 @@ from .EtlBase import (
     TO_DEMOCRAT,
     STAYED_DEMOCRAT,
     STAYED_REPUBLICAN,
+    readSourceData,
+    profiled,
 )
 from .EtlElection import *
 from .EtlCovid import *
 
 
+@profiled
 def getCountyPopulationMask():
     # Read the persidential election CSV from local disk
-    population_df = pd.read_csv(
+    population_df = readSourceData(
         DataFolder / r"County Data Till 2020 co-est2020-alldata.csv",
+        copy=False,
         encoding="latin-1",
     )
 
@@ -61,8 +65,9 @@ def getCountyPopulationMask():
         county_pop_df.groupby(["STATE", "COUNTYFP", "CTYNAME"]).agg("sum").reset_index()
     )
 
-    county_mask_df = pd.read_csv(
-        r"https://raw.githubusercontent.com/nytimes/covid-19-data/master/mask-use/mask-use-by-county.csv"
+    county_mask_df = readSourceData(
+        r"https://raw.githubusercontent.com/nytimes/covid-19-data/master/mask-use/mask-use-by-county.csv",
+        copy=False,
     )
     # county_mask_df.to_csv( r"../DataForPresidentialElectionsAndCovid/Dataset 7 Covid/mask-use-by-county.csv")
     county_pop_mask_df = pd.merge(
@@ -72,6 +77,7 @@ def getCountyPopulationMask():
 
 
 ##########################################################################################
+@profiled
 def createFrequentAndInfrequentMaskUsers():
     # Add up groupings of frequent and non frequent
     county_pop_mask_df = getCountyPopulationMask()
@@ -169,6 +175,7 @@ def getColorRangeMaskUsage(segmentname, mask_usage_range):
     return legend_dict[(segmentname, mask_usage_range)]
 
 
+@profiled
 def createDataForFreqAndInFreqMaskUse():
     """[This function creates three dataframes]
 
@@ -210,6 +217,7 @@ def createDataForFreqAndInFreqMaskUse():
 
 
 ##########################################################################################
+@profiled
 def createDataForMaskUsageDistribution():
     """This function creates a copy of the dataframe sent in containing column changecolor
         It replaces the changed affilition color to loyalty color.
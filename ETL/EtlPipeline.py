@@ -0,0 +1,324 @@
+import glob
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from pathlib import Path
+
+from .EtlBase import (ProcessedDataFolder, profileStep, countRows, isProfiling, setProfiling, getProfileRecords,
+                      addProfileRecords)
+from .EtlStore import saveProcessedData, loadProcessedData, getProcessedDataPath, writeAtomically
+
+#
+# This module runs the ETL functions as a declared dependency graph.
+# Each stage declares the raw inputs it reads, the ETL modules its code lives in, the processed datasets of other
+# stages it needs and the processed datasets it produces. A content hash of all of those is stored in a manifest next
+# to the processed datasets, so that a stage is only run again when one of its inputs changed.
+# The ETL modules reading the raw inputs and writing the processed datasets (SHARED_MODULES) are part of the
+# fingerprint of every stage, whether or not the stage lists them.
+# A stage can also write files of its own in the processed datasets folder (e.g. the map geometry), declared as its
+# files: it is then given that folder as its output_folder keyword argument.
+#
+
+MANIFEST_NAME = "build_manifest.json"
+# The source registry and profiling (EtlBase), the HTTP cache of the URLs (EtlFetch) and the serialization of the
+# processed datasets (EtlStore), used by all the stages
+SHARED_MODULES = ["EtlBase", "EtlFetch", "EtlStore"]
+ETLFolder = Path(__file__).parent
+
+
+class Stage:
+    """A step of the packaging pipeline: one ETL function call and the processed datasets it returns."""
+
+    def __init__(self, name, function, outputs, sources=(), modules=(), upstream=None, files=()) -> None:
+        """Constructor of a pipeline stage
+
+        Args:
+            name ([str]): Unique name of the stage
+            function: ETL function to call. Its result is a dataframe or a tuple of dataframes
+            outputs ([list]): Names of the processed datasets returned by the function, in order
+            sources ([list]): Raw input files (paths, glob patterns or URLs) read by the function
+            modules ([list]): Names of the ETL modules (e.g. "EtlCovid") containing the code of the function, in
+                addition to the SHARED_MODULES
+            upstream ([dict]): Function keyword argument name -> processed dataset produced by another stage
+            files ([list]): Files written by the function itself, relative to the processed datasets folder which it
+                receives as its output_folder keyword argument
+        """
+        self.name = name
+        self.function = function
+        self.outputs = list(outputs)
+        self.sources = list(sources)
+        self.modules = list(modules)
+        self.upstream = dict(upstream or {})
+        self.files = list(files)
+
+
+########################################################################################
+def hashFile(path, hasher):
+    """
+    This function adds the content of a file to a hash, reading it by blocks of 1MB
+
+    :param path: The path of the file
+    :param hasher: The hashlib object to update
+    :return: None
+    """
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            hasher.update(block)
+
+
+def hashSource(source):
+    """
+    This function returns the content hash of a raw input. A glob pattern is hashed as all its matching files.
+    Remote inputs (URLs) cannot be hashed without downloading them, so only their URL is part of the hash: use the
+    force option of runPipeline to refresh them.
+
+    :param source: A file path, glob pattern or URL
+    :return: The hexadecimal SHA-256 hash
+    """
+    hasher = hashlib.sha256(str(source).encode())
+    if str(source).startswith(("http://", "https://")):
+        return hasher.hexdigest()
+    for path in sorted(glob.glob(str(source))):
+        hasher.update(Path(path).name.encode())
+        hashFile(path, hasher)
+    return hasher.hexdigest()
+
+
+def getStageFingerprint(stage: Stage, upstream_fingerprints: dict):
+    """
+    This function computes the fingerprint of a stage from its raw inputs, the code of its ETL modules and of the
+    shared ETL modules, and the fingerprints of the stages producing its upstream datasets.
+
+    :param stage: The pipeline stage
+    :param upstream_fingerprints: Processed dataset name -> fingerprint of the stage that produced it
+    :return: The hexadecimal SHA-256 fingerprint
+    """
+    hasher = hashlib.sha256(stage.name.encode())
+    for source in stage.sources:
+        hasher.update(hashSource(source).encode())
+    for module in dict.fromkeys(SHARED_MODULES + stage.modules):
+        hashFile(ETLFolder / f"{module}.py", hasher)
+    for argument, dataset in sorted(stage.upstream.items()):
+        hasher.update(f"{argument}={upstream_fingerprints[dataset]}".encode())
+    return hasher.hexdigest()
+
+
+########################################################################################
+def sortStages(stages: list):
+    """
+    This function orders the stages so that each stage comes after the stages producing its upstream datasets.
+
+    :param stages: The list of pipeline stages
+    :return: The ordered list of pipeline stages
+    """
+    producers = {output: stage for stage in stages for output in stage.outputs}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Dependency cycle found at stage {stage.name}")
+        visiting.add(stage.name)
+        for dataset in stage.upstream.values():
+            if dataset not in producers:
+                raise ValueError(f"No stage produces the dataset {dataset} needed by stage {stage.name}")
+            visit(producers[dataset])
+        visiting.discard(stage.name)
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+
+def selectStages(stages: list, names: list):
+    """
+    This function selects the named stages together with all the stages producing their upstream datasets
+
+    :param stages: The list of pipeline stages
+    :param names: The names of the stages to select
+    :return: The list of selected pipeline stages
+    """
+    producers = {output: stage for stage in stages for output in stage.outputs}
+    selected = {}
+    pending = [stage for stage in stages if stage.name in names]
+    while pending:
+        stage = pending.pop()
+        if stage.name not in selected:
+            selected[stage.name] = stage
+            pending.extend(producers[dataset] for dataset in stage.upstream.values())
+    return [stage for stage in stages if stage.name in selected]
+
+
+def readManifest(output_folder: Path):
+    """
+    This function reads the manifest of the stage fingerprints of the last successful runs
+
+    :param output_folder: The folder of the processed datasets
+    :return: Stage name -> fingerprint
+    """
+    manifest_path = Path(output_folder) / MANIFEST_NAME
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path) as file:
+        return json.load(file)
+
+
+def writeManifest(manifest: dict, output_folder: Path):
+    """
+    This function writes the manifest of the stage fingerprints
+
+    :param manifest: Stage name -> fingerprint
+    :param output_folder: The folder of the processed datasets
+    :return: None
+    """
+    def write(path):
+        with open(path, "w") as file:
+            json.dump(manifest, file, indent=2, sort_keys=True)
+
+    writeAtomically(Path(output_folder) / MANIFEST_NAME, write)
+
+
+def isStageStale(stage: Stage, fingerprint: str, manifest: dict, output_folder: Path):
+    """
+    This function checks if a stage must be run: its fingerprint changed or one of its outputs or files is missing
+
+    :return: True if the stage must be run
+    """
+    if manifest.get(stage.name) != fingerprint:
+        return True
+    if not all((Path(output_folder) / file).exists() for file in stage.files):
+        return True
+    return not all(getProcessedDataPath(output, output_folder, extension).exists()
+                   for output in stage.outputs for extension in ["parquet", "arrow"])
+
+
+########################################################################################
+def runStage(stage: Stage, inputs: dict, output_folder: Path = ProcessedDataFolder):
+    """
+    This function calls the ETL function of a stage and names its resulting dataframes
+
+    :param stage: The pipeline stage
+    :param inputs: Function keyword argument name -> upstream dataframe
+    :param output_folder: The folder of the processed datasets, given to the stages writing files of their own
+    :return: Processed dataset name -> dataframe
+    """
+    if stage.files:
+        inputs = dict(inputs, output_folder=output_folder)
+    with profileStep(stage.name, "stage", countRows(inputs)) as step:
+        result = stage.function(**inputs)
+        if len(stage.outputs) == 0:
+            result = ()
+        elif len(stage.outputs) == 1:
+            result = (result,)
+        step["rows_out"] = countRows(result)
+    return dict(zip(stage.outputs, result))
+
+
+def runStageInWorker(stage: Stage, output_folder: Path, profile: bool = False):
+    """
+    This function runs a stage in a worker process of the pool: its upstream datasets are read from the processed
+    datasets folder and its outputs are written back to it.
+
+    :param stage: The pipeline stage
+    :param output_folder: The folder of the processed datasets
+    :param profile: Whether to record the steps of the stage (see EtlBase.profileStep)
+    :return: The name of the stage and the steps recorded in the worker
+    """
+    setProfiling(profile)
+    records_before = len(getProfileRecords())
+    inputs = {argument: loadProcessedData(dataset, output_folder, categories=False)
+              for argument, dataset in stage.upstream.items()}
+    for output, df in runStage(stage, inputs, output_folder).items():
+        saveProcessedData(df, output, output_folder)
+    return stage.name, getProfileRecords()[records_before:]
+
+
+def runStagesInParallel(stages: list, output_folder: Path, jobs: int, on_done):
+    """
+    This function runs the stages in a pool of processes. A stage is submitted as soon as all the stages producing
+    its upstream datasets are done, so that independent stages run concurrently.
+
+    :param stages: The stale pipeline stages, in dependency order
+    :param output_folder: The folder of the processed datasets
+    :param jobs: The number of worker processes
+    :param on_done: Function called in the main process with each stage once it is done
+    :return: None
+    """
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    waiting = {stage.name: stage for stage in stages}
+    running = {}
+    running_names = set()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while waiting or running:
+            for name, stage in list(waiting.items()):
+                blocking = [producers[dataset] for dataset in stage.upstream.values() if dataset in producers]
+                if not any(producer in waiting or producer in running_names for producer in blocking):
+                    print(f"{name} - running")
+                    running[executor.submit(runStageInWorker, stage, output_folder, isProfiling())] = stage
+                    running_names.add(name)
+                    del waiting[name]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                running_names.discard(stage.name)
+                # Raises the exception of the stage if it failed
+                _, records = future.result()
+                addProfileRecords(records)
+                on_done(stage)
+
+
+def runPipeline(stages: list, output_folder: Path = ProcessedDataFolder, force: bool = False, jobs: int = 1):
+    """
+    This function runs the stale stages of the pipeline, in dependency order, and saves their outputs.
+    A stage is stale when one of its raw inputs, ETL modules or upstream stages changed since its last run, or when
+    one of its outputs is missing.
+
+    :param stages: The list of pipeline stages
+    :param output_folder: The folder of the processed datasets
+    :param force: Run all the stages even if they are up to date
+    :param jobs: The number of processes running independent stages concurrently (1 to run them one by one)
+    :return: The list of the names of the stages that were run
+    """
+    Path(output_folder).mkdir(parents=True, exist_ok=True)
+    manifest = readManifest(output_folder)
+    fingerprints = {}
+    stage_fingerprints = {}
+    stale_stages = []
+    for stage in sortStages(stages):
+        fingerprint = getStageFingerprint(stage, fingerprints)
+        stage_fingerprints[stage.name] = fingerprint
+        for output in stage.outputs:
+            fingerprints[output] = fingerprint
+        if force or isStageStale(stage, fingerprint, manifest, output_folder):
+            stale_stages.append(stage)
+        else:
+            print(f"{stage.name} - up to date")
+
+    run_stages = []
+
+    def on_done(stage):
+        manifest[stage.name] = stage_fingerprints[stage.name]
+        writeManifest(manifest, output_folder)
+        run_stages.append(stage.name)
+
+    if jobs > 1:
+        runStagesInParallel(stale_stages, output_folder, jobs, on_done)
+        return run_stages
+
+    # Run in this process, keeping the outputs in memory for the downstream stages
+    datasets = {}
+    for stage in stale_stages:
+        print(f"{stage.name} - running")
+        inputs = {}
+        for argument, dataset in stage.upstream.items():
+            if dataset not in datasets:
+                datasets[dataset] = loadProcessedData(dataset, output_folder, categories=False)
+            inputs[argument] = datasets[dataset]
+        for output, df in runStage(stage, inputs, output_folder).items():
+            saveProcessedData(df, output, output_folder)
+            datasets[output] = df
+        on_done(stage)
+    return run_stages
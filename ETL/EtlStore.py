@@ -0,0 +1,299 @@
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+from pathlib import Path
+
+from .EtlBase import ProcessedDataFolder, profileStep
+from .EtlCache import LruCache
+
+#
+# This module is the storage layer between the packager (package_processed_datasets.py) and the Streamlit pages.
+# Processed dataframes are written as typed Parquet files (with a CSV copy kept for inspection and as a fallback)
+# so that the pages no longer have to parse the CSV text and re-apply the column types on every run.
+# They are also written as uncompressed Arrow IPC (Feather v2) files, which are memory-mapped when loaded: the numeric
+# columns are then used in place, without a copy, so that all the sessions and all the server processes share the
+# same physical memory (the page cache of the file) instead of each holding their own copy.
+#
+
+# Memory budget of the dataset cache of the Streamlit app (see loadCachedData), shared by all the sessions of a process
+DATA_CACHE_MAX_BYTES = int(os.environ.get("DATA_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+
+_data_cache = LruCache(max_bytes=DATA_CACHE_MAX_BYTES)
+
+# Low cardinality text columns that are stored dictionary-encoded (pandas category dtype) in the Parquet files
+CATEGORY_COLUMNS = [
+    "party",
+    "party_winner_2016",
+    "party_winner_2020",
+    "party_simplified",
+    "changecolor",
+    "segmentname",
+    "mask_usage_type",
+    "mask_usage_range",
+    "range_color",
+    "UrbanRural",
+    "variable",
+]
+
+
+########################################################################################
+def getProcessedDataPath(name: str, folder: Path = ProcessedDataFolder, extension: str = "parquet"):
+    """
+    This function returns the path of a processed dataset file
+
+    :param name: The name of the dataset (e.g. "case_rolling_df")
+    :param folder: The folder containing the processed datasets
+    :param extension: The file format extension ("parquet" or "csv")
+    :return: The path of the dataset file
+    """
+    return Path(folder) / f"{name}.{extension}"
+
+
+def encodeCategoryColumns(df: pd.DataFrame):
+    """
+    This function converts the text columns listed in CATEGORY_COLUMNS to the pandas category dtype so that they are
+    written dictionary-encoded in the Parquet files.
+
+    :param df: The dataframe to encode
+    :return: A dataframe with the low cardinality text columns as categories
+    """
+    columns = [column for column in CATEGORY_COLUMNS if column in df.columns and df[column].dtype == object]
+    if len(columns) == 0:
+        return df
+    return df.astype({column: "category" for column in columns})
+
+
+def decodeCategoryColumns(df: pd.DataFrame):
+    """
+    This function converts the category columns back to plain text columns. This is needed by the ETL functions
+    which group by those columns, as pandas would otherwise return every category combination.
+
+    :param df: The dataframe to decode
+    :return: A dataframe without category columns
+    """
+    columns = [column for column in df.columns if isinstance(df[column].dtype, pd.CategoricalDtype)]
+    if len(columns) == 0:
+        return df
+    return df.astype({column: object for column in columns})
+
+
+########################################################################################
+def writeAtomically(path: Path, write_function):
+    """
+    This function writes a file through a temporary file in the same folder which is then renamed, so that readers
+    (Streamlit pages or other packaging processes) never see a partially written file. The temporary file is named
+    after the process and the thread, so that concurrent writers of the same file never write to the same one.
+
+    :param path: The path of the file to write
+    :param write_function: Function writing the content to the path it is given
+    :return: None
+    """
+    path = Path(path)
+    temporary_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        write_function(temporary_path)
+        os.replace(temporary_path, path)
+    finally:
+        if temporary_path.exists():
+            temporary_path.unlink()
+
+
+def writeArrowFile(df: pd.DataFrame, path: Path):
+    """
+    This function writes a dataframe as an uncompressed Arrow IPC (Feather v2) file that can be memory-mapped.
+    The NaN of the float columns are kept as values rather than converted to nulls, so that those columns can be
+    read back without a copy.
+
+    :param df: The dataframe
+    :param path: The path of the file to write
+    :return: None
+    """
+    table = pa.Table.from_pandas(encodeCategoryColumns(df), preserve_index=False)
+    for index, field in enumerate(table.schema):
+        if pa.types.is_floating(field.type):
+            values = pa.array(df[field.name].to_numpy(), type=field.type, from_pandas=False)
+            table = table.set_column(index, field, values)
+    feather.write_feather(table, str(path), compression="uncompressed")
+
+
+def readArrowFile(path: Path, columns: list = None):
+    """
+    This function reads an Arrow IPC file through a memory map. The numeric columns without nulls are views of the
+    mapped file (read-only), the other columns are converted to pandas.
+
+    :param path: The path of the Arrow IPC file
+    :param columns: The subset of columns to read (None for all columns)
+    :return: The dataframe
+    """
+    table = feather.read_table(str(path), columns=columns, memory_map=True)
+    # split_blocks keeps one block per column: consolidating the columns into 2D blocks would copy them
+    return table.to_pandas(split_blocks=True)
+
+
+def getStoredDataPath(name: str, folder: Path = ProcessedDataFolder):
+    """
+    This function returns the path of the file a processed dataset is loaded from: the Arrow IPC file, otherwise
+    the Parquet file, otherwise the CSV file
+
+    :param name: The name of the dataset (e.g. "case_rolling_df")
+    :param folder: The folder containing the processed datasets
+    :return: The path of the dataset file
+    """
+    for extension in ["arrow", "parquet"]:
+        path = getProcessedDataPath(name, folder, extension)
+        if path.exists():
+            return path
+    return getProcessedDataPath(name, folder, "csv")
+
+
+def saveProcessedData(df: pd.DataFrame, name: str, folder: Path = ProcessedDataFolder, csv: bool = True):
+    """
+    This function saves a processed dataframe as a typed Parquet file, an Arrow IPC file and, optionally, a CSV file.
+
+    :param df: The processed dataframe
+    :param name: The name of the dataset (e.g. "case_rolling_df")
+    :param folder: The folder where to save the processed datasets
+    :param csv: Whether to also save the dataset as CSV
+    :return: None
+    """
+    Path(folder).mkdir(parents=True, exist_ok=True)
+    with profileStep(f"write {name}.parquet", "write", len(df)):
+        writeAtomically(getProcessedDataPath(name, folder),
+                        lambda path: encodeCategoryColumns(df).to_parquet(path, index=False))
+    with profileStep(f"write {name}.arrow", "write", len(df)):
+        writeAtomically(getProcessedDataPath(name, folder, "arrow"), lambda path: writeArrowFile(df, path))
+    if csv:
+        with profileStep(f"write {name}.csv", "write", len(df)):
+            writeAtomically(getProcessedDataPath(name, folder, "csv"),
+                            lambda path: df.to_csv(path_or_buf=path, index=False))
+
+
+def loadProcessedData(name: str, folder: Path = ProcessedDataFolder, dtype: dict = None, columns: list = None,
+                      categories: bool = True):
+    """
+    This function loads a processed dataset. The memory-mapped Arrow IPC file or the typed Parquet file is used when
+    it exists, otherwise the function falls back to the CSV file, applying the given dtypes.
+
+    :param name: The name of the dataset (e.g. "case_rolling_df")
+    :param folder: The folder containing the processed datasets
+    :param dtype: The column types to apply when reading from the CSV file
+    :param columns: The subset of columns to read (None for all columns)
+    :param categories: Whether to keep the dictionary-encoded columns as categories
+    :return: The processed dataframe
+    """
+    path = getStoredDataPath(name, folder)
+    with profileStep(f"read {path.name}", "read") as step:
+        if path.suffix == ".arrow":
+            df = readArrowFile(path, columns)
+        elif path.suffix == ".parquet":
+            df = pd.read_parquet(path, columns=columns)
+        else:
+            df = pd.read_csv(path, dtype=dtype, usecols=columns)
+        if not categories:
+            df = decodeCategoryColumns(df)
+        step["rows_out"] = len(df)
+    return df
+
+
+########################################################################################
+# Dataset cache of the Streamlit app
+#
+# The pages used to re-read their processed datasets on every rerun, because caching a copy of each dataframe per
+# call (st.cache) used too much memory. loadCachedData keeps a single copy of each dataset per process, shared by all
+# the sessions, within a memory budget: the least recently used datasets are dropped above it.
+# The callers must not modify the shared dataframes. setReadOnly only makes their numeric values read-only: adding,
+# dropping or reassigning a column is not prevented, so a chart factory adding a column works on a copy
+# (df.assign). tests/test_page_charts.py checks that the page chart builders leave the datasets unchanged.
+# The columns mapped from the Arrow IPC files are not counted in the budget, as they are shared with the other
+# processes through the page cache rather than held by the process.
+########################################################################################
+def setReadOnly(df: pd.DataFrame):
+    """
+    This function marks the NumPy arrays holding the numeric values of a dataframe as read-only, so that an in-place
+    change of a shared dataframe (e.g. df.loc[...] = value) raises an error instead of changing it for every session.
+    The text (object) columns stay writable, as some pandas functions (e.g. comparisons) refuse read-only object
+    arrays.
+
+    :param df: The dataframe
+    :return: The same dataframe
+    """
+    for block in df._mgr.blocks:
+        if isinstance(block.values, np.ndarray) and block.values.dtype != object:
+            block.values.flags.writeable = False
+    return df
+
+
+def getResidentBytes(df: pd.DataFrame):
+    """
+    This function returns the memory held by a dataframe, without its columns mapped from an Arrow IPC file (the
+    read-only arrays, before setReadOnly is applied)
+
+    :param df: The dataframe
+    :return: The number of bytes
+    """
+    mapped = []
+    for block in df._mgr.blocks:
+        if isinstance(block.values, np.ndarray) and not block.values.flags.writeable:
+            mapped.extend(df.columns[block.mgr_locs.indexer])
+    return int(df.memory_usage(index=True, deep=True).drop(labels=mapped).sum())
+
+
+def loadCachedData(name: str, folder: Path = ProcessedDataFolder, dtype: dict = None, columns: list = None,
+                   categories: bool = True):
+    """
+    This function loads a processed dataset through the dataset cache of the process. The returned dataframe is
+    shared: it must only be read (filter, select columns, merge, copy), never modified in place. A dataset file
+    rewritten by the packager is read again.
+
+    :param name: The name of the dataset (e.g. "case_rolling_df")
+    :param folder: The folder containing the processed datasets
+    :param dtype: The column types to apply when reading from the CSV file
+    :param columns: The subset of columns to read (None for all columns)
+    :param categories: Whether to keep the dictionary-encoded columns as categories
+    :return: The shared processed dataframe, not to be modified
+    """
+    path = getStoredDataPath(name, folder)
+    status = path.stat()
+    key = (str(path), status.st_mtime_ns, status.st_size,
+           json.dumps(dtype, sort_keys=True, default=str), json.dumps(columns), categories)
+    with profileStep(f"read {name}", "read") as step:
+        df = _data_cache.get(key)
+        step["cached"] = df is not None
+        if df is None:
+            df = loadProcessedData(name, folder, dtype, columns, categories)
+            df = _data_cache.put(key, df, getResidentBytes(df))
+            setReadOnly(df)
+        step["rows_out"] = len(df)
+    return df
+
+
+def getDataCacheStats():
+    """
+    This function reports the metrics of the dataset cache
+
+    :return: Dictionary of the hits, misses, evictions, number of cached datasets and resident bytes
+    """
+    return _data_cache.stats()
+
+
+def setDataCacheBudget(max_bytes: int):
+    """
+    This function changes the memory budget of the dataset cache, evicting datasets if it is now exceeded
+
+    :param max_bytes: The maximum total memory of the cached datasets in bytes
+    :return: None
+    """
+    _data_cache.setLimits(max_bytes=max_bytes)
+
+
+def clearDataCache():
+    """
+    This function empties the dataset cache
+
+    :return: None
+    """
+    _data_cache.clear()
@@ -3,14 +3,26 @@ import pandas as pd
 import numpy as np
 import requests
 import json
+import hashlib
+import os
 import sys
+import threading
+import time
 
 sys.path.append("../ETL")
 from datetime import datetime, date
-from .EtlBase import DataFolder
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from .EtlBase import DataFolder, readSourceData, profiled
+from .EtlStore import writeAtomically
 from .EtlElection import getElectionData
 from .EtlCovid import getCasesRollingAveragePer100K
 
+BLS_API_URL = "https://api.bls.gov/publicAPI/v2/timeseries/data/"
+BLS_CACHE_FOLDER = DataFolder / "bls_cache"
+# The BLS publishes the county unemployment rates monthly, the cached answers are queried again after this delay
+BLS_CACHE_MAX_AGE_DAYS = 28
+BLS_COLUMNS = ["series_id","state_FIPS","county_FIPS","year","month","unemployment_rate","footnotes"]
 
 
 ##########################################################################################
@@ -43,59 +55,259 @@ def split_codes_in_chunks(lst, n):
     for i in range(0, len(lst), n):
         yield lst[i:i + n]
     
-def get_unemployment_rates_from_api(apy_key):
+def parse_bls_series(json_data, buffers):
+    """
+    This function appends the monthly data points of a BLS v2 API answer to column buffers (one list per column of
+    BLS_COLUMNS), skipping the annual averages (period M13).
+
+    :param json_data: The decoded JSON answer of the BLS API
+    :param buffers: Column name -> list of values, extended in place
+    :return: The number of data points appended
+    """
+    count = 0
+    for series in json_data['Results']['series']:
+        seriesId = series['seriesID']
+        state_fips = seriesId[5:7]
+        county_fips = seriesId[7:10]
+        for item in series['data']:
+            month = int(item['period'][1:])
+            if 1 <= month <= 12:
+                footnotes = ",".join(footnote['text'] for footnote in item['footnotes'] if footnote)
+                for column, value in zip(BLS_COLUMNS, [seriesId, state_fips, county_fips, item['year'], month,
+                                                       item['value'], footnotes]):
+                    buffers[column].append(value)
+                count += 1
+    return count
+
+
+class RateLimiter:
+    """Spaces out the calls of several threads so that at most a given number of calls start per second."""
+
+    def __init__(self, calls_per_second) -> None:
+        """Constructor of the rate limiter
+
+        Args:
+            calls_per_second ([float]): Maximum number of calls started per second
+        """
+        self.interval = 1.0 / calls_per_second
+        self.next_call = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        """Blocks until the calling thread is allowed to start its call"""
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_call - now
+            self.next_call = max(now, self.next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def get_bls_cache_path(list_codes, start_year, end_year, cache_folder=BLS_CACHE_FOLDER):
+    """
+    This function returns the path of the cached BLS API answer for a set of series and a range of years
+
+    :param list_codes: The LAUS codes of the series
+    :param start_year: The first year of the query
+    :param end_year: The last year of the query
+    :param cache_folder: The folder of the cached answers
+    :return: The path of the cached JSON answer
+    """
+    key = json.dumps([sorted(list_codes), str(start_year), str(end_year)])
+    return Path(cache_folder) / f"{hashlib.sha256(key.encode()).hexdigest()}.json"
+
+
+def read_bls_cache(start_year, end_year, cache_folder=BLS_CACHE_FOLDER, max_age_days=BLS_CACHE_MAX_AGE_DAYS):
+    """
+    This function reads all the cached BLS API answers for a range of years. When several answers hold the same
+    series, the series of the most recent answer is kept
+
+    :param start_year: The first year of the queries
+    :param end_year: The last year of the queries
+    :param cache_folder: The folder of the cached answers
+    :param max_age_days: Ignore the answers older than this number of days (None to keep all of them)
+    :return: LAUS code -> cached series
+    """
+    cached_series = {}
+    # Oldest answers first, so that the series of the newer answers replace them
+    modified_paths = sorted((path.stat().st_mtime, path) for path in Path(cache_folder).glob("*.json"))
+    for modified, path in modified_paths:
+        if max_age_days is not None and time.time() - modified > max_age_days * 86400:
+            continue
+        with open(path) as file:
+            entry = json.load(file)
+        if entry["startyear"] == str(start_year) and entry["endyear"] == str(end_year):
+            for series in entry["response"]["Results"]["series"]:
+                cached_series[series["seriesID"]] = series
+    return cached_series
+
+
+def post_bls_chunk(list_codes, start_year, end_year, apy_key, api_url=BLS_API_URL, rate_limiter=None, retries=3,
+                   backoff=2.0, cache_folder=BLS_CACHE_FOLDER):
+    """
+    This function queries the BLS v2 API for a chunk of series, retrying with an exponential backoff when the query
+    fails, its answer is not valid JSON or it is not processed (e.g. throttled, the BLS message is then printed), and
+    caches the JSON answer on disk.
+
+    :param list_codes: The LAUS codes of the series (at most 50)
+    :param start_year: The first year of the query
+    :param end_year: The last year of the query
+    :param apy_key: The Bureau of Labor Statistics website API v2 key
+    :param api_url: The URL of the BLS v2 API timeseries endpoint (e.g. a local stand-in for testing)
+    :param rate_limiter: The RateLimiter shared by the concurrent queries (None for no limit)
+    :param retries: The number of retries after a failed query
+    :param backoff: The delay in seconds before the first retry, doubled at each retry
+    :param cache_folder: The folder of the cached answers
+    :return: The decoded JSON answer, or None if all the attempts failed
+    """
+    headers = {'Content-type': 'application/json'}
+    data = json.dumps({"seriesid": list_codes, "startyear": str(start_year), "endyear": str(end_year),
+                       "registrationkey": apy_key})
+    chunk_name = list_codes[0] + " to " + list_codes[-1]
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            time.sleep(backoff * 2 ** (attempt - 1))
+        if rate_limiter is not None:
+            rate_limiter.wait()
+        try:
+            r = requests.post(api_url, data=data, headers=headers)
+        except requests.RequestException as error:
+            print(chunk_name + " - ERROR - " + str(error))
+            continue
+        if r.status_code != 200:
+            print(chunk_name + " - ERROR - code = " + str(r.status_code))
+            continue
+        try:
+            json_data = r.json()
+        except ValueError as error:
+            # An HTML error page or a truncated answer
+            print(chunk_name + " - ERROR - invalid JSON answer - " + str(error))
+            continue
+        if not isinstance(json_data, dict) or "Results" not in json_data \
+                or json_data.get("status", "REQUEST_SUCCEEDED") != "REQUEST_SUCCEEDED":
+            status = json_data.get("status") if isinstance(json_data, dict) else None
+            message = json_data.get("message") if isinstance(json_data, dict) else None
+            print(chunk_name + " - ERROR - status = " + str(status) + " - message = " + str(message))
+            continue
+        Path(cache_folder).mkdir(parents=True, exist_ok=True)
+        entry = {"seriesid": list_codes, "startyear": str(start_year), "endyear": str(end_year), "response": json_data}
+        writeAtomically(get_bls_cache_path(list_codes, start_year, end_year, cache_folder),
+                        lambda path: path.write_text(json.dumps(entry)))
+        return json_data
+    return None
+
+
+def get_unemployment_rates_from_api(apy_key, api_url=BLS_API_URL, output_file=DataFolder / r"bls_unemployment_rates.csv",
+                                    start_year=2019, end_year=2021, max_workers=4, calls_per_second=2.0,
+                                    cache_folder=BLS_CACHE_FOLDER, cache_max_age_days=BLS_CACHE_MAX_AGE_DAYS,
+                                    retries=3, backoff=2.0):
     """
     This function takes the list of LAUS code created in the "bls_laus_codes.csv" by the get_counties_bls_laus_codes
     function, and calls the Bureau of Labor Statistics v2 API to gather all unemployment rates since the beginning of
     2019.
 
-    It queries the BLS API in chunks of 50 LUAS codes due to throttling constraints on the BLS API.
+    It queries the BLS API in chunks of 50 LUAS codes due to throttling constraints on the BLS API. The chunks are
+    queried concurrently by a pool of threads under a shared rate limit, and each answer is cached on disk. Only the
+    series which are not in the cache (new series, expired answers or chunks which failed in a previous call) are
+    queried, so calling the function again after a failure only queries the missing series.
 
-    The result is stored in the "bls_unemployment_rates.csv" file
+    The data points are gathered in column buffers and appended to a partial file, which replaces the
+    "bls_unemployment_rates.csv" file once all the series are received
 
     :param apy_key: The Bureau of Labor Statistics website API v2 key
-    :return: None
+    :param api_url: The URL of the BLS v2 API timeseries endpoint (e.g. a local stand-in for testing)
+    :param output_file: The path of the resulting CSV file
+    :param start_year: The first year of the unemployment rates
+    :param end_year: The last year of the unemployment rates
+    :param max_workers: The number of concurrent queries
+    :param calls_per_second: The maximum number of queries started per second
+    :param cache_folder: The folder of the cached answers
+    :param cache_max_age_days: Query again the series cached more than this number of days ago (default a month,
+    None to always use the cache, e.g. 0 to refresh all the series)
+    :param retries: The number of retries after a failed query of a chunk
+    :param backoff: The delay in seconds before the first retry of a chunk, doubled at each retry
+    :return: True if all the series were received
     """
+    output_file = Path(output_file)
+    partial_file = output_file.with_name(output_file.name + ".partial")
     bls_laus_codes = list(pd.read_csv(DataFolder / r"bls_laus_codes.csv", header=None).iloc[:,0])
-    #for laus_code in bls_laus_codes:
-    headers = {'Content-type': 'application/json'}
+    received_series = read_bls_cache(start_year, end_year, cache_folder, cache_max_age_days)
+    missing_codes = [code for code in bls_laus_codes if code not in received_series]
+    print(str(len(bls_laus_codes) - len(missing_codes)) + " series served from the cache, "
+          + str(len(missing_codes)) + " series to query")
     # The API only accepts 50 series codes per query
-    i=1
-    unemployment_df = pd.DataFrame(columns=["series_id","state_FIPS","county_FIPS","year","month","unemployment_rate","footnotes"])
-    for list_codes in split_codes_in_chunks(bls_laus_codes, 50):
-        print(str(i) + " - Querying for 50 series from " + list_codes[0] + " to " + list_codes[-1])
-        data = json.dumps({"seriesid": list_codes,"startyear":"2019", "endyear":"2021", "registrationkey": apy_key})
-        r = requests.post("https://api.bls.gov/publicAPI/v2/timeseries/data/", data=data, headers=headers)
-        if r.status_code == 200:
-            print(str(i) + " - Answer received processing the data")
-            json_data = json.loads(r.text)
+    rate_limiter = RateLimiter(calls_per_second)
+    failed_chunks = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(post_bls_chunk, list_codes, start_year, end_year, apy_key, api_url, rate_limiter,
+                                   retries, backoff, cache_folder)
+                   for list_codes in split_codes_in_chunks(missing_codes, 50)]
+        for i, future in enumerate(as_completed(futures), start=1):
+            json_data = future.result()
+            if json_data is None:
+                failed_chunks += 1
+                continue
+            print(str(i) + "/" + str(len(futures)) + " - Answer received")
             for series in json_data['Results']['series']:
-                seriesId = series['seriesID']
-                state_fips = seriesId[5:7]
-                county_fips = seriesId[7:10]
-                for item in series['data']:
-                    year = item['year']
-                    month = int(item['period'][1:])
-                    unemployment_rate = item['value']
-                    footnotes=""
-                    for footnote in item['footnotes']:
-                        if footnote:
-                            footnotes = footnotes + footnote['text'] + ','
-
-                    if 1 <= month <= 12:
-                        _row = pd.Series([seriesId,state_fips,county_fips,year,month,unemployment_rate,footnotes[0:-1]], index=unemployment_df.columns)
-                        unemployment_df = unemployment_df.append(_row, ignore_index=True)
-            print(str(i) + " - Dataframe length = " + str(len(unemployment_df)))
-            i+=1
-        else:
-             print(str(i) + " - ERROR - code = " + str(r.status_code))
-    unemployment_df.to_csv(DataFolder / r"bls_unemployment_rates.csv", header=None, index=None)
+                received_series[series['seriesID']] = series
+    if failed_chunks > 0:
+        print(str(failed_chunks) + " chunk(s) failed, call the function again to query them")
+        return False
+    # Write the series in the order of the LAUS codes file, one chunk of column buffers at a time
+    partial_file.unlink(missing_ok=True)
+    partial_file.touch()
+    for list_codes in split_codes_in_chunks(bls_laus_codes, 50):
+        buffers = {column: [] for column in BLS_COLUMNS}
+        parse_bls_series({"Results": {"series": [received_series[code] for code in list_codes
+                                                 if code in received_series]}}, buffers)
+        pd.DataFrame(buffers).to_csv(partial_file, mode="a", header=None, index=None)
+    os.replace(partial_file, output_file)
+    return True
 
 
-    
+##########################################################################################
+# Prepare the monthly unemployment rates shared by the unemployment datasets
+##########################################################################################
+@profiled
+def getUnemploymentRates(start_month: str, month_since_start: bool = True):
+    """
+    This function reads the U.S. counties monthly unemployment rates (bls_unemployment_rates.csv) and builds the
+    month period, the county FIPS and the number of months since the start with vectorized integer arithmetic
+    instead of formatting and parsing each row.
+
+    :param start_month: The first month to keep, as "YYYY-MM"
+    :param month_since_start: Whether to add the month_since_start column (1 for the first month)
+    :return: A dataframe of mainland U.S. counties monthly unemployment rate since the start month with the
+    COUNTYFP, month and unemployment_rate (and month_since_start) columns
+    """
+    unemployment_df = readSourceData(DataFolder / r"bls_unemployment_rates.csv",
+                                    names=["LAUS_code","state_fips","county_fips","year","month","unemployment_rate","footnotes"],
+                                    header=0)
+    # Count the months from year 0 so that months can be compared and subtracted as integers
+    month_number = unemployment_df["year"] * 12 + unemployment_df["month"] - 1
+    start = pd.Period(start_month, freq="M")
+    # Format the county FIPS as the state FIPS followed by the county FIPS (the 3 last digits)
+    county_fips = unemployment_df["state_fips"] * 1000 + unemployment_df["county_fips"]
+    # Keep only the data since the start month and the US mainland states
+    keep = (month_number >= start.year * 12 + start.month - 1) & (county_fips < 57000)
+    unemployment_df = unemployment_df[keep].copy()
+    month_number = month_number[keep]
+    # Convert year and month to a monthly period
+    unemployment_df["month"] = pd.to_datetime(pd.DataFrame({"year": unemployment_df["year"],
+                                                            "month": unemployment_df["month"],
+                                                            "day": 1})).dt.to_period("M")
+    unemployment_df["COUNTYFP"] = county_fips[keep]
+    # Calculate for each record the number of month since the start
+    if month_since_start:
+        unemployment_df["month_since_start"] = month_number - month_number.min() + 1
+    unemployment_df["unemployment_rate"] = unemployment_df["unemployment_rate"].astype("float64")
+    unemployment_df.drop(columns=["state_fips", "county_fips", "LAUS_code","year","footnotes"], inplace=True)
+    return unemployment_df
+
 ##########################################################################################
 # Get the pre-pandemic December 2019 data
 ##########################################################################################
+@profiled
 def getUnemploymentRateSince122019():
     """
     This ETL function takes the following datasets:
@@ -107,28 +319,11 @@ def getUnemploymentRateSince122019():
     """
     #
     # Prepare unemployment Data
-    # 
-    unemployment_df = pd.read_csv(DataFolder / r"bls_unemployment_rates.csv",
-                                    names=["LAUS_code","state_fips","county_fips","year","month","unemployment_rate","footnotes"],
-                                    header=0)
-    # Convert year and month to datetime
-    unemployment_df["month"] = unemployment_df.apply(lambda x: pd.to_datetime(f"{x['year']}-{x['month']}", format="%Y-%m").to_period('M'), axis=1)
-    # Keep only the data after December 2019
-    unemployment_df = unemployment_df[(unemployment_df["month"]>=pd.to_datetime("2019-12", format="%Y-%m").to_period('M'))]
-    # Format the county FIPS as the state FIPS followed by the county FIPS
-    concatenate_fips = lambda x : int(str(x["state_fips"]) + "{:03d}".format(x["county_fips"]))
-    unemployment_df["COUNTYFP"] = unemployment_df.apply(concatenate_fips, axis=1)
-    # Keep only US mainland states
-    unemployment_df = unemployment_df[unemployment_df["COUNTYFP"] < 57000]
-    # Calculate for each record the number of month since the start
-    first_month = unemployment_df["month"].min()
-    calculate_month_since_start = lambda x : (x - first_month).n + 1
-    unemployment_df["month_since_start"] = unemployment_df["month"].apply(calculate_month_since_start)
-    unemployment_df["unemployment_rate"] = unemployment_df["unemployment_rate"].astype("float64")
+    #
+    unemployment_df = getUnemploymentRates("2019-12")
     #
     # Merge election data at the county level
     #
-    unemployment_df.drop(columns=["state_fips", "county_fips", "LAUS_code","year","footnotes"], inplace=True)
     election_df = getElectionData()
     election_df = election_df[["COUNTYFP", "party_winner_2020"]]
     election_df.rename(columns={"party_winner_2020": "party"}, inplace = True)
@@ -138,6 +333,7 @@ def getUnemploymentRateSince122019():
 ##########################################################################################
 # Merge the unemployment and Covid cases and death data
 ##########################################################################################
+@profiled
 def getUnemploymentCovidBase():
     """
     This ETL function takes the following datasets:
@@ -150,23 +346,9 @@ def getUnemploymentCovidBase():
     """
     #
     # Prepare unemployment Data
-    # 
-    unemployment_df = pd.read_csv(DataFolder / r"bls_unemployment_rates.csv",
-                                    names=["LAUS_code","state_fips","county_fips","year","month","unemployment_rate","footnotes"],
-                                    header=0)
-    # Convert year and month to datetime
-    unemployment_df["month"] = unemployment_df.apply(lambda x: pd.to_datetime(f"{x['year']}-{x['month']}", format="%Y-%m").to_period('M'), axis=1)
     # Keep only the data from January 2020 (we only have Covid cases from that month)
-    unemployment_df = unemployment_df[(unemployment_df["month"]>=pd.to_datetime("2020-01", format="%Y-%m").to_period('M'))]
-    # Format the county FIPS as the state FIPS followed by the county FIPS
-    concatenate_fips = lambda x : int(str(x["state_fips"]) + "{:03d}".format(x["county_fips"]))
-    unemployment_df["COUNTYFP"] = unemployment_df.apply(concatenate_fips, axis=1)
-    # Keep only US mainland states
-    unemployment_df = unemployment_df[unemployment_df["COUNTYFP"] < 57000]
-    # Calculate for each record the number of month since the start
-    first_month = unemployment_df["month"].min()
-    unemployment_df["unemployment_rate"] = unemployment_df["unemployment_rate"].astype("float64")
-    unemployment_df.drop(columns=["state_fips", "county_fips", "LAUS_code","year","footnotes"], inplace=True)
+    #
+    unemployment_df = getUnemploymentRates("2020-01", month_since_start=False)
     #
     # Prepare and merge Covid case and death rates data
     #
@@ -191,6 +373,7 @@ def getUnemploymentCovidBase():
     return unemployment_covid_df
 
 
+@profiled
 def getUnemploymentCovidCorrelationPerMonth(df=None):
     """
     This ETL function takes or reads the dataset of counties monthly unemployment and Covid rates and political
@@ -239,6 +422,7 @@ def getUnemploymentCovidCorrelationPerMonth(df=None):
     return unemployment_covid_correlation_df
 
 
+@profiled
 def getJuly2020UnemploymentAndMask(df=None):
     """
     This ETL function takes the following datasets:
@@ -254,7 +438,7 @@ def getJuly2020UnemploymentAndMask(df=None):
         unemployment_covid_df = getUnemploymentCovidBase()
     else:
         unemployment_covid_df = df.copy()
-    county_mask_df = pd.read_csv( DataFolder / r"mask-use-by-county.csv",index_col=0)
+    county_mask_df = readSourceData(DataFolder / r"mask-use-by-county.csv", copy=False, index_col=0)
     july_2020 = pd.to_datetime("2020-07", format="%Y-%m").to_period('M')
 
     # Mask Data are from July 2020
@@ -317,6 +501,7 @@ def getJuly2020UnemploymentAndMask(df=None):
     return unemployment_freq_mask_july_df, unemployment_infreq_mask_july_df
 
 
+@profiled
 def getUnemploymentVaccineCorrelationPerMonth(df=None):
     """
     This ETL function:
@@ -340,8 +525,8 @@ def getUnemploymentVaccineCorrelationPerMonth(df=None):
     unemployment_df = unemployment_df[unemployment_df["month_since_start"] != 1]
     unemployment_df.drop(columns=["month_since_start"], inplace=True)
 
-    county_vaccine_df = pd.read_csv(DataFolder / r"COVID-19_Vaccinations_in_the_United_States_County.zip",
-                                    compression="zip")
+    county_vaccine_df = readSourceData(DataFolder / r"COVID-19_Vaccinations_in_the_United_States_County.zip",
+                                       copy=False, compression="zip")
     county_vaccine_df = county_vaccine_df[["Date", "FIPS", "Recip_County", "Recip_State", "Administered_Dose1_Pop_Pct"]]
     county_vaccine_df = county_vaccine_df.rename(
         columns={
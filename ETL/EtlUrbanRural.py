@@ -5,7 +5,7 @@ import altair as alt
 import sys
 
 sys.path.append("../ETL")
-from .EtlBase import DataFolder
+from .EtlBase import DataFolder, readSourceData, profiled
 from .EtlCovid import (
     getRollingCaseAverageSegmentLevel,
     getCasesRollingAveragePer100K,
@@ -18,6 +18,7 @@ from .EtlElection import (
 
 #########################################################################################################
 
+@profiled
 def GetCountyUrbanRuralData():
     '''
     Reads in an Excel file with Census Bureau urban/rural designation of US counties.    
@@ -32,7 +33,7 @@ def GetCountyUrbanRuralData():
     '''
 
     # Note: Data input file path
-    CountyUrbanRural = pd.read_excel(DataFolder / 'County_Rural_Lookup.xlsx',skiprows=3, usecols='A:H')
+    CountyUrbanRural = readSourceData(DataFolder / 'County_Rural_Lookup.xlsx', skiprows=3, usecols='A:H')
     
     # Drop last six rows of footnotes
     CountyUrbanRural = CountyUrbanRural[:-6]
@@ -56,6 +57,7 @@ def GetCountyUrbanRuralData():
 
 #########################################################################################################
 
+@profiled
 def GetCountyElectionData():
     '''
     Reads in a CSV file with county-level presidential election results.
@@ -74,7 +76,7 @@ def GetCountyElectionData():
 
     # Election data by county 2000-2020
     # Note: Data input file path
-    PECountyDF = pd.read_csv(DataFolder / 'countypres_2000-2020.csv')
+    PECountyDF = readSourceData(DataFolder / 'countypres_2000-2020.csv', copy=False)
     
     # Only interested in 2020
     PECountyDF = PECountyDF[PECountyDF['year'] == 2020]
@@ -110,6 +112,7 @@ def GetCountyElectionData():
 
 #########################################################################################################
 
+@profiled
 def MergeElectionUrbanRural():
     '''
     Merges the urban/rural designation of the counties with the county-level
@@ -139,6 +142,7 @@ def MergeElectionUrbanRural():
     return ElecUrbanRuralDF
 
 #########################################################################################################
+@profiled
 def getUrbanRuralElectionRollingData(df:pd.DataFrame()=None):
     urban_rural_election_df = getElectionData(df)
     urban_rural_segment_df = getElectionSegmentsData(election_winners_df=urban_rural_election_df)
@@ -146,6 +150,7 @@ def getUrbanRuralElectionRollingData(df:pd.DataFrame()=None):
     final_df = getRollingCaseAverageSegmentLevel(case_rolling_df, urban_rural_segment_df)
     return final_df
 
+@profiled
 def getUrbanRuralAvgDeathsData(df:pd.DataFrame()=None):
     urban_rural_election_df = getElectionData(df)
     urban_rural_segment_df = getElectionSegmentsData(election_winners_df=urban_rural_election_df)
@@ -153,6 +158,7 @@ def getUrbanRuralAvgDeathsData(df:pd.DataFrame()=None):
     final_df = getPercentilePointChageDeathsData(case_rolling_df, urban_rural_segment_df)
     return final_df
 
+@profiled
 def CountyElecUrbanRuralSplit(etl_function=getUrbanRuralElectionRollingData):
     '''
     Reads in a CSV file with county-level presidential election results.
@@ -181,7 +187,7 @@ def CountyElecUrbanRuralSplit(etl_function=getUrbanRuralElectionRollingData):
     '''
     
     # Get full election results data once again.
-    CountyPresDF = pd.read_csv(DataFolder / 'countypres_2000-2020.csv')
+    CountyPresDF = readSourceData(DataFolder / 'countypres_2000-2020.csv', copy=False)
     
     # Get the urban/rural designation of each county
     CountyUrbanRural = GetCountyUrbanRuralData()
@@ -201,13 +207,14 @@ def CountyElecUrbanRuralSplit(etl_function=getUrbanRuralElectionRollingData):
 
 #########################################################################################################
 
+@profiled
 def UrbanRuralMaskData():
     '''
     Reads in mask usage by county data
     Returns two dataframes - urban and rural counties - with mask usage frequency
     '''
     # Read in county mask data
-    CountyMaskUseDF = pd.read_csv(DataFolder / 'mask-use-by-county.csv')
+    CountyMaskUseDF = readSourceData(DataFolder / 'mask-use-by-county.csv')
 
     # Add columns into Infrequent and Frequent
     CountyMaskUseDF['Infrequent'] = CountyMaskUseDF['NEVER'] \
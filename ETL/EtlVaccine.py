@@ -1,18 +1,25 @@
+import json
 import os
 import pickle
+import re
 import pandas as pd
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+import pyarrow.feather as feather
 import requests
 import sys
 
 sys.path.append("../ETL")
-from .EtlBase import DataFolder, US_STATE_ABBRV
+from .EtlBase import DataFolder, US_STATE_ABBRV, readSourceData, profiled, profileStep
+from .EtlFetch import readSocrataPages
+from .EtlStore import writeAtomically
 from .EtlElection import *
 
 
 ########################################################################################
+@profiled
 def createStateVaccinationData():
 
     """
@@ -38,8 +45,8 @@ def createStateVaccinationData():
                party_simplified  ..................................  (DEMOCRAT, REPUBLICAN, LIBERTARIAN or OTHER)
                fractionalvotes
     """
-    vaccination_df = pd.read_csv(
-        "./data/covid19_vaccinations_in_the_united_states.csv", skiprows=2,
+    vaccination_df = readSourceData(
+        "./data/covid19_vaccinations_in_the_united_states.csv", copy=False, skiprows=2,
     )
 
     # Select columns containing at least one dose per 100K since taking that one dose shows openness
@@ -61,8 +68,8 @@ def createStateVaccinationData():
     )
 
     # Read the county population CSV from local file
-    population_df = pd.read_csv(
-        "./data/County Data Till 2020 co-est2020-alldata.csv", encoding="latin-1",
+    population_df = readSourceData(
+        "./data/County Data Till 2020 co-est2020-alldata.csv", copy=False, encoding="latin-1",
     )
     state_pop_df = population_df[population_df["SUMLEV"] != 50].copy()
     state_pop_df = state_pop_df[["STATE", "STNAME", "POPESTIMATE2020"]]
@@ -107,6 +114,7 @@ def createStateVaccinationData():
 
 
 ########################################################################################
+@profiled
 def getDailyVaccinationPercentData():
     """
         This function retrieves the daily percentage of vaccinated people in each state
@@ -130,8 +138,8 @@ def getDailyVaccinationPercentData():
                  'day_num'
       
     """
-    vaccination_df = pd.read_csv(
-        "./data/COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv"
+    vaccination_df = readSourceData(
+        "./data/COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv", copy=False
     )
     ## Percent of population with at lease one dose based on the jurisdiction where recipient lives
     vaccination_df = vaccination_df[
@@ -149,8 +157,8 @@ def getDailyVaccinationPercentData():
     )
 
     # Read the persidential election CSV from local disk
-    population_df = pd.read_csv(
-        "./data/County Data Till 2020 co-est2020-alldata.csv", encoding="latin-1",
+    population_df = readSourceData(
+        "./data/County Data Till 2020 co-est2020-alldata.csv", copy=False, encoding="latin-1",
     )
     state_pop_df = population_df[population_df["SUMLEV"] != 50].copy()
     state_pop_df = state_pop_df[["STATE", "STNAME", "POPESTIMATE2020"]]
@@ -195,6 +203,114 @@ def getDailyVaccinationPercentData():
 #######################################################################################
 
 
+STATE_VACCINE_URL = "https://data.cdc.gov/resource/unsk-b7fc.csv"
+STATE_VACCINE_COLUMNS = [
+    "date",
+    "location",
+    "mmwr_week",
+    "administered_dose1_recip",
+    "administered_dose1_pop_pct",
+]
+# The number of people with one dose is left to the type inference (int64, or float64 if some values are missing)
+STATE_VACCINE_DTYPES = {
+    "date": str,
+    "location": str,
+    "mmwr_week": "int64",
+    "administered_dose1_pop_pct": "float64",
+}
+STATE_VACCINE_SHARD_PREFIX = "StateVaccineDataFile"
+STATE_VACCINE_COMBINED_FILE = DataFolder / "StateVaccineData.feather"
+# The shards the combined file was built from, next to it
+STATE_VACCINE_COMBINED_SHARDS_FILE = DataFolder / "StateVaccineData.shards.json"
+
+
+def downloadStateVaccinationData(app_token: str = None, page_size: int = 500000):
+    """
+        THIS FUNCTION downloads the state level vaccination data from the CDC Socrata API into the
+        StateVaccineDataFile*.csv shards read by getStateVaccinationDataWithAPI, one shard per page of page_size rows.
+        Only the columns used by getStateVaccinationDataWithAPI are downloaded.
+
+        Input arguments: app_token  Socrata application token (None to read it from APIToken.pickle)
+                         page_size  Number of rows per page and shard
+        Returns: The list of the shard paths
+    """
+    if app_token is None:
+        with open("APIToken.pickle", "rb") as pickle_in:
+            app_token = pickle.load(pickle_in)
+    return readSocrataPages(STATE_VACCINE_URL, app_token,
+                            columns=STATE_VACCINE_COLUMNS, dtype=STATE_VACCINE_DTYPES, page_size=page_size,
+                            shard_path=DataFolder / (STATE_VACCINE_SHARD_PREFIX + "{}.csv"))
+
+
+def getStateVaccinationShards():
+    """
+        THIS FUNCTION lists the StateVaccineDataFile* shards, ordered by shard number
+
+        Returns: The list of the shard paths
+    """
+    shard_number = lambda path: int(re.sub(r"\D", "", path.stem) or 0)
+    return sorted(DataFolder.glob(STATE_VACCINE_SHARD_PREFIX + "*"), key=shard_number)
+
+
+def describeStateVaccinationShards(shards: list):
+    """
+        THIS FUNCTION describes the StateVaccineDataFile* shards by their name, size and modification time, to tell
+        if the combined file was built from the same shards
+
+        Input arguments: shards  The list of the shard paths
+        Returns: The list of [name, size, modification time in ns] of the shards, in order
+    """
+    return [[shard.name, shard.stat().st_size, shard.stat().st_mtime_ns] for shard in shards]
+
+
+def readStateVaccinationShard(shard: Path):
+    """
+        THIS FUNCTION reads the columns used by getStateVaccinationDataWithAPI of a StateVaccineDataFile* shard.
+        The shard is read with pandas rather than readSourceData: it is only read to be concatenated, so the
+        registry of the raw source files would hold its rows a second time for the life of the process.
+
+        Input arguments: shard  The path of the shard
+        Returns: Dataframe with the STATE_VACCINE_COLUMNS columns of the shard
+    """
+    with profileStep(f"read {shard.name}", "read") as step:
+        df = pd.read_csv(shard, usecols=STATE_VACCINE_COLUMNS, dtype=STATE_VACCINE_DTYPES)
+        step["rows_out"] = len(df)
+    return df
+
+
+@profiled
+def readStateVaccinationShards(max_workers: int = 4, combined: bool = False):
+    """
+        THIS FUNCTION reads the StateVaccineDataFile* shards in parallel, keeping only the columns used by
+        getStateVaccinationDataWithAPI, and concatenates them at once.
+        With combined=True, the concatenated shards are also saved in a columnar (Arrow IPC / feather) file which is
+        then memory-mapped by the next calls, as long as the shards are the ones it was built from (same names,
+        sizes and modification times, no shard added or removed).
+
+        Input arguments: max_workers  Number of shards read concurrently
+                         combined     Whether to use the combined memory-mapped columnar file
+        Returns: Dataframe with the STATE_VACCINE_COLUMNS columns of all the shards
+    """
+    shards = getStateVaccinationShards()
+    shards_description = describeStateVaccinationShards(shards)
+    if combined and STATE_VACCINE_COMBINED_FILE.exists() and STATE_VACCINE_COMBINED_SHARDS_FILE.exists():
+        with open(STATE_VACCINE_COMBINED_SHARDS_FILE) as file:
+            if json.load(file) == shards_description:
+                return feather.read_table(STATE_VACCINE_COMBINED_FILE, memory_map=True).to_pandas()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        shard_dfs = list(executor.map(readStateVaccinationShard, shards))
+    state_vaccine_df = pd.concat(shard_dfs, ignore_index=True)[STATE_VACCINE_COLUMNS]
+    if combined:
+        writeAtomically(STATE_VACCINE_COMBINED_FILE,
+                        lambda path: feather.write_feather(state_vaccine_df, path))
+        # Written after the combined file: an interrupted run leaves the previous list, matching only unchanged shards
+        writeAtomically(STATE_VACCINE_COMBINED_SHARDS_FILE,
+                        lambda path: path.write_text(json.dumps(shards_description)))
+    return state_vaccine_df
+
+
+@profiled
 def getStateVaccinationDataWithAPI():
 
     """ 
@@ -213,45 +329,15 @@ def getStateVaccinationDataWithAPI():
     """
 
     ##########################################################################################################
-    # # ### Read the pickle file with stored token
-    # pickle_in = open("APIToken.pickle","rb")
-    # APITokenIn = pickle.load(pickle_in)
-    # curr_offset = 0
-    # num_file = 1
-    # url = f"https://data.cdc.gov/resource/unsk-b7fc.csv?$$app_token={APITokenIn}&$limit=500000&$offset={curr_offset}&$order=date"
-    # response = requests.request("GET", url)
-    # df = csv_to_dataframe(response)
-    # #df.to_csv(r'..\DataForPresidentialElectionsAndCovid\Dataset 9 State Vaccine Data Using API\StateVaccineDataFile1.csv')
-    # curr_offset = curr_offset + 500000
-    # num_file = num_file + 1
-    # state_vaccine_df = df[['date','location','mmwr_week', 'administered_dose1_recip',  'administered_dose1_recip', 'administered_dose1_pop_pct', ]].copy()
-
-    ############### When developing comment above and uncomment out read from file below ###########################
-    folder_name = os.listdir(DataFolder)
-    path_name = DataFolder
-
-    state_vaccine_df = pd.DataFrame()
-    for name in folder_name:
-        if name.startswith("StateVaccineDataFile"):
-            df = pd.read_csv(path_name / name)
-            df = df[
-                [
-                    "date",
-                    "location",
-                    "mmwr_week",
-                    "administered_dose1_recip",
-                    "administered_dose1_pop_pct",
-                ]
-            ].copy()
-            if len(df) > 0:
-                state_vaccine_df = state_vaccine_df.append(df, ignore_index=True)
-                # print(name)
+    # The StateVaccineDataFile* shards are downloaded from the CDC API by downloadStateVaccinationData
+    state_vaccine_df = readStateVaccinationShards()
 
     #########################################################################################################
 
     # Read the county population CSV from local file
-    population_df = pd.read_csv(
+    population_df = readSourceData(
         DataFolder / r"County Data Till 2020 co-est2020-alldata.csv",
+        copy=False,
         encoding="latin-1",
     )
     state_pop_df = population_df[population_df["SUMLEV"] != 50].copy()
@@ -292,12 +378,12 @@ def getStateVaccinationDataWithAPI():
     )
     # state_vaccine_df['vacc_rank'] = state_vaccine_df['state'] + " "  + state_vaccine_df['vacc_rank'].astype(str)
 
-    us_case_rolling_df = pd.read_csv(
+    us_case_rolling_df = readSourceData(
         "https://raw.githubusercontent.com/nytimes/covid-19-data/master/rolling-averages/us.csv"
     )
     us_case_rolling_df["date"] = pd.to_datetime(us_case_rolling_df["date"])
 
-    state_case_rolling_df = pd.read_csv(
+    state_case_rolling_df = readSourceData(
         "https://raw.githubusercontent.com/nytimes/covid-19-data/master/rolling-averages/us-states.csv"
     )
     # state_case_rolling_df.to_csv(DataFolder / r"Dataset 7 Covid/July_21_rolling_average_us-states.csv")
@@ -1,12 +1,35 @@
+import importlib
+import os
+import time
+
 import streamlit as st
 
+# Set to 1 to show the render profile of each page in the sidebar, see MultiPage.run_profiled
+PROFILE_ENVIRONMENT_VARIABLE = "APP_PROFILE"
+
 # Define the multipage class to manage the multiple apps in our program
 class MultiPage:
-    """Framework for combining multiple streamlit applications."""
+    """Framework for combining multiple streamlit applications.
+
+    The pages can be registered by module name: the module of a page, with the Visualization and ETL modules it
+    imports, is then only imported the first time the page is selected, so that the start of the app and the first
+    page do not pay for the imports of the other pages.
+
+    The render profiler is opt-in (MultiPage(profile=True) or APP_PROFILE=1): it times the import of the page, its
+    load_* functions, the Viz chart factories, the compilation of the chart specs and their hand-off to Streamlit,
+    and shows the breakdown in the sidebar.
+    """
 
-    def __init__(self) -> None:
-        """Constructor class to generate a list which will store all our applications as an instance variable."""
+    def __init__(self, profile=None) -> None:
+        """Constructor class to generate a list which will store all our applications as an instance variable.
+
+        Args:
+            profile ([bool]): Whether to profile the rendering of the pages (default from the APP_PROFILE variable)
+        """
         self.pages = []
+        if profile is None:
+            profile = os.environ.get(PROFILE_ENVIRONMENT_VARIABLE, "") not in ("", "0")
+        self.profile = profile
 
     def add_page(self, title, func) -> None:
         """Class Method to Add pages to the project
@@ -14,11 +37,28 @@ class MultiPage:
         Args:
             title ([str]): The title of page which we are adding to the list of apps 
             
-            func: Python function to render this page in Streamlit
+            func: Python function to render this page in Streamlit, or the name of the module defining it
+                  ("pages.political" for its app function, or "pages.political:app") to import it lazily
         """
 
         self.pages.append({"title": title, "function": func})
 
+    @staticmethod
+    def load_page_function(func):
+        """Static Method to get the function rendering a page, importing its module if it was registered by name
+
+        Args:
+            func: Python function, or name of the module defining it ("module" or "module:function")
+
+        Returns:
+            The function rendering the page
+        """
+        if callable(func):
+            return func
+        module_name, _, function_name = func.partition(":")
+        # importlib keeps the imported modules in sys.modules, the page is imported once per process
+        return getattr(importlib.import_module(module_name), function_name or "app")
+
     def run(self):
         # Drodown to select the page to run
         page = st.sidebar.selectbox(
@@ -38,4 +78,54 @@ class MultiPage:
         
 
         # run the app function
-        page["function"]()
+        if self.profile:
+            self.run_profiled(page)
+        else:
+            self.load_page_function(page["function"])()
+
+    def run_profiled(self, page):
+        """Class Method to render a page while recording its steps, then show them in the sidebar
+
+        The steps are recorded for the thread of the current session only (see ETL.EtlBase.recordProfile): the
+        profile of a rerun does not include the steps of the other sessions.
+
+        Args:
+            page ([dict]): The page to render, as registered by add_page
+        """
+        # Imported here so that the app does not import the ETL modules when it is not profiled
+        from ETL.EtlBase import recordProfile, profileStep, getProfileRecords, summarizeProfile
+
+        start = time.perf_counter()
+        with recordProfile() as records:
+            with profileStep(f"import {page['title']}", "import"):
+                page_function = self.load_page_function(page["function"])
+            with profileStep(page["title"], "page"):
+                page_function()
+        seconds = time.perf_counter() - start
+        self.show_profile(page["title"], seconds, summarizeProfile(getProfileRecords(records)))
+
+    @staticmethod
+    def show_profile(title, seconds, summary):
+        """Static Method to show the render profile of a page in the sidebar and print it in the server logs
+
+        Args:
+            title ([str]): The title of the page
+            seconds ([float]): The total render time of the page
+            summary ([list]): The recorded steps aggregated by kind and name (see ETL.EtlBase.summarizeProfile)
+        """
+        import pandas as pd
+
+        profile_df = pd.DataFrame(summary, columns=["category", "name", "calls", "cached", "self_seconds", "seconds",
+                                                    "rows_out", "bytes", "rss_delta_mb"])
+        profile_df = profile_df.rename(columns={
+            "category": "kind", "name": "step", "self_seconds": "self (s)", "seconds": "total (s)", "rows_out": "rows",
+            "bytes": "spec (KB)", "rss_delta_mb": "memory (MB)"})
+        profile_df["spec (KB)"] = profile_df["spec (KB)"] / 1024
+
+        st.sidebar.markdown('##')
+        st.sidebar.subheader("Render profile")
+        st.sidebar.markdown(f"{title} rendered in {seconds:.2f}s. Time in the step itself (self) and with its nested "
+                            f"steps (total); click a column to sort.")
+        st.sidebar.dataframe(profile_df.round(3))
+        print(f"Render profile of {title} ({seconds:.2f}s)")
+        print(profile_df.round(3).to_string(index=False))
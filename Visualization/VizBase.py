@@ -5,18 +5,20 @@ import sys
 from vega_datasets import data
 
 sys.path.append("../ETL")
-from ETL.EtlBase import segment_color_dict
+from ETL.EtlBase import segment_color_dict, profiled
 from ETL.EtlElection import *
 from ETL.EtlCovid import *
+from Visualization.VizData import enableDataTransformer
+from Visualization.VizCache import cachedChart
 
 # Formatting in Altair follows : https://github.com/d3/d3-format
-# uses intermediate json files to speed things up
-alt.data_transformers.enable("json")
-alt.data_transformers.disable_max_rows()
+# datasets are written once per content, see VizData.py
+enableDataTransformer()
 
 
 
 ########################################################################################
+@cachedChart
 def createCovidConfirmedTimeseriesChart(case_rolling_df):
     """
       THIS FUNCTION uses the 'base' encoding chart created by getBaseChart() to create a line chart.
@@ -159,6 +161,7 @@ def getBaseChart(case_rolling_df, date_range):
 
 
 ########################################################################################
+@profiled(category="chart")
 def createTooltip(base, radio_select, case_rolling_df):
     """
       THIS FUNCTION uses the 'base' encoding chart and the selection captured to create four elements
@@ -172,8 +175,9 @@ def createTooltip(base, radio_select, case_rolling_df):
     """
 
     # Create a selection that chooses the nearest point & selects based on x-value
+    # (named, so that the chart spec is the same on every rerun and its cached spec can be reused)
     nearest = alt.selection(
-        type="single", nearest=True, on="mouseover", fields=["date"], empty="none"
+        name="nearest_date", type="single", nearest=True, on="mouseover", fields=["date"], empty="none"
     )
 
     # Transparent selectors across the chart. This is what tells us
@@ -0,0 +1,339 @@
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+
+from ETL.EtlBase import ProcessedDataFolder, profileStep
+from ETL.EtlCache import LruCache
+
+#
+# Bundle of the finished Vega-Lite specs of the page charts, rendered by the packager (package_processed_datasets.py
+# --specs) so that the pages display their charts without any pandas or Altair work.
+#
+# Each bundle is a version folder of the spec folder (data/specs/<version>/), the version being the hash of the
+# processed datasets (the content of their files), of the Viz modules and of the Altair version. A spec is saved as
+# <chart name>.json with its datasets as external data URLs (data/<content name>.json in the version folder, compact
+# JSON records written once per content). current.json names the current version and the processed datasets it was
+# rendered from: the pages fall back to building their charts (see VizPages.py) when the processed datasets changed
+# since, or when there is no bundle.
+# Streamlit does not serve the files of the app folder, so the datasets of a spec are read back and embedded by name
+# when it is displayed, unless SPEC_DATA_BASE_URL gives the URL where the spec folder is published (e.g. a static file
+# server or a CDN), in which case the browser downloads them.
+#
+
+SpecBundleFolder = ProcessedDataFolder / "specs"
+CURRENT_BUNDLE_FILE = "current.json"
+BUNDLE_VERSIONS_KEPT = 3
+SPEC_DATA_BASE_URL_VARIABLE = "SPEC_DATA_BASE_URL"
+BUNDLE_CACHE_MAX_BYTES = 128 * 1024 * 1024
+# Files of the processed datasets folder hashed into the datasets version
+DATASET_FILE_PATTERNS = ["*.csv", "*.parquet", "*.arrow"]
+
+# Specs read from the bundle, ready to display, by path and modification time
+_bundle_cache = LruCache(max_bytes=BUNDLE_CACHE_MAX_BYTES)
+# Content hash of the dataset files, by path, size and modification time
+_file_hashes = {}
+
+
+########################################################################################
+def hashDatasetFile(path: Path, status: os.stat_result):
+    """
+      THIS FUNCTION returns the content hash of a file of the processed datasets, hashed once per process as long as
+      the file is not modified
+
+      Functions called: None
+      Called by: getDatasetsVersion()
+
+      Input: path   - the path of the file
+             status - the stat of the file
+      Returns: The hexadecimal SHA-256 hash
+    """
+    key = (str(path), status.st_size, status.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def getDatasetsVersion(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION returns the version of the processed datasets: the hash of the names and contents of their files.
+      It does not depend on the modification times, so a bundle stays valid when the datasets and the bundle are
+      copied or checked out together.
+
+      Functions called: hashDatasetFile()
+      Called by: writeSpecBundle(), loadBundledSpec()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The hexadecimal SHA-256 hash, or None if the folder holds no dataset
+    """
+    digest = hashlib.sha256()
+    paths = sorted(path for pattern in DATASET_FILE_PATTERNS for path in Path(folder).glob(pattern))
+    for path in paths:
+        try:
+            file_hash = hashDatasetFile(path, path.stat())
+        except FileNotFoundError:
+            continue
+        digest.update(f"{path.name}:{file_hash}".encode())
+    return digest.hexdigest() if paths else None
+
+
+def getBundleVersion(datasets_version: str, chart_names: list):
+    """
+      THIS FUNCTION returns the version of a spec bundle from everything its specs depend on: the processed
+      datasets, the code of the Viz modules, the Altair version and the charts
+
+      Functions called: None
+      Called by: writeSpecBundle()
+
+      Input: datasets_version - the version of the processed datasets
+             chart_names      - the names of the charts of the bundle
+      Returns: The first 16 characters of the hexadecimal SHA-256 hash
+    """
+    import altair as alt
+
+    digest = hashlib.sha256()
+    digest.update(json.dumps([datasets_version, alt.__version__, sorted(chart_names)]).encode())
+    for path in sorted(Path(__file__).parent.glob("Viz*.py")):
+        digest.update(path.name.encode())
+        digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def mapDataReferences(spec, rewrite):
+    """
+      THIS FUNCTION rewrites the data references of a spec: the "data" properties of its views and of its lookup
+      transforms
+
+      Functions called: mapDataReferences()
+      Called by: externalizeDatasets(), resolveDataUrls()
+
+      Input: spec    - the spec or any part of it
+             rewrite - function returning the new data reference of a data reference, or None to keep it
+      Returns: The rewritten copy of the spec
+    """
+    if isinstance(spec, list):
+        return [mapDataReferences(item, rewrite) for item in spec]
+    if not isinstance(spec, dict):
+        return spec
+    result = {}
+    for key, value in spec.items():
+        if key == "data" and isinstance(value, dict):
+            value = rewrite(value) or value
+        result[key] = mapDataReferences(value, rewrite)
+    return result
+
+
+def externalizeDatasets(spec: dict, version_folder: Path):
+    """
+      THIS FUNCTION moves the datasets of a spec to the data files of the version folder, referenced by relative URL
+
+      Functions called: mapDataReferences(), EtlStore.writeAtomically()
+      Called by: writeSpecBundle()
+
+      Input: spec           - the spec returned by chartToSpec, with its datasets as lists of records
+             version_folder - the version folder of the bundle
+      Returns: The spec with external data URLs
+    """
+    from ETL.EtlStore import writeAtomically
+
+    datasets = spec.get("datasets", {})
+    for name, records in datasets.items():
+        path = Path(version_folder) / "data" / f"{name}.json"
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            writeAtomically(path, lambda temporary_path: temporary_path.write_text(
+                json.dumps(records, separators=(",", ":"))))
+
+    def toUrl(data):
+        if data.get("name") not in datasets:
+            return None
+        reference = {"url": f"data/{data['name']}.json", "format": {"type": "json"}}
+        reference.update({key: value for key, value in data.items() if key != "name"})
+        return reference
+
+    spec = {key: value for key, value in spec.items() if key != "datasets"}
+    return mapDataReferences(spec, toUrl)
+
+
+def resolveDataUrls(spec: dict, version_folder: Path, base_url: str = None):
+    """
+      THIS FUNCTION makes the data URLs of a bundled spec usable by the browser: prefixed with the URL where the
+      bundle is published, or else replaced by the datasets read from the version folder and embedded by name
+
+      Functions called: mapDataReferences()
+      Called by: loadBundledSpec()
+
+      Input: spec           - the bundled spec
+             version_folder - the version folder of the bundle
+             base_url       - the URL of the published spec folder (None to embed the datasets)
+      Returns: The spec to display
+    """
+    datasets = {}
+
+    def resolve(data):
+        url = data.get("url", "")
+        if not url.startswith("data/"):
+            return None
+        if base_url:
+            return {**data, "url": f"{base_url.rstrip('/')}/{Path(version_folder).name}/{url}"}
+        name = Path(url).stem
+        if name not in datasets:
+            with open(Path(version_folder) / url) as file:
+                datasets[name] = json.load(file)
+        reference = {key: value for key, value in data.items() if key != "url"}
+        if reference.get("format") == {"type": "json"}:
+            del reference["format"]
+        return {"name": name, **reference}
+
+    spec = mapDataReferences(spec, resolve)
+    if datasets:
+        spec["datasets"] = datasets
+    return spec
+
+
+########################################################################################
+def pruneSpecBundles(bundle_folder: Path = SpecBundleFolder, current_version: str = None,
+                     versions_kept: int = BUNDLE_VERSIONS_KEPT):
+    """
+      THIS FUNCTION deletes the oldest version folders of the spec folder, keeping the current version and the most
+      recent ones (a running app may still display the previous version)
+
+      Functions called: None
+      Called by: writeSpecBundle()
+
+      Input: bundle_folder   - the spec folder
+             current_version - the version never deleted
+             versions_kept   - the number of version folders kept
+      Returns: None
+    """
+    folders = sorted((path for path in Path(bundle_folder).iterdir() if path.is_dir()),
+                     key=lambda path: (path.name == current_version, path.stat().st_mtime), reverse=True)
+    for folder in folders[versions_kept:]:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def writeSpecBundle(charts: dict, data_folder: Path = ProcessedDataFolder, bundle_folder: Path = SpecBundleFolder):
+    """
+      THIS FUNCTION renders the page charts into a new version of the spec bundle and makes it the current one
+
+      Functions called: getDatasetsVersion(), getBundleVersion(), VizData.chartToSpec(), externalizeDatasets(),
+                        pruneSpecBundles()
+      Called by: package_processed_datasets.py
+
+      Input: charts        - chart name -> builder taking the folder of the processed datasets (VizPages.PAGE_CHARTS)
+             data_folder   - the folder of the processed datasets
+             bundle_folder - the spec folder
+      Returns: The version folder of the bundle
+    """
+    from ETL.EtlStore import writeAtomically
+    from Visualization.VizData import chartToSpec
+
+    datasets_version = getDatasetsVersion(data_folder)
+    version = getBundleVersion(datasets_version, list(charts))
+    version_folder = Path(bundle_folder) / version
+    version_folder.mkdir(parents=True, exist_ok=True)
+    for name, build in charts.items():
+        with profileStep(name, "bundle"):
+            spec = externalizeDatasets(chartToSpec(build(data_folder)), version_folder)
+        writeAtomically(version_folder / f"{name}.json",
+                        lambda path: path.write_text(json.dumps(spec, separators=(",", ":"))))
+        print(f"{name} - rendered in {version_folder / name}.json")
+
+    current = {"version": version, "datasets": datasets_version, "charts": sorted(charts)}
+    writeAtomically(Path(bundle_folder) / CURRENT_BUNDLE_FILE,
+                    lambda path: path.write_text(json.dumps(current, indent=2)))
+    pruneSpecBundles(bundle_folder, version)
+    return version_folder
+
+
+def readJsonFile(path: Path):
+    """
+      THIS FUNCTION reads a JSON file through the bundle cache, read again when the file is modified
+
+      Functions called: None
+      Called by: loadBundledSpec()
+
+      Input: path - the path of the JSON file
+      Returns: The parsed content, or None if the file does not exist
+    """
+    try:
+        status = Path(path).stat()
+    except FileNotFoundError:
+        return None
+    key = ("json", str(path), status.st_mtime_ns, status.st_size)
+    content = _bundle_cache.get(key)
+    if content is None:
+        with open(path) as file:
+            content = _bundle_cache.put(key, json.load(file), status.st_size)
+    return content
+
+
+def loadBundledSpec(name: str, data_folder: Path = ProcessedDataFolder, bundle_folder: Path = SpecBundleFolder):
+    """
+      THIS FUNCTION returns the spec of a page chart from the current bundle, ready to display. The returned spec is
+      shared and must not be modified.
+
+      Functions called: readJsonFile(), getDatasetsVersion(), resolveDataUrls()
+      Called by: showPageChart()
+
+      Input: name          - the name of the chart (a key of VizPages.PAGE_CHARTS)
+             data_folder   - the folder of the processed datasets
+             bundle_folder - the spec folder
+      Returns: The spec, or None if there is no bundle, if it was rendered from other processed datasets or if it has
+               no such chart
+    """
+    current = readJsonFile(Path(bundle_folder) / CURRENT_BUNDLE_FILE)
+    if current is None or name not in current["charts"]:
+        return None
+    if current["datasets"] is None or current["datasets"] != getDatasetsVersion(data_folder):
+        return None
+
+    version_folder = Path(bundle_folder) / current["version"]
+    spec_path = version_folder / f"{name}.json"
+    base_url = os.environ.get(SPEC_DATA_BASE_URL_VARIABLE)
+    try:
+        status = spec_path.stat()
+    except FileNotFoundError:
+        return None
+    key = ("spec", str(spec_path), status.st_mtime_ns, base_url)
+    spec = _bundle_cache.get(key)
+    if spec is None:
+        spec = resolveDataUrls(readJsonFile(spec_path), version_folder, base_url)
+        # Sized by its files, the estimate of estimateBytes walking every record being much slower
+        size = status.st_size + sum((version_folder / "data" / f"{dataset}.json").stat().st_size
+                                    for dataset in spec.get("datasets", {}))
+        spec = _bundle_cache.put(key, spec, size)
+    return spec
+
+
+def showPageChart(name: str, folder: Path = ProcessedDataFolder, use_container_width: bool = False, container=None,
+                  bundle_folder: Path = SpecBundleFolder):
+    """
+      THIS FUNCTION displays a page chart from the spec bundle, or builds it when it is not in the current bundle
+
+      Functions called: loadBundledSpec(), VizPages.PAGE_CHARTS, VizData.showChart()
+      Called by: the Streamlit pages
+
+      Input: name                - the name of the chart (a key of VizPages.PAGE_CHARTS)
+             folder              - the folder of the processed datasets
+             use_container_width - True to use the width of the Streamlit container
+             container           - the Streamlit container (e.g. a column) to display the chart in, default the page
+             bundle_folder       - the spec folder
+    """
+    import streamlit as st
+
+    with profileStep(name, "bundle") as step:
+        spec = loadBundledSpec(name, folder, bundle_folder)
+        step["cached"] = spec is not None
+    if spec is None:
+        from Visualization.VizData import showChart
+        from Visualization.VizPages import PAGE_CHARTS
+
+        return showChart(PAGE_CHARTS[name](folder), use_container_width=use_container_width, container=container)
+    with profileStep(name, "send"):
+        return (container or st).vega_lite_chart(spec, use_container_width=use_container_width)
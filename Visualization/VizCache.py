@@ -0,0 +1,166 @@
+import functools
+import hashlib
+import json
+import warnings
+
+import altair as alt
+import pandas as pd
+
+from ETL.EtlBase import profileStep
+from ETL.EtlCache import LruCache, estimateBytes
+
+#
+# Memoization of the chart factories of the Viz modules (createUnemploymentChart, ...) across the Streamlit reruns
+# and sessions. A factory decorated with cachedChart returns the same chart objects, without rebuilding them, when it
+# is called again with dataframes of the same content (and the same other arguments). The compiled specs of the
+# charts are cached in VizData.chartToSpec.
+#
+
+CHART_CACHE_MAX_ENTRIES = 128
+CHART_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+_chart_cache = LruCache(CHART_CACHE_MAX_ENTRIES, CHART_CACHE_MAX_BYTES)
+
+
+########################################################################################
+def fingerprintData(df: pd.DataFrame):
+    """
+      THIS FUNCTION returns the hash of the content of a dataframe: its columns, their types and their values
+
+      Functions called: None
+      Called by: getDatasetName(), fingerprintArguments()
+
+      Input: df - the dataframe
+      Returns: The hexadecimal SHA-256 hash
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode())
+    try:
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    except TypeError:
+        # Unhashable values (e.g. lists), hash their JSON representation instead
+        digest.update(df.to_json(orient="values", date_format="iso").encode())
+    return digest.hexdigest()
+
+
+def fingerprintArguments(args: tuple, kwargs: dict):
+    """
+      THIS FUNCTION returns the hash of the arguments of a chart factory, or None if they cannot be fingerprinted
+      (arguments other than dataframes, series, None, numbers, strings and lists of them) or if there is no
+      dataframe among them (the factory then reads its data from disk itself)
+
+      Functions called: fingerprintData()
+      Called by: cachedChart()
+
+      Input: args   - the positional arguments
+             kwargs - the keyword arguments
+      Returns: The hexadecimal SHA-256 hash or None
+    """
+    has_data = False
+
+    def describe(value):
+        nonlocal has_data
+        if isinstance(value, pd.Series):
+            value = value.to_frame()
+        if isinstance(value, pd.DataFrame):
+            has_data = True
+            return ["DataFrame", fingerprintData(value)]
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, (list, tuple)):
+            return [describe(item) for item in value]
+        if isinstance(value, dict):
+            return {str(key): describe(item) for key, item in value.items()}
+        raise TypeError(f"Cannot fingerprint {type(value).__name__}")
+
+    try:
+        description = json.dumps([describe(list(args)), describe(kwargs)], sort_keys=True)
+    except TypeError:
+        return None
+    return hashlib.sha256(description.encode()).hexdigest() if has_data else None
+
+
+def getChartData(value, frames: list = None):
+    """
+      THIS FUNCTION lists the dataframes held by charts, to estimate the memory of a cached factory result
+
+      Functions called: getChartData()
+      Called by: cachedChart()
+
+      Input: value  - chart, list or tuple of charts, or any part of a chart
+             frames - the list of the dataframes to update
+      Returns: The list of the dataframes
+    """
+    frames = [] if frames is None else frames
+    if isinstance(value, pd.DataFrame):
+        frames.append(value)
+    elif isinstance(value, alt.SchemaBase):
+        for item in value._kwds.values():
+            getChartData(item, frames)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            getChartData(item, frames)
+    elif isinstance(value, dict):
+        for item in value.values():
+            getChartData(item, frames)
+    return frames
+
+
+def cachedChart(factory):
+    """
+      THIS FUNCTION is the decorator memoizing a chart factory on the content of its dataframe arguments.
+      The cached charts are shared by the sessions: they must not be modified in place (the Altair methods such as
+      properties() or configure_title() return modified copies). The factory must not modify its dataframe
+      arguments either: the charts are stored under the fingerprint of the arguments after the call, so that the
+      next call with the same (modified) dataframes finds them, and a warning names the factory.
+
+      Functions called: fingerprintArguments(), getChartData(), profileStep()
+      Called by: the Viz modules
+
+      Input: factory - the chart factory function
+      Returns: The memoized factory function
+    """
+    name = f"{factory.__module__}.{factory.__qualname__}"
+
+    @functools.wraps(factory)
+    def memoizedFactory(*args, **kwargs):
+        # The calls are recorded by the render profiler of the app (see Multiapp.py), cached or not
+        with profileStep(factory.__name__, "chart") as step:
+            fingerprint = fingerprintArguments(args, kwargs)
+            if fingerprint is None:
+                return factory(*args, **kwargs)
+            key = (name, fingerprint)
+            charts = _chart_cache.get(key)
+            step["cached"] = charts is not None
+            if charts is None:
+                charts = factory(*args, **kwargs)
+                stored_fingerprint = fingerprintArguments(args, kwargs)
+                if stored_fingerprint != fingerprint:
+                    warnings.warn(f"{name} modified its dataframe arguments, copy them before changing them")
+                    key = (name, stored_fingerprint)
+                _chart_cache.put(key, charts, estimateBytes(getChartData(charts)))
+            return charts
+
+    return memoizedFactory
+
+
+def getChartCacheStats():
+    """
+      THIS FUNCTION reports the metrics of the chart factory cache
+
+      Functions called: None
+      Called by: None (diagnostics)
+
+      Returns: Dictionary of the hits, misses, evictions, number of entries and resident bytes
+    """
+    return _chart_cache.stats()
+
+
+def clearChartCache():
+    """
+      THIS FUNCTION empties the chart factory cache, e.g. after the processed datasets were rebuilt
+
+      Functions called: None
+      Called by: None (diagnostics)
+    """
+    _chart_cache.clear()
@@ -7,12 +7,14 @@ sys.path.append("../ETL")
 from ETL.EtlElection import *
 from ETL.EtlCovid import *
 from .VizBase import *
+from .VizData import enableDataTransformer
+from .VizCache import cachedChart
 
-# uses intermediate json files to speed things up
-alt.data_transformers.enable("json")
-alt.data_transformers.disable_max_rows()
+# datasets are written once per content, see VizData.py
+enableDataTransformer()
 
 
+@cachedChart
 def createPercentPointChangeAvgDeathsChart(df: pd.DataFrame() = None):
     """
       THIS FUNCTION showing average COVID deaths versus percent change for each political affiliation.
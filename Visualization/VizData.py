@@ -0,0 +1,359 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+import altair as alt
+import pandas as pd
+import pyarrow as pa
+from altair.utils import sanitize_dataframe
+
+from ETL.EtlBase import profileStep, isProfiling
+from ETL.EtlCache import LruCache, estimateBytes
+from ETL.EtlStore import writeAtomically
+from .VizCache import fingerprintData
+from .VizFields import getFieldUsage, pruneColumns, pruneRows
+
+#
+# Data transformer shared by the Viz modules, in place of the Altair "json" transformer that wrote a new
+# altair-data-<hash>.json file (pretty-printed, with every column) for each chart render.
+#
+# Each dataset is named by the hash of its content. In the notebooks and the standalone specs, the "compact_json"
+# transformer writes it once in the data URL folder (compact JSON records) and the chart references it by URL; the
+# folder is bounded, the least recently used files being deleted above DATA_URL_FOLDER_MAX_BYTES.
+# In the Streamlit app, showChart embeds the datasets by content name with st.vega_lite_chart: the spec of a chart
+# rendered again with the same data is then identical from one rerun to the next, and the Streamlit message cache
+# does not send it again (st.altair_chart renames the datasets with their python id on every run).
+# Before serialization, the columns and the rows of a dataset that the chart never reads are dropped (see VizFields.py).
+# The compiled specs are cached by chart structure and dataset content, so a chart built again from the same data
+# (e.g. on each rerun) is neither validated nor pruned again.
+#
+
+DataUrlFolder = Path("altair-data")
+DATA_URL_FOLDER_MAX_BYTES = 256 * 1024 * 1024
+SPEC_CACHE_MAX_ENTRIES = 64
+SPEC_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+# Datasets collected by contentNameTransformer during chartToSpec, per thread (one thread per session)
+_collected = threading.local()
+# Compiled specs by chart structure (see chartToSpec)
+_spec_cache = LruCache(SPEC_CACHE_MAX_ENTRIES, SPEC_CACHE_MAX_BYTES)
+
+
+########################################################################################
+def getDatasetName(data):
+    """
+      THIS FUNCTION returns the content name of a dataset
+
+      Functions called: fingerprintData()
+      Called by: compactJsonTransformer(), contentNameTransformer()
+
+      Input: data - dataframe or dictionary of the chart data
+      Returns: "data-" followed by the first 32 characters of the content hash
+    """
+    if isinstance(data, pd.DataFrame):
+        fingerprint = fingerprintData(data)
+    else:
+        fingerprint = hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+    return f"data-{fingerprint[:32]}"
+
+
+def toRecords(data):
+    """
+      THIS FUNCTION converts a dataframe to the list of records of a Vega-Lite dataset (the Altair "values" format)
+
+      Functions called: None
+      Called by: compactJsonTransformer(), chartToSpec()
+
+      Input: data - dataframe or dictionary of the chart data
+      Returns: The list of records
+    """
+    if isinstance(data, pd.DataFrame):
+        return json.loads(sanitize_dataframe(data).to_json(orient="records", date_format="iso"))
+    return alt.to_values(data)["values"]
+
+
+########################################################################################
+def pruneDataUrlFolder(folder: Path = DataUrlFolder, max_bytes: int = DATA_URL_FOLDER_MAX_BYTES):
+    """
+      THIS FUNCTION deletes the least recently used data files of the data URL folder until it is below max_bytes
+
+      Functions called: None
+      Called by: compactJsonTransformer()
+
+      Input: folder    - the data URL folder
+             max_bytes - the maximum total size of the folder
+      Returns: None
+    """
+    files = []
+    for path in Path(folder).glob("data-*.json"):
+        try:
+            status = path.stat()
+        except FileNotFoundError:
+            continue
+        files.append((status.st_mtime, status.st_size, path))
+    total_bytes = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total_bytes <= max_bytes:
+            break
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total_bytes -= size
+
+
+def compactJsonTransformer(data, folder: Path = DataUrlFolder, max_bytes: int = DATA_URL_FOLDER_MAX_BYTES):
+    """
+      THIS FUNCTION is the "compact_json" Altair data transformer: the dataset is written once per content in the
+      data URL folder and referenced by URL. Within chartToSpec, the dataset is named by its content instead.
+
+      Functions called: contentNameTransformer(), getDatasetName(), toRecords(), pruneDataUrlFolder()
+      Called by: Altair, when converting a chart to a spec
+
+      Input: data      - dataframe or dictionary of the chart data
+             folder    - the data URL folder
+             max_bytes - the maximum total size of the folder
+      Returns: The URL data of the chart
+    """
+    # The transformer registry of Altair is shared by all the threads (sessions) of the process, so chartToSpec does
+    # not switch it to another transformer: it marks its own thread instead
+    if getattr(_collected, "datasets", None) is not None:
+        return contentNameTransformer(data)
+    path = Path(folder) / f"{getDatasetName(data)}.json"
+    if path.exists():
+        # Mark the file as recently used
+        os.utime(path)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        records = toRecords(data)
+        writeAtomically(path, lambda temporary_path: temporary_path.write_text(
+            json.dumps(records, separators=(",", ":"))))
+        pruneDataUrlFolder(folder, max_bytes)
+    return {"url": path.as_posix(), "format": {"type": "json"}}
+
+
+def contentNameTransformer(data):
+    """
+      THIS FUNCTION is the data transformer of chartToSpec: the dataset is referenced by its content name and kept
+      aside to be added to the top-level datasets of the spec
+
+      Functions called: getDatasetName()
+      Called by: compactJsonTransformer(), in the thread running chartToSpec
+
+      Input: data - dataframe or dictionary of the chart data
+      Returns: The named data of the chart
+    """
+    name = getDatasetName(data)
+    datasets = getattr(_collected, "datasets", None)
+    if datasets is not None:
+        datasets[name] = data
+    return {"name": name}
+
+
+alt.data_transformers.register("compact_json", compactJsonTransformer)
+
+
+def enableDataTransformer():
+    """
+      THIS FUNCTION enables the "compact_json" transformer for the charts of the Viz modules, without row limit
+
+      Functions called: None
+      Called by: the Viz modules, at import
+    """
+    alt.data_transformers.enable("compact_json")
+
+
+########################################################################################
+# Keys kept at the top level when a chart is wrapped in a layer (top-level only properties and the title)
+TOP_LEVEL_KEYS = {"$schema", "config", "datasets", "autosize", "background", "padding", "usermeta", "title"}
+
+
+def inlineNonTabularDatasets(spec: dict):
+    """
+      THIS FUNCTION moves the datasets that are not tables (e.g. a TopoJSON topology) from the top-level datasets back
+      into the views using them, since Streamlit converts each top-level dataset (and inline data at the top level) to
+      a dataframe. A chart drawing such data at the top level is wrapped in a layer.
+
+      Functions called: None
+      Called by: chartToSpec()
+
+      Input: spec - the Vega-Lite spec (dictionary), updated in place
+      Returns: The spec
+    """
+    datasets = spec.get("datasets", {})
+    inline = {name: values for name, values in datasets.items()
+              if not isinstance(values, (list, pd.DataFrame))}
+    if len(inline) == 0:
+        return spec
+
+    stack = [spec]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            data = item.get("data")
+            if isinstance(data, dict) and data.get("name") in inline:
+                item["data"] = dict({key: value for key, value in data.items() if key != "name"},
+                                    values=inline[data["name"]])
+            stack.extend(value for key, value in item.items() if key != "datasets")
+        elif isinstance(item, list):
+            stack.extend(item)
+    for name in inline:
+        del datasets[name]
+
+    data = spec.get("data")
+    if isinstance(data, dict) and isinstance(data.get("values"), dict):
+        view = {key: value for key, value in spec.items() if key not in TOP_LEVEL_KEYS}
+        spec = {key: value for key, value in spec.items() if key in TOP_LEVEL_KEYS}
+        spec["layer"] = [view]
+    return spec
+
+
+def chartToSpec(chart: alt.TopLevelMixin, as_dataframes: bool = False):
+    """
+      THIS FUNCTION converts a chart to a Vega-Lite spec with its datasets embedded under their content name,
+      without the columns and the rows that the chart never reads.
+      The specs are cached by the structure of the chart, where the datasets appear by content name: the spec of a
+      chart already compiled is returned from the cache without validation, pruning or serialization. The cached
+      specs are shared and must not be modified.
+
+      Functions called: enableDataTransformer(), contentNameTransformer(), getFieldUsage(), pruneColumns(), pruneRows(), toRecords(),
+                        inlineNonTabularDatasets()
+      Called by: showChart()
+
+      Input: chart         - the Altair chart
+             as_dataframes - True to keep the datasets as dataframes (serialized by Streamlit with Arrow) instead of
+                             lists of records
+      Returns: The Vega-Lite spec (dictionary)
+    """
+    # Process-wide setting, also made by the Viz modules at import and never switched back
+    if alt.data_transformers.active != "compact_json":
+        enableDataTransformer()
+    _collected.datasets = {}
+    try:
+        structure = chart.to_dict(validate=False)
+        datasets = _collected.datasets
+    finally:
+        _collected.datasets = None
+
+    # The inline datasets consolidated by Altair are also named by the hash of their content
+    structure["datasets"] = sorted(structure.get("datasets", {}))
+    key = (hashlib.sha256(json.dumps(structure, sort_keys=True, default=str).encode()).hexdigest(), as_dataframes)
+    spec = _spec_cache.get(key)
+    if spec is not None:
+        return spec
+
+    _collected.datasets = {}
+    try:
+        spec = chart.to_dict()
+    finally:
+        _collected.datasets = None
+    usage = getFieldUsage(spec)
+    spec_datasets = spec.setdefault("datasets", {})
+    for name, data in datasets.items():
+        if isinstance(data, pd.DataFrame):
+            data_usage = usage.get(name)
+            data = pruneRows(sanitize_dataframe(pruneColumns(data, data_usage)), data_usage)
+            spec_datasets[name] = data if as_dataframes else toRecords(data)
+        else:
+            spec_datasets[name] = toRecords(data)
+    if as_dataframes:
+        spec = inlineNonTabularDatasets(spec)
+    return _spec_cache.put(key, spec, estimateBytes(spec))
+
+
+def getSpecCacheStats():
+    """
+      THIS FUNCTION reports the metrics of the compiled spec cache
+
+      Functions called: None
+      Called by: None (diagnostics)
+
+      Returns: Dictionary of the hits, misses, evictions, number of entries and resident bytes
+    """
+    return _spec_cache.stats()
+
+
+def getSpecBytes(spec: dict):
+    """
+      THIS FUNCTION estimates the size of a spec sent to the browser: its JSON, plus the Arrow IPC stream of each of
+      its datasets kept as a dataframe (the serialization used by Streamlit)
+
+      Functions called: None
+      Called by: showChart()
+
+      Input: spec - the Vega-Lite spec returned by chartToSpec
+      Returns: The number of bytes
+    """
+    frames = []
+
+    def collectFrame(value):
+        if isinstance(value, pd.DataFrame):
+            frames.append(value)
+            return None
+        return str(value)
+
+    size = len(json.dumps(spec, default=collectFrame).encode())
+    for df in frames:
+        table = pa.Table.from_pandas(df)
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        size += sink.getvalue().size
+    return size
+
+
+def getChartLabel(chart: alt.TopLevelMixin, caller):
+    """
+      THIS FUNCTION names a chart in the render profile by the line of the page displaying it and its title, or the
+      title of its first titled sub-chart
+
+      Functions called: None
+      Called by: showChart()
+
+      Input: chart  - the Altair chart
+             caller - the frame of the function calling showChart
+      Returns: The label, e.g. "political.py:80 Covid cases timeseries"
+    """
+    charts = [chart]
+    title = ""
+    while charts and not title:
+        kwds = getattr(charts.pop(0), "_kwds", {})
+        title = kwds.get("title", alt.Undefined)
+        title = title.text if isinstance(title, alt.TitleParams) else title
+        title = " ".join(map(str, title)) if isinstance(title, (list, tuple)) else title
+        title = title if isinstance(title, str) else ""
+        for attribute in ["layer", "hconcat", "vconcat", "concat"]:
+            charts.extend(kwds.get(attribute) or [])
+    title = title[:57] + "..." if len(title) > 60 else title
+    return f"{Path(caller.f_code.co_filename).name}:{caller.f_lineno} {title}".strip()
+
+
+def showChart(chart: alt.TopLevelMixin, use_container_width: bool = False, container=None):
+    """
+      THIS FUNCTION displays a chart in the Streamlit app, in place of st.altair_chart, with the datasets named by
+      their content so that a chart rendered again with the same data sends no new dataset bytes.
+      When the render profiler is on (see Multiapp.py), the compilation of the spec, its size and the time to hand it
+      to Streamlit are recorded.
+
+      Functions called: chartToSpec(), getSpecBytes(), getChartLabel()
+      Called by: the Streamlit pages
+
+      Input: chart               - the Altair chart
+             use_container_width - True to use the width of the Streamlit container
+             container           - the Streamlit container (e.g. a column) to display the chart in, default the page
+    """
+    import streamlit as st
+
+    label = getChartLabel(chart, sys._getframe(1)) if isProfiling() else None
+    with profileStep(label, "spec") as step:
+        spec = chartToSpec(chart, as_dataframes=True)
+    if step:
+        # Measured after the step, so that its duration is only the one of chartToSpec
+        step["bytes"] = getSpecBytes(spec)
+    # Time to serialize the spec into the message queued for the browser, not the network transfer itself
+    with profileStep(label, "send"):
+        return (container or st).vega_lite_chart(spec, use_container_width=use_container_width)
@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+
+#
+# Kernel density estimation computed in Python instead of with the Vega transform_density in the browser.
+# The charts then embed a small table of density curves (steps points per group) instead of every county row.
+# The estimation follows the Vega defaults so that the curves look the same: gaussian kernel, bandwidth estimated
+# per group with Scott's rule and curve sampled over the extent of the group values.
+#
+
+DENSITY_STEPS = 200
+
+
+########################################################################################
+def estimateBandwidth(values: np.ndarray):
+    """
+      THIS FUNCTION estimates the bandwidth of a gaussian kernel density estimation with Scott's rule, computed like
+      the Vega transform_density default: 1.06 * min(standard deviation, interquartile range / 1.34) * n^(-1/5)
+
+      Functions called: None
+      Called by: computeDensity()
+
+      Input: values - array of the values of the distribution
+      Returns: The bandwidth
+    """
+    n = len(values)
+    deviation = np.std(values, ddof=1) if n > 1 else 0
+    q1, q3 = np.percentile(values, [25, 75])
+    spread = min(deviation, (q3 - q1) / 1.34) or deviation or abs(q1) or 1
+    return 1.06 * spread * n ** -0.2
+
+
+def computeDensity(df: pd.DataFrame, density: str, groupby: list = None, as_: list = None, extent: list = None,
+                   steps: int = DENSITY_STEPS, bandwidth: float = None):
+    """
+      THIS FUNCTION computes the density curves of a column per group, in place of the Altair transform_density.
+      The kernel sums are computed for all the points of a curve at once as a (steps x values) NumPy matrix.
+
+      Functions called: estimateBandwidth()
+      Called by: createUnemploymentChart(), createMaskUsageDistributionChart(), ElectionUrbanRuralDensityPlot(),
+                 UrbanRuralMaskDensityPlots()
+
+      Input: df        - dataframe of the values
+             density   - name of the column to estimate the density of
+             groupby   - columns to group by (one curve per group)
+             as_       - names of the value and density columns of the result (default [density, "density"])
+             extent    - [min, max] of the curves (default the min and max of each group)
+             steps     - number of points of each curve
+             bandwidth - bandwidth used for all the groups (default estimated for each group with Scott's rule)
+      Returns: Dataframe with the groupby columns, the value and the density columns
+    """
+    groupby = list(groupby or [])
+    value_name, density_name = as_ or [density, "density"]
+    values_df = df[groupby + [density]].dropna(subset=[density])
+    # Group the category columns (Parquet and Arrow datasets) like text columns, keeping the null group
+    values_df = values_df.astype({column: object for column in groupby
+                                  if isinstance(values_df[column].dtype, pd.CategoricalDtype)})
+    if len(groupby) == 0:
+        groups = [((), values_df)]
+    else:
+        groups = values_df.groupby(groupby if len(groupby) > 1 else groupby[0], dropna=False, sort=True)
+
+    curves = []
+    for key, group_df in groups:
+        values = group_df[density].to_numpy(dtype="float64")
+        if len(values) == 0:
+            continue
+        low, high = extent or (values.min(), values.max())
+        grid = np.linspace(low, high, steps)
+        group_bandwidth = bandwidth or estimateBandwidth(values)
+        z = (grid[:, np.newaxis] - values[np.newaxis, :]) / group_bandwidth
+        curve = np.exp(-0.5 * z ** 2).sum(axis=1) / (len(values) * group_bandwidth * np.sqrt(2 * np.pi))
+        curve_df = pd.DataFrame({value_name: grid, density_name: curve})
+        key = key if isinstance(key, tuple) else (key,)
+        for column, value in zip(groupby, key):
+            curve_df.insert(len(curve_df.columns) - 2, column, value)
+        curves.append(curve_df)
+    if len(curves) == 0:
+        return pd.DataFrame(columns=groupby + [value_name, density_name])
+    return pd.concat(curves, ignore_index=True)
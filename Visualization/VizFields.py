@@ -0,0 +1,363 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+#
+# Field-usage analysis of the Vega-Lite specs of the charts, used by VizData.chartToSpec to strip the columns and the
+# rows of each named dataset that the chart can never show before it is serialized.
+#
+# The views of the spec (layers, concatenations, facets) are walked with the dataset they read. A column is kept when
+# an encoding (tooltips, conditions and sorts included), a transform, a selection, a facet or a lookup of a view
+# reading the dataset refers to it, and all the columns are kept when the chart can read any of them (tooltip of all
+# the data fields, field name computed in an expression, lookup without fields).
+# A row is kept unless every view reading the dataset starts with filters that it fails. Only the filters on a field
+# value (equal, oneOf, range, lt, lte, gt, gte, valid and simple "datum.field < value" expressions) are evaluated;
+# a selection filter or any other transform before them keeps all the rows.
+#
+
+ALL_FIELDS = "*"
+
+VIEW_CHILD_KEYS = ("layer", "hconcat", "vconcat", "concat")
+VIEW_REFERENCE_KEYS = ("encoding", "facet", "transform", "selection", "params", "mark", "repeat")
+# Keys whose values are field names
+FIELD_KEYS = {"field", "fields", "groupby", "fold", "flatten", "density", "regression", "loess", "on", "quantile",
+              "pivot", "impute", "key", "lookup", "extent", "stack", "argmin", "argmax"}
+# Keys whose string values are expressions
+EXPRESSION_KEYS = {"calculate", "filter", "test", "expr"}
+
+DATUM_FIELD = re.compile(r"""datum\s*(?:\.\s*([A-Za-z_$][\w$]*)|\[\s*(?:"((?:[^"\\]|\\.)*)"|'((?:[^'\\]|\\.)*)')\s*\])""")
+DYNAMIC_FIELD_ACCESS = re.compile(r"""datum\s*\[(?!\s*("(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')\s*\])""")
+SIMPLE_COMPARISON = re.compile(
+    r"""^datum\s*(?:\.\s*([A-Za-z_$][\w$]*)|\[\s*(?:"([^"\\]*)"|'([^'\\]*)')\s*\])\s*(===|!==|<=|>=|<|>)\s*"""
+    r"""(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?|"[^"\\]*"|'[^'\\]*')$""")
+COMPARISON_PREDICATES = {"===": "equal", "<": "lt", "<=": "lte", ">": "gt", ">=": "gte"}
+
+
+########################################################################################
+def getBaseField(field: str):
+    """
+      THIS FUNCTION returns the column of a Vega-Lite field reference: "a.b" and "a[0]" read the column "a", and
+      "a\\.b" the column "a.b"
+
+      Functions called: None
+      Called by: addFieldReferences()
+
+      Input: field - the field reference
+      Returns: The name of the column
+    """
+    characters = []
+    escaped = False
+    for character in field:
+        if escaped:
+            characters.append(character)
+            escaped = False
+        elif character == "\\":
+            escaped = True
+        elif character in ".[":
+            break
+        else:
+            characters.append(character)
+    return "".join(characters)
+
+
+def addExpressionReferences(expression: str, fields: set):
+    """
+      THIS FUNCTION adds the fields read by a Vega expression
+
+      Functions called: None
+      Called by: addFieldReferences()
+
+      Input: expression - the Vega expression
+             fields     - the set of the fields to update
+    """
+    if DYNAMIC_FIELD_ACCESS.search(expression):
+        fields.add(ALL_FIELDS)
+    for match in DATUM_FIELD.finditer(expression):
+        name = next(group for group in match.groups() if group is not None)
+        fields.add(re.sub(r"\\(.)", r"\1", name))
+
+
+def addFieldReferences(item, fields: set, lookups: dict):
+    """
+      THIS FUNCTION adds the fields referenced by a part of a view (encoding, transforms, selections, ...)
+
+      Functions called: getBaseField(), addExpressionReferences()
+      Called by: collectViewUsage()
+
+      Input: item    - the part of the view
+             fields  - the set of the fields of the view dataset to update
+             lookups - dictionary of the fields read from the secondary datasets of lookups, to update
+    """
+    if isinstance(item, list):
+        for element in item:
+            addFieldReferences(element, fields, lookups)
+        return
+    if not isinstance(item, dict):
+        return
+
+    if item.get("content") == "data":
+        # Tooltip of all the data fields
+        fields.add(ALL_FIELDS)
+    if "lookup" in item and isinstance(item.get("from"), dict):
+        lookup_from = item["from"]
+        name = lookup_from.get("data", {}).get("name")
+        if name is not None:
+            lookup_fields = lookups.setdefault(name, set())
+            lookup_fields.add(getBaseField(lookup_from.get("key", "")))
+            if "fields" in lookup_from:
+                lookup_fields.update(getBaseField(field) for field in lookup_from["fields"])
+            else:
+                lookup_fields.add(ALL_FIELDS)
+    if "pivot" in item and isinstance(item.get("value"), str):
+        fields.add(getBaseField(item["value"]))
+
+    for key, value in item.items():
+        if key == "from":
+            continue
+        if key in FIELD_KEYS:
+            for field in value if isinstance(value, list) else [value]:
+                if isinstance(field, str):
+                    fields.add(getBaseField(field))
+                else:
+                    addFieldReferences(field, fields, lookups)
+        elif key in EXPRESSION_KEYS and isinstance(value, str):
+            addExpressionReferences(value, fields)
+        elif key in ("init", "value") and isinstance(value, dict):
+            # Initial value of a selection, keyed by field
+            fields.update(getBaseField(field) for field in value)
+            addFieldReferences(value, fields, lookups)
+        elif key == "repeat":
+            repeated = value.values() if isinstance(value, dict) else [value]
+            fields.update(field for fields_list in repeated for field in fields_list if isinstance(field, str))
+        else:
+            addFieldReferences(value, fields, lookups)
+
+
+########################################################################################
+def getFieldPredicate(transform: dict):
+    """
+      THIS FUNCTION returns the field predicate of a filter transform that can be evaluated on the rows of a dataset
+
+      Functions called: None
+      Called by: collectViewUsage()
+
+      Input: transform - the transform
+      Returns: The predicate (dictionary), or None if the transform is not a filter on field values
+    """
+    if "filter" not in transform or len(transform) != 1:
+        return None
+    predicate = transform["filter"]
+    if isinstance(predicate, str):
+        expression = predicate.strip()
+        while expression.startswith("(") and expression.endswith(")") and "(" not in expression[1:-1]:
+            expression = expression[1:-1].strip()
+        match = SIMPLE_COMPARISON.match(expression)
+        if match is None:
+            return None
+        field = next(group for group in match.groups()[:3] if group is not None)
+        operator, literal = match.group(4), match.group(5)
+        value = literal[1:-1] if literal[0] in "\"'" else float(literal)
+        if operator == "!==":
+            return {"not": {"field": field, "equal": value}}
+        return {"field": field, COMPARISON_PREDICATES[operator]: value}
+    return predicate if isPredicateEvaluable(predicate) else None
+
+
+def isPredicateEvaluable(predicate):
+    """
+      THIS FUNCTION checks if a Vega-Lite predicate only compares field values with constants
+
+      Functions called: None
+      Called by: getFieldPredicate()
+
+      Input: predicate - the predicate
+      Returns: True if evaluatePredicate() can evaluate the predicate
+    """
+    if not isinstance(predicate, dict):
+        return False
+    if "and" in predicate or "or" in predicate:
+        operands = predicate.get("and", predicate.get("or"))
+        return isinstance(operands, list) and all(isPredicateEvaluable(operand) for operand in operands)
+    if "not" in predicate:
+        return isPredicateEvaluable(predicate["not"])
+    field = predicate.get("field")
+    if not isinstance(field, str) or getBaseField(field) != field or "timeUnit" in predicate:
+        return False
+    operators = set(predicate) - {"field"}
+    if len(operators) != 1:
+        return False
+    operator = operators.pop()
+    value = predicate[operator]
+    if operator in ("equal", "lt", "lte", "gt", "gte"):
+        return isinstance(value, (str, int, float, bool))
+    if operator == "oneOf":
+        return isinstance(value, list) and all(isinstance(element, (str, int, float, bool)) for element in value)
+    if operator == "range":
+        return (isinstance(value, list) and len(value) == 2
+                and all(element is None or isinstance(element, (int, float)) for element in value))
+    return operator == "valid" and isinstance(value, bool)
+
+
+def evaluatePredicate(df: pd.DataFrame, predicate: dict):
+    """
+      THIS FUNCTION evaluates a field predicate on the rows of a dataframe, like the Vega-Lite filter transform.
+      Null values compared with lt, lte, gt, gte and range are kept, since Vega compares them as 0.
+
+      Functions called: None
+      Called by: pruneRows()
+
+      Input: df        - the dataframe
+             predicate - the predicate (see isPredicateEvaluable())
+      Returns: Boolean array of the rows matching the predicate
+    """
+    if "and" in predicate:
+        return np.logical_and.reduce([evaluatePredicate(df, operand) for operand in predicate["and"]] +
+                                     [np.ones(len(df), dtype=bool)])
+    if "or" in predicate:
+        return np.logical_or.reduce([evaluatePredicate(df, operand) for operand in predicate["or"]] +
+                                    [np.zeros(len(df), dtype=bool)])
+    if "not" in predicate:
+        return ~evaluatePredicate(df, predicate["not"])
+    if predicate["field"] not in df.columns:
+        # The field is computed by the chart
+        return np.ones(len(df), dtype=bool)
+    values = df[predicate["field"]]
+    missing = values.isna().to_numpy()
+    if "valid" in predicate:
+        return ~missing if predicate["valid"] else missing
+    if "equal" in predicate:
+        return (values == predicate["equal"]).to_numpy()
+    if "oneOf" in predicate:
+        return values.isin(predicate["oneOf"]).to_numpy()
+    try:
+        if "range" in predicate:
+            low, high = predicate["range"]
+            mask = np.ones(len(df), dtype=bool)
+            if low is not None:
+                mask &= (values >= low).to_numpy()
+            if high is not None:
+                mask &= (values <= high).to_numpy()
+        else:
+            operator = next(operator for operator in ("lt", "lte", "gt", "gte") if operator in predicate)
+            value = predicate[operator]
+            mask = {"lt": values < value, "lte": values <= value,
+                    "gt": values > value, "gte": values >= value}[operator].to_numpy()
+    except TypeError:
+        # Values not comparable with the constant (e.g. strings with a number)
+        return np.ones(len(df), dtype=bool)
+    return mask | missing
+
+
+########################################################################################
+def collectViewUsage(view: dict, data_name, filters: list, inherited_fields: set, usage: dict):
+    """
+      THIS FUNCTION collects the fields and the row filters of the datasets read by a view and its children
+
+      Functions called: addFieldReferences(), getFieldPredicate(), collectViewUsage()
+      Called by: getFieldUsage()
+
+      Input: view             - the view of the spec
+             data_name        - the name of the dataset inherited from the parent view (None for a dataset without
+                                name)
+             filters          - the predicates inherited from the parent view, or None if the parent view transforms
+                                the rows otherwise than with field filters
+             inherited_fields - the fields referenced by the parent views (e.g. a shared encoding of a layer), which
+                                the view can read from its own dataset
+             usage            - dictionary of the usage of each dataset to update
+    """
+    if "data" in view:
+        data = view["data"]
+        data_name = data.get("name") if isinstance(data, dict) and "values" not in data else None
+        filters = []
+
+    fields, lookups = set(inherited_fields), {}
+    for key in VIEW_REFERENCE_KEYS:
+        if key in view:
+            addFieldReferences({key: view[key]}, fields, lookups)
+    for name, lookup_fields in lookups.items():
+        lookup_usage = usage.setdefault(name, {"fields": set(), "filters": []})
+        lookup_usage["fields"].update(lookup_fields)
+        lookup_usage["filters"].append([])
+
+    filters = list(filters) if filters is not None else None
+    for transform in view.get("transform", []):
+        if filters is None:
+            break
+        predicate = getFieldPredicate(transform)
+        if predicate is None:
+            filters = None
+        else:
+            filters.append(predicate)
+
+    children = [child for key in VIEW_CHILD_KEYS for child in view.get(key, [])]
+    if "spec" in view:
+        children.append(view["spec"])
+    if data_name is not None:
+        data_usage = usage.setdefault(data_name, {"fields": set(), "filters": []})
+        data_usage["fields"].update(fields)
+        if not children:
+            # A leaf view draws the rows
+            data_usage["filters"].append(filters or [])
+    for child in children:
+        collectViewUsage(child, data_name, filters, fields, usage)
+
+
+def getFieldUsage(spec: dict):
+    """
+      THIS FUNCTION analyzes the fields and the rows of the named datasets that a chart spec reads
+
+      Functions called: collectViewUsage()
+      Called by: chartToSpec()
+
+      Input: spec - the Vega-Lite spec (dictionary)
+      Returns: Dictionary of dataset name -> {"fields": set of the columns read (ALL_FIELDS for all the columns),
+               "filters": one list of predicates per view drawing the dataset}
+    """
+    usage = {}
+    collectViewUsage(spec, None, [], set(), usage)
+    return usage
+
+
+def pruneColumns(df: pd.DataFrame, data_usage: dict):
+    """
+      THIS FUNCTION keeps only the columns of a dataset that the chart reads
+
+      Functions called: None
+      Called by: chartToSpec()
+
+      Input: df         - the dataframe of the dataset
+             data_usage - the usage of the dataset (see getFieldUsage()), None if no view reads it
+      Returns: The dataframe of the columns read by the chart
+    """
+    if data_usage is None or ALL_FIELDS in data_usage["fields"]:
+        return df
+    columns = [column for column in df.columns if str(column) in data_usage["fields"]]
+    return df[columns] if len(columns) < len(df.columns) else df
+
+
+def pruneRows(df: pd.DataFrame, data_usage: dict):
+    """
+      THIS FUNCTION keeps only the rows of a dataset that at least one view drawing it does not filter out.
+      The dataframe must already be sanitized for Vega-Lite (dates and periods as strings, like in the spec).
+
+      Functions called: evaluatePredicate()
+      Called by: chartToSpec()
+
+      Input: df         - the sanitized dataframe of the dataset
+             data_usage - the usage of the dataset (see getFieldUsage()), None if no view reads it
+      Returns: The dataframe of the rows drawn by the chart
+    """
+    if data_usage is None:
+        return df
+    filters = data_usage["filters"]
+    if len(filters) == 0 or not all(filters):
+        # No view draws the dataset, or one view draws all its rows
+        return df
+    mask = np.zeros(len(df), dtype=bool)
+    for predicates in filters:
+        view_mask = np.ones(len(df), dtype=bool)
+        for predicate in predicates:
+            view_mask &= evaluatePredicate(df, predicate)
+        mask |= view_mask
+    return df if mask.all() else df[mask]
@@ -0,0 +1,116 @@
+import json
+import altair as alt
+import pandas as pd
+from functools import lru_cache
+from vega_datasets import data
+
+from ETL.EtlGeometry import GeometryFolder, getGeometryPath
+
+#
+# Geometry of the choropleth maps. When the local geometry bundle built by ETL.EtlGeometry.buildGeometryBundle exists,
+# the maps embed the simplified topology of the object they draw (counties or states), with the attribute columns
+# already joined onto the features, instead of loading us-10m from the vega-datasets CDN and joining the county table
+# in the browser with a lookup transform.
+#
+
+
+@lru_cache(maxsize=None)
+def loadTopology(level: str, folder: str = str(GeometryFolder)):
+    """
+      THIS FUNCTION reads a topology of the geometry bundle once per process
+
+      Input: level  - zoom level of the bundle ("low", "medium" or "high")
+             folder - folder of the geometry bundle
+      Returns: The TopoJSON topology, or None if the bundle was not built
+    """
+    path = getGeometryPath(level, folder)
+    if not path.exists():
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+
+def getObjectTopology(topology: dict, object_name: str):
+    """
+      THIS FUNCTION extracts one object of a topology together with only the arcs it uses, renumbered
+
+      Input: topology    - the TopoJSON topology
+             object_name - the name of the object to keep ("counties", "states" or "land")
+      Returns: The TopoJSON topology of the object
+    """
+    geometry_collection = topology["objects"][object_name]
+    arc_index = {}
+
+    def renumber(arcs):
+        # Nested lists of arc indices, a negative index ~i meaning the arc i reversed
+        if isinstance(arcs, int):
+            arc = arcs if arcs >= 0 else ~arcs
+            new_arc = arc_index.setdefault(arc, len(arc_index))
+            return new_arc if arcs >= 0 else ~new_arc
+        return [renumber(arc) for arc in arcs]
+
+    geometries = [dict(geometry, arcs=renumber(geometry["arcs"])) if "arcs" in geometry else dict(geometry)
+                  for geometry in geometry_collection.get("geometries", [])]
+    arcs = [None] * len(arc_index)
+    for arc, new_arc in arc_index.items():
+        arcs[new_arc] = topology["arcs"][arc]
+    return {
+        "type": "Topology",
+        "transform": topology["transform"],
+        "objects": {object_name: {"type": "GeometryCollection", "geometries": geometries}},
+        "arcs": arcs,
+    }
+
+
+def normalizeId(value):
+    """
+      THIS FUNCTION converts a feature id or a FIPS code to a comparable string ("1001", 1001 and 1001.0 give "1001")
+    """
+    try:
+        return str(int(value))
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def getGeoData(object_name: str, source: pd.DataFrame = None, key: str = None, columns: list = None,
+               level: str = "medium"):
+    """
+      THIS FUNCTION returns the data and the transforms of a choropleth chart drawing the features of an us-10m
+      object with the given columns of the source dataframe.
+
+      With the local geometry bundle, the columns are joined onto the feature properties here and the transforms
+      only copy them to the top of each feature. Without it, the data is the us-10m file of the vega-datasets CDN and
+      the transform is the lookup of the source dataframe done in the browser.
+
+      Input: object_name - the us-10m object ("counties" or "states")
+             source      - dataframe of the attribute columns (None for an outline without attributes)
+             key         - column of the source matching the feature id (e.g. "COUNTYFP")
+             columns     - columns of the source to join to the features
+             level       - zoom level of the local geometry bundle
+      Returns: The chart data and the list of transforms to give to alt.Chart(data, transform=...)
+    """
+    columns = list(columns or [])
+    topology = loadTopology(level)
+    if topology is None:
+        transforms = []
+        if source is not None:
+            transforms.append(alt.LookupTransform(lookup="id", **{"from": alt.LookupData(source, key, columns)}))
+        return alt.topo_feature(data.us_10m.url, object_name), transforms
+
+    object_topology = getObjectTopology(topology, object_name)
+    transforms = []
+    if source is not None:
+        # Like the lookup transform, the last row of a key wins
+        rows = source.drop_duplicates(subset=[key], keep="last")[columns + ([key] if key not in columns else [])]
+        rows = rows.astype(object).where(rows.notna(), None)
+        properties = {normalizeId(row[key]): {column: row[column] for column in columns}
+                      for row in rows.to_dict("records")}
+        for geometry in object_topology["objects"][object_name]["geometries"]:
+            geometry_properties = properties.get(normalizeId(geometry.get("id")))
+            if geometry_properties is not None:
+                geometry["properties"] = geometry_properties
+        transforms = [alt.CalculateTransform(calculate=f"datum.properties[{json.dumps(column)}]", **{"as": column})
+                      for column in columns]
+    geo_data = alt.InlineData(values=object_topology,
+                              format=alt.TopoDataFormat(type="topojson", feature=object_name))
+    return geo_data, transforms
@@ -8,10 +8,13 @@ from ETL.EtlElection import *
 from ETL.EtlVaccine import *
 from ETL.EtlMask import *
 from .VizBase import *
+from .VizDensity import computeDensity
+from .VizGeometry import getGeoData
+from .VizData import enableDataTransformer
+from .VizCache import cachedChart
 
-# uses intermediate json files to speed things up
-alt.data_transformers.enable("json")
-alt.data_transformers.disable_max_rows()
+# datasets are written once per content, see VizData.py
+enableDataTransformer()
 
 
 def plotCountyMaskUsage(df, mask_usage_type, color_scheme):
@@ -74,8 +77,7 @@ def plotAllMaskUsageTypesForCounties():
 
 def createCombinedElectoralAndMaskUsageCharts():
     election_winners_df = getElectionSegmentsData()
-    counties = alt.topo_feature(data.us_10m.url, "counties")
-    us_states = alt.topo_feature(data.us_10m.url, "states")
+    us_states, outline_transforms = getGeoData("states")
     source = election_winners_df
     source["COUNTYANDFP"] = (
         election_winners_df["CTYNAME"].str.capitalize()
@@ -86,7 +88,7 @@ def createCombinedElectoralAndMaskUsageCharts():
     source["segmentname"] = election_winners_df["changecolor"].map(color_segment_dict)
 
     # Create a selection based on COUNTYFP since several states can have counties with same name
-    click = alt.selection_multi(fields=["COUNTYANDFP"])
+    click = alt.selection_multi(fields=["COUNTYANDFP"], name="county_click")
 
     # input_dropdown = alt.binding_select(options=source['segmentname'].unique().tolist(), name='Affiliation: ')
     input_dropdown = alt.binding_select(
@@ -96,9 +98,28 @@ def createCombinedElectoralAndMaskUsageCharts():
         fields=["segmentname"], bind=input_dropdown, name="Affiliation: "
     )
 
+    counties, county_transforms = getGeoData(
+        "counties",
+        source,
+        "COUNTYFP",
+        [
+            "party_winner_2016",
+            "party_winner_2020",
+            "COUNTYFP",
+            "CTYNAME",
+            "COUNTYANDFP",
+            "changecolor",
+            "state",
+            "state_po",
+            "segmentname",
+        ],
+    )
+
     county_winners_chart = (
         alt.Chart(
-            counties, title="Counties that changed affiliations in 2020 elections"
+            counties,
+            title="Counties that changed affiliations in 2020 elections",
+            transform=county_transforms,
         )
         .mark_geoshape()
         .encode(
@@ -116,24 +137,6 @@ def createCombinedElectoralAndMaskUsageCharts():
             # opacity=alt.condition(click, alt.value(0.8), alt.value(0.2)),
             opacity=alt.condition(segment_selection, alt.value(0.8), alt.value(0.2)),
         )
-        .transform_lookup(
-            lookup="id",
-            from_=alt.LookupData(
-                source,
-                "COUNTYFP",
-                [
-                    "party_winner_2016",
-                    "party_winner_2020",
-                    "COUNTYFP",
-                    "CTYNAME",
-                    "COUNTYANDFP",
-                    "changecolor",
-                    "state",
-                    "state_po",
-                    "segmentname",
-                ],
-            ),
-        )
         .add_selection(
             segment_selection  ## Make sure you have added the selection here
         )
@@ -143,7 +146,7 @@ def createCombinedElectoralAndMaskUsageCharts():
     )
 
     outline = (
-        alt.Chart(us_states)
+        alt.Chart(us_states, transform=outline_transforms)
         .mark_geoshape(stroke="grey", fillOpacity=0)
         .project(type="albersUsa")
         .properties(width=550, height=200)
@@ -278,6 +281,7 @@ def createCombinedElectoralAndMaskUsageCharts():
 ############################################################################################################
 ######################Mask Data Charts with interactive legend
 ############################################################################################################
+@cachedChart
 def createFreqCountyMaskUsageWithRanges(
     _type: str,
     county_pop_mask_df: pd.DataFrame() = None,
@@ -295,10 +299,9 @@ def createFreqCountyMaskUsageWithRanges(
         [_type]: [description]
     """
 
-    counties = alt.topo_feature(data.us_10m.url, "counties")
     # Setup interactivty
     click = alt.selection_single(
-        fields=["range_color"], init={"range_color": "#C5DDF9"}
+        fields=["range_color"], init={"range_color": "#C5DDF9"}, name="range_click"
     )
 
     if (
@@ -321,9 +324,24 @@ def createFreqCountyMaskUsageWithRanges(
     else:
         source = county_pop_mask_infreq_df
 
+    counties, county_transforms = getGeoData(
+        "counties",
+        source,
+        "COUNTYFP",
+        [
+            "COUNTYFP",
+            "CTYNAME",
+            "mask_usage_type",
+            "mask_usage",
+            "mask_usage_range",
+            "range_color",
+        ],
+    )
+
     county_mask_chart = (
         alt.Chart(
             counties,
+            transform=county_transforms,
             title={
                 "text": [
                     f"{_type.capitalize()} Mask Usage From Survey Response by County and Political Affiliation"
@@ -347,21 +365,6 @@ def createFreqCountyMaskUsageWithRanges(
                 alt.Tooltip("mask_usage:Q", title="Mask Usage Percent: ", format=".0%"),
             ],
         )
-        .transform_lookup(
-            lookup="id",
-            from_=alt.LookupData(
-                source,
-                "COUNTYFP",
-                [
-                    "COUNTYFP",
-                    "CTYNAME",
-                    "mask_usage_type",
-                    "mask_usage",
-                    "mask_usage_range",
-                    "range_color",
-                ],
-            ),
-        )
         .add_selection(click)
         .project(type="albersUsa")
         .properties(width=550, height=200)
@@ -448,13 +451,18 @@ def createFreqCountyMaskUsageWithRanges(
     return county_mask_chart, legend_republican, legend_democrat, average_mask_chart
 
 
+@cachedChart
 def createMaskUsageDistributionChart(df: pd.DataFrame() = None):
     if df is None:
         df = createDataForMaskUsageDistribution()
 
+    # Compute the density curves of each mask usage type and segment instead of sending all the counties to the browser
+    density_df = computeDensity(df, density="mask_usage", groupby=["mask_usage_type", "changecolor"],
+                                as_=["mask_usage", "Density"])
+
     density_chart = (
         alt.Chart(
-            df,
+            density_df,
             title={
                 "text": [
                     "Mask Usage Survey Response Distribution by Political Affiliation"
@@ -465,11 +473,6 @@ def createMaskUsageDistributionChart(df: pd.DataFrame() = None):
                 ],
             },
         )
-        .transform_density(
-            density="mask_usage",
-            groupby=["mask_usage_type", "changecolor"],
-            as_=["mask_usage", "Density"],
-        )
         .mark_area(orient="vertical", opacity=0.8)
         .encode(
             x=alt.X("mask_usage:Q", axis=alt.Axis(title=None, format=".0%")),
@@ -0,0 +1,507 @@
+import altair as alt
+from pathlib import Path
+
+from ETL.EtlBase import ProcessedDataFolder, profiled
+from ETL.EtlStore import loadCachedData
+
+#
+# Builders of the finished charts displayed by the Streamlit pages, from the processed datasets.
+# They are called by the packager to render the charts into the spec bundle (see VizBundle.py), and by the pages when
+# the bundle is missing or out of date. The Viz modules are imported by each builder, so that a page falling back to
+# building its charts only imports the modules it uses.
+#
+
+URBAN_RURAL_ROLLING_DTYPES = {
+    "year": int,
+    "state": str,
+    "state_po": str,
+    "county_name": str,
+    "county_fips": float,
+    "office": str,
+    "candidate": str,
+    "party": str,
+    "candidatevotes": float,
+    "totalvotes": float,
+    "version": int,
+    "mode": str,
+    "UrbanRural": str,
+    "PctRural": float,
+}
+
+URBAN_RURAL_AVGDEATHS_DTYPES = {
+    "COUNTYFP": int,
+    "deaths_avg_per_100k": float,
+    "state": str,
+    "state_po": str,
+    "CTYNAME": str,
+    "party_winner_2020": str,
+    "totalvotes_2020": float,
+    "fractionalvotes_2020": float,
+    "party_winner_2016": str,
+    "totalvotes_2016": float,
+    "fractionalvotes_2016": float,
+    "changecolor": str,
+    "_merge": str,
+    "pct_increase": float,
+    "segmentname": str,
+}
+
+UNEMPLOYMENT_CORRELATION_DTYPES = {"month": str, "party": str, "variable": str, "value": float}
+
+UNEMPLOYMENT_MASK_DTYPES = {
+    "COUNTYFP": int,
+    "unemployment_rate": float,
+    "cases_avg_per_100k": float,
+    "deaths_avg_per_100k": float,
+    "party": str,
+    "NEVER": float,
+    "RARELY": float,
+    "SOMETIMES": float,
+    "FREQUENTLY": float,
+    "ALWAYS": float,
+}
+
+
+########################################################################################
+# Political affiliation page
+########################################################################################
+@profiled(category="build")
+def buildCaseTrendChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the chart of the COVID case rolling average by party affiliation segment
+
+      Functions called: createCovidConfirmedTimeseriesChart(), createTooltip()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizBase import createTooltip, createCovidConfirmedTimeseriesChart
+
+    case_rolling_df = loadCachedData("case_rolling_df", folder)
+    (
+        base,
+        make_selector,
+        highlight_segment,
+        radio_select,
+    ) = createCovidConfirmedTimeseriesChart(case_rolling_df)
+    selectors, rules, points, tooltip_text = createTooltip(
+        base, radio_select, case_rolling_df
+    )
+    # Bring all the layers together with layering and concatenation
+    return (
+        alt.layer(highlight_segment, selectors, points, rules, tooltip_text)
+        | make_selector
+    ).configure_title(align="left", anchor="start")
+
+
+@profiled(category="build")
+def buildPercentPointChangeDeathsChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the scatter plot of the percentile point change of the votes and the COVID deaths
+
+      Functions called: createPercentPointChangeAvgDeathsChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizCovid import createPercentPointChangeAvgDeathsChart
+
+    election_change_and_covid_death_df = loadCachedData("election_change_and_covid_death_df", folder)
+    return createPercentPointChangeAvgDeathsChart(
+        election_change_and_covid_death_df
+    ).configure_title(align="left", anchor="start")
+
+
+@profiled(category="build")
+def buildDailyVaccinationChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the interactive chart of the vaccination rates by state
+
+      Functions called: createDailyInteractiveVaccinationChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizVaccine import createDailyInteractiveVaccinationChart
+
+    daily_vaccination_percent_df = loadCachedData(
+        "daily_vaccination_percent_df",
+        folder,
+        dtype={"Total population": int, "day_num": int, "Percent with one dose": float},
+    )
+    return createDailyInteractiveVaccinationChart(daily_vaccination_percent_df)
+
+
+@profiled(category="build")
+def buildDeltaVariantChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the map of the vaccination rates with the case trend of the selected state after the
+      emergence of the Delta variant
+
+      Functions called: createCombinedVaccinationAndDeltaVariantTrend()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizVaccine import createCombinedVaccinationAndDeltaVariantTrend
+
+    state_vaccine_df = loadCachedData("state_vaccine_df", folder, dtype={"STATEFP": int})
+    us_case_rolling_df = loadCachedData("us_case_rolling_df", folder)
+    state_case_rolling_df = loadCachedData(
+        "state_case_rolling_df",
+        folder,
+        dtype={"cases_avg_per_100k": float, "STATEFP": int},
+    )
+    state_election_df = loadCachedData(
+        "state_election_df",
+        folder,
+        dtype={
+            "state_fips": int,
+            "candidatevotes": int,
+            "totalvotes": int,
+            "fractionalvotes": float,
+        },
+    )
+    (
+        vaccine_chart,
+        us_timeseries,
+        stayed_democrat_timeseries,
+        stayed_republican_timeseries,
+        state_cases_delta_chart,
+        state_selectors,
+        rules,
+        tooltip_text2,
+        tooltip_text3,
+        tooltip_text4,
+        tooltip_text5,
+        points,
+        rect_area,
+        delta_rect_area,
+        just_line_state_cases_delta,
+    ) = createCombinedVaccinationAndDeltaVariantTrend(
+        state_vaccine_df, us_case_rolling_df, state_case_rolling_df, state_election_df
+    )
+    return (
+        vaccine_chart
+        & alt.layer(
+            (
+                state_cases_delta_chart
+                + us_timeseries
+                + stayed_democrat_timeseries
+                + stayed_republican_timeseries
+                + rect_area
+                + delta_rect_area
+            ),
+            state_selectors,
+            rules,
+            tooltip_text2,
+            tooltip_text3,
+            tooltip_text4,
+            tooltip_text5,
+            points,
+        )
+    ).configure_title()
+
+
+@profiled(category="build")
+def buildMaskUsageDistributionChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the density plot of the frequent and infrequent mask usage by party affiliation
+
+      Functions called: createMaskUsageDistributionChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizMask import createMaskUsageDistributionChart
+
+    return createMaskUsageDistributionChart(loadCachedData("mask_distribution_df", folder))
+
+
+def buildCountyMaskUsageChart(mask_usage: str, folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the county map of the frequent or infrequent mask usage ranges by party affiliation
+
+      Functions called: createFreqCountyMaskUsageWithRanges()
+      Called by: buildFrequentMaskUsageChart(), buildInfrequentMaskUsageChart()
+
+      Input: mask_usage - "FREQUENT" or "INFREQUENT"
+             folder     - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizMask import createFreqCountyMaskUsageWithRanges
+
+    (
+        county_mask_chart,
+        legend_republican,
+        legend_democrat,
+        average_mask_chart,
+    ) = createFreqCountyMaskUsageWithRanges(
+        mask_usage,
+        loadCachedData("county_pop_mask_df", folder),
+        loadCachedData("county_pop_mask_freq_df", folder),
+        loadCachedData("county_pop_mask_infreq_df", folder),
+        loadCachedData("mask_distribution_df", folder),
+    )
+    return (
+        (county_mask_chart)
+        & (average_mask_chart | legend_republican | legend_democrat).resolve_scale(
+            color="independent"
+        )
+    ).configure_title(align="left", anchor="start")
+
+
+@profiled(category="build")
+def buildFrequentMaskUsageChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the county map of the frequent mask usage ranges by party affiliation
+
+      Functions called: buildCountyMaskUsageChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    return buildCountyMaskUsageChart("FREQUENT", folder)
+
+
+@profiled(category="build")
+def buildInfrequentMaskUsageChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the county map of the infrequent mask usage ranges by party affiliation
+
+      Functions called: buildCountyMaskUsageChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    return buildCountyMaskUsageChart("INFREQUENT", folder)
+
+
+########################################################################################
+# Urban/rural divide page
+########################################################################################
+def loadUrbanRuralElectionData(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION loads the urban/rural designation of the counties merged with the election results
+
+      Functions called: loadCachedData()
+      Called by: buildUrbanRuralDensityChart(), buildUrbanRuralCorrelationChart()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The shared dataframe, not to be modified
+    """
+    return loadCachedData(
+        "urban_rural_election_df",
+        folder,
+        dtype={
+            "state_po": str,
+            "county_name": str,
+            "county_fips": int,
+            "candidate": str,
+            "party": str,
+            "candidatevotes": float,
+            "totalvotes": float,
+            "UrbanRural": str,
+            "PctRural": float,
+        },
+    )
+
+
+@profiled(category="build")
+def buildUrbanRuralDensityChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the density plot of the percentage of rural population of the counties won by each party
+
+      Functions called: ElectionUrbanRuralDensityPlot()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizUrbanRural import ElectionUrbanRuralDensityPlot
+
+    return ElectionUrbanRuralDensityPlot(loadUrbanRuralElectionData(folder))
+
+
+@profiled(category="build")
+def buildUrbanRuralCorrelationChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the scatter plot of the vote fraction against the percentage of rural population
+
+      Functions called: UrbanRuralCorrelation()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizUrbanRural import UrbanRuralCorrelation
+
+    return UrbanRuralCorrelation(loadUrbanRuralElectionData(folder))
+
+
+@profiled(category="build")
+def buildUrbanRuralRollingAverageChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the charts of the COVID case rolling average of all, urban and rural counties
+
+      Functions called: UrbanRuralRollingAvgCompChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizUrbanRural import UrbanRuralRollingAvgCompChart
+
+    # The dataset of all the counties has no urban/rural columns
+    full_dtypes = {column: dtype for column, dtype in URBAN_RURAL_ROLLING_DTYPES.items()
+                   if column not in ["UrbanRural", "PctRural"]}
+    return UrbanRuralRollingAvgCompChart(
+        loadCachedData("urban_rural_rolling_avg_full_df", folder, dtype=full_dtypes),
+        loadCachedData("urban_rolling_avg_full_df", folder, dtype=URBAN_RURAL_ROLLING_DTYPES),
+        loadCachedData("rural_rolling_avg_full_df", folder, dtype=URBAN_RURAL_ROLLING_DTYPES),
+    )
+
+
+@profiled(category="build")
+def buildUrbanRuralDeathsChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the charts of the COVID deaths and the vote percentile point change of all, urban and rural
+      counties
+
+      Functions called: UrbanRuralAvgDeathsCompChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizUrbanRural import UrbanRuralAvgDeathsCompChart
+
+    return UrbanRuralAvgDeathsCompChart(
+        loadCachedData("urban_rural_avgdeaths_full_df", folder, dtype=URBAN_RURAL_AVGDEATHS_DTYPES),
+        loadCachedData("urban_avgdeaths_full_df", folder, dtype=URBAN_RURAL_AVGDEATHS_DTYPES),
+        loadCachedData("rural_avgdeaths_full_df", folder, dtype=URBAN_RURAL_AVGDEATHS_DTYPES),
+    )
+
+
+########################################################################################
+# Unemployment page
+########################################################################################
+@profiled(category="build")
+def buildUnemploymentRateChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the chart of the distribution of the county unemployment rates per month
+
+      Functions called: createUnemploymentChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizUnemployment import createUnemploymentChart
+
+    unemployment_rate_since_2019_df = loadCachedData(
+        "unemployment_rate_since_2019_df",
+        folder,
+        dtype={
+            "month": str,
+            "unemployment_rate": float,
+            "COUNTYFP": int,
+            "month_since_start": int,
+            "party": str,
+        },
+    )
+    return createUnemploymentChart(unemployment_rate_since_2019_df)
+
+
+@profiled(category="build")
+def buildUnemploymentCovidChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the chart of the average unemployment rate, COVID cases and their correlation per month
+
+      Functions called: createUnemploymentCorrelationLineChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizUnemployment import createUnemploymentCorrelationLineChart
+
+    return createUnemploymentCorrelationLineChart(
+        loadCachedData("unemployment_covid_correlation_df", folder, dtype=UNEMPLOYMENT_CORRELATION_DTYPES),
+        title="Counties Average Unemployment Rate and COVID Cases Since January 2020",
+        sort=[
+            "Average COVID Cases per 100k",
+            "Average Unemployment Rate",
+            "Correlation",
+        ],
+    )
+
+
+@profiled(category="build")
+def buildUnemploymentMaskChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the charts of the unemployment rate and the frequent and infrequent mask usage in July 2020
+
+      Functions called: createUnemploymentMaskChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizUnemployment import createUnemploymentMaskChart
+
+    return createUnemploymentMaskChart(
+        loadCachedData("unemployment_freq_mask_july_df", folder, dtype=UNEMPLOYMENT_MASK_DTYPES),
+        loadCachedData("unemployment_infreq_mask_july_df", folder, dtype=UNEMPLOYMENT_MASK_DTYPES),
+    )
+
+
+@profiled(category="build")
+def buildUnemploymentVaccineChart(folder: Path = ProcessedDataFolder):
+    """
+      THIS FUNCTION builds the chart of the average unemployment rate, vaccination rate and their correlation per month
+
+      Functions called: createUnemploymentCorrelationLineChart()
+      Called by: showPageChart(), writeSpecBundle()
+
+      Input: folder - the folder of the processed datasets
+      Returns: The chart
+    """
+    from Visualization.VizUnemployment import createUnemploymentCorrelationLineChart
+
+    return createUnemploymentCorrelationLineChart(
+        loadCachedData("unemployment_vaccine_correlation_df", folder, dtype=UNEMPLOYMENT_CORRELATION_DTYPES),
+        title="Counties Average Unemployment Rate and Vaccination Rate Since December 2020",
+        sort=[
+            "Average Unemployment Rate",
+            "Average % of People with 1 Dose of Vaccine",
+            "Correlation",
+        ],
+    )
+
+
+# Name of the chart in the spec bundle -> builder
+PAGE_CHARTS = {
+    "political_case_trend": buildCaseTrendChart,
+    "political_deaths": buildPercentPointChangeDeathsChart,
+    "political_daily_vaccination": buildDailyVaccinationChart,
+    "political_delta_variant": buildDeltaVariantChart,
+    "political_mask_distribution": buildMaskUsageDistributionChart,
+    "political_frequent_mask_usage": buildFrequentMaskUsageChart,
+    "political_infrequent_mask_usage": buildInfrequentMaskUsageChart,
+    "demographics_density": buildUrbanRuralDensityChart,
+    "demographics_correlation": buildUrbanRuralCorrelationChart,
+    "demographics_rolling_average": buildUrbanRuralRollingAverageChart,
+    "demographics_deaths": buildUrbanRuralDeathsChart,
+    "unemployment_rate": buildUnemploymentRateChart,
+    "unemployment_covid": buildUnemploymentCovidChart,
+    "unemployment_mask": buildUnemploymentMaskChart,
+    "unemployment_vaccine": buildUnemploymentVaccineChart,
+}
@@ -11,6 +11,12 @@ from ETL.EtlUnemployment import (getUnemploymentCovidBase,
                                  getUnemploymentVaccineCorrelationPerMonth)
 from ETL.EtlElection import getStateLevelElectionData2020
 from ETL.EtlCovid import *
+from Visualization.VizDensity import computeDensity
+from Visualization.VizData import enableDataTransformer
+from Visualization.VizCache import cachedChart
+
+# datasets are written once per content, see VizData.py
+enableDataTransformer()
 
 party_domain = ["DEMOCRAT", "REPUBLICAN"]
 party_range = ["#030D97", "#970D03"]
@@ -35,6 +41,7 @@ def createMonthSlider(df:pd.DataFrame(), month_text: str):
                                           init={"month_since_start": min_month_nb})
     return month_selector
 
+@cachedChart
 def createUnemploymentChart(df:pd.DataFrame() = None):
     if df is None:
         unemployment_df = getUnemploymentRateSince122019()
@@ -44,9 +51,12 @@ def createUnemploymentChart(df:pd.DataFrame() = None):
     unemployment_domain = [0, int(unemployment_df["unemployment_rate"].max() / 10 + 1) * 10]
     # Create the slider for the month
     month_selector = createMonthSlider(df=unemployment_df, month_text="Elapsed months: ")
+    # Compute the density curves of each month and party instead of sending all the counties to the browser
+    density_df = computeDensity(unemployment_df, density="unemployment_rate", groupby=["month_since_start", "party"],
+                                as_=["unemployment_rate", "density"])
     # Prepare the plot itself
     unemployment_chart = alt.Chart(
-        unemployment_df,
+        density_df,
         width=500,
         height=400,
         title={
@@ -55,11 +65,7 @@ def createUnemploymentChart(df:pd.DataFrame() = None):
             ],
             "subtitle": ["Move the month slider at the bottom (1 = December 2019)",],
         }
-    ).transform_filter(month_selector).transform_density(
-        density="unemployment_rate",
-        groupby=["party"],
-        as_=["unemployment_rate", "density"]
-    ).mark_area(orient="vertical", opacity=0.8).encode(
+    ).transform_filter(month_selector).mark_area(orient="vertical", opacity=0.8).encode(
         x=alt.X("unemployment_rate:Q",
                 scale=alt.Scale(domain=unemployment_domain),
                 title="Unemployment Rate"),
@@ -77,6 +83,7 @@ def createUnemploymentChart(df:pd.DataFrame() = None):
     return unemployment_chart
 
 
+@cachedChart
 def createUnemploymentCorrelationLineChart(df:pd.DataFrame()=None, title:str=None, sort:list=[]):
     if df is None:
         df = getUnemploymentCovidCorrelationPerMonth()
@@ -103,7 +110,7 @@ def createUnemploymentCorrelationLineChart(df:pd.DataFrame()=None, title:str=Non
         width=600
     )
 
-    nearest = alt.selection(type="single", nearest=True, on="mouseover",
+    nearest = alt.selection(name="nearest_month", type="single", nearest=True, on="mouseover",
                             fields=["month"], empty="none")
     selectors = alt.Chart().mark_point().encode(
         x="month",
@@ -215,6 +222,7 @@ def createUnemploymentCorrelationLineCombinedChart(df:pd.DataFrame()=None, title
     )
     return final_chart
 
+@cachedChart
 def createUnemploymentMaskChart(freq_df:pd.DataFrame() = None, infreq_df:pd.DataFrame() = None):
     if (freq_df is None) or (infreq_df is None):
         freq_df, infreq_df = getJuly2020UnemploymentAndMask(getUnemploymentCovidBase())
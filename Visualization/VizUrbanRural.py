@@ -10,9 +10,12 @@ from ETL.EtlUrbanRural import *
 from ETL.EtlCovid import *
 from Visualization.VizBase import *
 from Visualization.VizCovid import *
+from Visualization.VizDensity import computeDensity
+from Visualization.VizCache import cachedChart
 
 #######################################################################################################
 
+@cachedChart
 def ElectionUrbanRuralDensityPlot(PEUrbanRuralDF:pd.DataFrame()=None):
     '''
     Plots the urban/rural designation of the counties merged with the county-level
@@ -33,8 +36,12 @@ def ElectionUrbanRuralDensityPlot(PEUrbanRuralDF:pd.DataFrame()=None):
 
     PctRuralDomain = [0, int(PEUrbanRuralDF["PctRural"].max() / 10) * 10]
 
+    # Compute the density curves of each party instead of sending all the counties to the browser
+    DensityDF = computeDensity(PEUrbanRuralDF, density="PctRural", groupby=["party"],
+                               as_=["Percent Rural", "Density"])
+
     densityplot = alt.Chart(
-        PEUrbanRuralDF,
+        DensityDF,
         width=500,
         height=400,
         title={
@@ -43,10 +50,6 @@ def ElectionUrbanRuralDensityPlot(PEUrbanRuralDF:pd.DataFrame()=None):
             ],
             "subtitle": ["Counties won by democratic candidates vs won by republicans",],
         }
-    ).transform_density(
-        density="PctRural",
-        groupby=["party"],
-        as_=["Percent Rural", "Density"]
     ).mark_area(orient="vertical", opacity=0.8).encode(
         x=alt.X("Percent Rural:Q",
                 scale=alt.Scale(domain=PctRuralDomain)),
@@ -63,6 +66,7 @@ def ElectionUrbanRuralDensityPlot(PEUrbanRuralDF:pd.DataFrame()=None):
 
 #######################################################################################################
 
+@cachedChart
 def UrbanRuralCorrelation(PEUrbanRuralDF:pd.DataFrame()=None):
     '''
     Plots the "percent rural" of counties vs fraction of the vote
@@ -177,6 +181,7 @@ def UrbanRuralCorrelation(PEUrbanRuralDF:pd.DataFrame()=None):
 
 #######################################################################################################
 
+@cachedChart
 def UrbanRuralRollingAvgCompChart(FullDF:pd.DataFrame()=None, UrbanDF:pd.DataFrame()=None, RuralDF:pd.DataFrame()=None):
     '''
     Forms a comparison chart showing rolling average of Covid cases for all counties,
@@ -240,6 +245,7 @@ def UrbanRuralRollingAvgSingleChart(case_rolling_df:pd.DataFrame()=None):    # C
 
 #######################################################################################################
 
+@cachedChart
 def UrbanRuralAvgDeathsCompChart(FullDF:pd.DataFrame()=None, UrbanDF:pd.DataFrame()=None, RuralDF:pd.DataFrame()=None):
     '''
     Forms a comparison chart showing average Covid deaths for all counties,
@@ -277,6 +283,7 @@ def UrbanRuralAvgDeathsCompChart(FullDF:pd.DataFrame()=None, UrbanDF:pd.DataFram
 
 #######################################################################################################
 
+@cachedChart
 def UrbanRuralMaskPlots(UrbanMaskDF:pd.DataFrame()=None, RuralMaskDF:pd.DataFrame()=None,):
     '''
     Called by: Main code
@@ -343,16 +350,18 @@ def UrbanRuralMaskDensityPlots(UrbanRuralMaskFreqDF):
     UrbanRuralMaskFreqDF2['Frequent'] = UrbanRuralMaskFreqDF2['Frequent'] / MaxFreq
 
 
+    # Compute the density curves of each party instead of sending all the counties to the browser
+    FreqDensityDF = computeDensity(UrbanRuralMaskFreqDF2, density="Frequent", groupby=["party"],
+                                   as_=["Frequency", "Density"])
+    InfreqDensityDF = computeDensity(UrbanRuralMaskFreqDF2, density="Infrequent", groupby=["party"],
+                                     as_=["Frequency", "Density"])
+
     # Frequent mask usage plot
     FreqDensityplot = alt.Chart(
-        UrbanRuralMaskFreqDF2,
+        FreqDensityDF,
         width=300,
         height=100,
         title=FreqTitle
-    ).transform_density(
-        density="Frequent",
-        groupby=["party"],
-        as_=["Frequency", "Density"]
     ).mark_area(orient="vertical", opacity=0.8).encode(
         x=alt.X("Frequency:Q",
                 scale=alt.Scale(domain=[0, 1.0]),
@@ -366,14 +375,10 @@ def UrbanRuralMaskDensityPlots(UrbanRuralMaskFreqDF):
     
     # Infrequent mask usage plot
     InfreqDensityplot = alt.Chart(
-        UrbanRuralMaskFreqDF2,
+        InfreqDensityDF,
         width=300,
         height=100,
         title=InfreqTitle
-    ).transform_density(
-        density="Infrequent",
-        groupby=["party"],
-        as_=["Frequency", "Density"]
     ).mark_area(orient="vertical", opacity=0.8).encode(
         x=alt.X("Frequency:Q",
                 scale=alt.Scale(domain=[0, 1.0]),
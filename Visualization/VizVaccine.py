@@ -10,10 +10,12 @@ from ETL.EtlBase import segment_color_dict, STAYED_REPUBLICAN, STAYED_DEMOCRAT
 from ETL.EtlElection import *
 from ETL.EtlVaccine import *
 from .VizBase import *
+from .VizGeometry import getGeoData
+from .VizData import enableDataTransformer
+from .VizCache import cachedChart
 
-# uses intermediate json files to speed things up
-alt.data_transformers.enable("json")
-alt.data_transformers.disable_max_rows()
+# datasets are written once per content, see VizData.py
+enableDataTransformer()
 
 
 # Formatting in Altair follows : https://github.com/d3/d3-format
@@ -143,7 +145,24 @@ def createStateVaccinationChart():
 
 
 #######################################################################################
-def createDailyInteractiveVaccinationChart(df: pd.DataFrame() = None):
+def getDailyVaccinationFrames(df: pd.DataFrame):
+    """
+        THIS FUNCTION builds the frame store of the daily vaccination chart: one row per state with the columns that
+        do not change with the day (state, party, population, bubble y position) followed by one column per day
+        ("d" + day_num) holding the percentage of the state population with one dose that day.
+        This state-by-day matrix replaces the long table of one row per state and day.
+
+        Input: Dataframe created by getDailyVaccinationPercentData() with the y_center column
+        Returns: The frame store dataframe
+    """
+    states_df = df.groupby("state_po")[["party_simplified", "Total population", "y_center"]].first()
+    percent_df = df.pivot(index="state_po", columns="day_num", values="Percent with one dose")
+    percent_df.columns = [f"d{day_num}" for day_num in percent_df.columns]
+    return states_df.join(percent_df).reset_index()
+
+
+@cachedChart
+def createDailyInteractiveVaccinationChart(df: pd.DataFrame() = None, frame_store: bool = True):
     """
         THIS FUNCTION creates an interactive chart. A slider is provided that starts from the first day any resident
         received vaccination and can be moved up until September 4th, 2021.
@@ -153,6 +172,10 @@ def createDailyInteractiveVaccinationChart(df: pd.DataFrame() = None):
 
         The size of the state bubble is proportional to the population of the state.
 
+        With frame_store, the bubble and text layers share a single state-by-day matrix (see getDailyVaccinationFrames)
+        and each layer picks the column of the slider day, instead of both filtering the whole state and day table
+        at every slider move.
+
     """
     if df is None:
         df = getDailyVaccinationPercentData().copy()
@@ -160,12 +183,13 @@ def createDailyInteractiveVaccinationChart(df: pd.DataFrame() = None):
     max_value = df["Total population"].max()
     min_value = df["Total population"].min()
 
+    # The dataframe can be the shared copy of the dataset cache: the column is added to a new dataframe
     if (max_value - min_value) == 0:
-        df["y_center"] = 0.5
+        df = df.assign(y_center=0.5)
     else:
-        df["y_center"] = (
-            (df["Total population"] - min_value) / (max_value - min_value)
-        ) + 0.5
+        df = df.assign(
+            y_center=((df["Total population"] - min_value) / (max_value - min_value)) + 0.5
+        )
 
     # Create Slider
     min_day_num = df.day_num.min()
@@ -180,17 +204,27 @@ def createDailyInteractiveVaccinationChart(df: pd.DataFrame() = None):
         fields=["day_num"], bind=slider, name="day_num", init={"day_num": max_day_num}
     )
 
-    base = (
-        alt.Chart(
-            df,
-            title=[
-                "Percentage of state’s population age 18 and older that has received",
-                "at least one dose of a COVID-19 vaccine as of September 4th, 2021",
-            ],
+    title = [
+        "Percentage of state’s population age 18 and older that has received",
+        "at least one dose of a COVID-19 vaccine as of September 4th, 2021",
+    ]
+    if frame_store:
+        frames_df = getDailyVaccinationFrames(df)
+        # The states without data for the slider day get a null percentage and are not drawn
+        day_percent = "datum['d' + day_num.day_num]"
+        base = (
+            alt.Chart()
+            .add_selection(slider_selection)
+            .transform_calculate(**{"Percent with one dose": day_percent})
         )
-        .add_selection(slider_selection)
-        .transform_filter(slider_selection)
-    )
+        text_base = alt.Chart().transform_calculate(**{"Percent with one dose": day_percent})
+    else:
+        base = (
+            alt.Chart(df, title=title)
+            .add_selection(slider_selection)
+            .transform_filter(slider_selection)
+        )
+        text_base = alt.Chart(df).transform_filter(slider_selection)
 
     big_chart_new = base.mark_point().encode(
         x=alt.X(
@@ -259,7 +293,7 @@ def createDailyInteractiveVaccinationChart(df: pd.DataFrame() = None):
     )
 
     big_chart_text = (
-        alt.Chart(df)
+        text_base
         .mark_text(
             align="left",
             baseline="middle",
@@ -271,12 +305,13 @@ def createDailyInteractiveVaccinationChart(df: pd.DataFrame() = None):
         .encode(
             x=alt.X("Percent with one dose:Q"), y=alt.Y("y_center:Q"), text="state_po"
         )
-        .transform_filter(slider_selection)
     )
 
-    final_chart = (big_chart + big_chart_text).configure_title(
-        align="left", anchor="start"
-    )
+    if frame_store:
+        final_chart = alt.layer(big_chart, big_chart_text, data=frames_df, title=title)
+    else:
+        final_chart = big_chart + big_chart_text
+    final_chart = final_chart.configure_title(align="left", anchor="start")
 
     return final_chart
 
@@ -290,16 +325,17 @@ def plotStateVaccinePct(df, date_in):
         Input: Dataframe with State fips STATEFP, Percent with one dose and STNAME
         Output: The choropleth and the click select for each state
     """
-    from vega_datasets import data
-
     source = df[df["date"] == date_in].copy()
-    us_states = alt.topo_feature(data.us_10m.url, "states")
+    us_states, state_transforms = getGeoData(
+        "states", source, "STATEFP", ["Percent with one dose", "STATEFP", "STNAME"]
+    )
 
-    click = alt.selection_multi(fields=["STATEFP"], init=[{"STATEFP": 1}])
+    click = alt.selection_multi(fields=["STATEFP"], init=[{"STATEFP": 1}], name="state_click")
 
     chart = (
         alt.Chart(
             us_states,
+            transform=state_transforms,
             title={
                 "text": [
                     "Tracking Covid Case Resurgence After Detection of First Delta variant in the US.",
@@ -327,12 +363,6 @@ def plotStateVaccinePct(df, date_in):
                 ),
             ],
         )
-        .transform_lookup(
-            lookup="id",
-            from_=alt.LookupData(
-                source, "STATEFP", ["Percent with one dose", "STATEFP", "STNAME"]
-            ),
-        )
         .add_selection(click)  ## Make sure you have added the selection here
         .project(type="albersUsa")
         .properties(width=500, height=300)
@@ -344,6 +374,7 @@ def plotStateVaccinePct(df, date_in):
 #########################################################################################
 
 
+@cachedChart
 def createCombinedVaccinationAndDeltaVariantTrend(
     state_vaccine_df: pd.DataFrame() = None,
     us_case_rolling_df: pd.DataFrame() = None,
@@ -589,7 +620,7 @@ def createCombinedVaccinationAndDeltaVariantTrend(
     base = line_base
 
     nearest = alt.selection(
-        type="single", nearest=True, on="mouseover", fields=["date"], empty="none"
+        name="nearest_date", type="single", nearest=True, on="mouseover", fields=["date"], empty="none"
     )
 
     # Transparent selectors across the chart. This is what tells us
@@ -0,0 +1,327 @@
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+RepositoryFolder = Path(__file__).resolve().parents[1]
+sys.path.append(str(RepositoryFolder))
+from ETL.EtlBase import clearSourceCache
+from ETL.EtlFetch import setOfflineMode
+from ETL.EtlPipeline import sortStages, selectStages
+
+#
+# This script benchmarks the ETL functions called by package_processed_datasets.py, one pipeline stage at a time.
+# For each stage it records the wall time of the function call (best of --repeat cold runs, the raw source registry
+# being emptied before each run), the peak resident memory (RSS) reached during the call and the peak of the memory
+# allocated by Python and numpy (tracemalloc, measured in a separate run since tracing slows the function down).
+#
+# Each stage is measured in its own process so that the memory figures of a stage do not include the previous ones.
+# The upstream datasets of a stage (e.g. unemployment_covid_df) are computed in that process before the measurement.
+# The stages are run from --root, the folder containing the sample_datasets/ (and data/) folder of raw inputs, so the
+# same stages can be measured on the sample datasets or on scaled-up synthetic inputs: --scale 10 generates (once)
+# synthetic inputs with 10 times the rows of the sample datasets (see synthetic_datasets.py) and measures the stages on
+# them. The remote inputs are only read from the HTTP cache of that folder (offline mode): a stage whose inputs are
+# missing is reported as failed.
+#
+# The results are saved as a baseline per input label in benchmarks/baselines/ (--save-baseline), and a later run can
+# be compared with it (--compare): a stage slower or using more memory than the baseline by more than --threshold is
+# reported as a regression and the script exits with status 1.
+#
+# Run it from the root folder of the repository:
+#   python benchmarks/benchmark_etl.py --save-baseline
+#   python benchmarks/benchmark_etl.py --stage case_rolling --compare
+#   python benchmarks/benchmark_etl.py --scale 10 --scale 100 --save-baseline
+#
+
+BaselineFolder = Path(__file__).resolve().parent / "baselines"
+REPEAT = 3
+REGRESSION_THRESHOLD = 0.2
+# Metrics compared with the baseline, with the smallest increase reported as a regression (to ignore the noise of the
+# short stages)
+COMPARED_METRICS = {"seconds": 0.05, "rss_increase_mb": 5, "peak_allocated_mb": 5}
+
+
+def getStages():
+    """
+    This function returns the pipeline stages declared by the packaging script producing datasets, in dependency
+    order (the stages only writing files of their own, e.g. the map geometry, are not ETL functions)
+
+    :return: The list of pipeline stages
+    """
+    from package_processed_datasets import STAGES
+    return sortStages([stage for stage in STAGES if stage.outputs])
+
+
+def resetPeakRss():
+    """
+    This function resets the peak resident memory of the process (Linux only), so that it can be read for one call
+
+    :return: True if the peak was reset, False if the peak of the whole process will be read instead
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def readProcessStatusMb(field: str):
+    """
+    This function reads a memory field of /proc/self/status (Linux only)
+
+    :param field: The name of the field (e.g. "VmRSS" or "VmHWM")
+    :return: The value in MB, or None if it cannot be read
+    """
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def getPeakRssMb():
+    """
+    This function reads the peak resident memory of the process since the last resetPeakRss
+
+    :return: The peak resident memory in MB
+    """
+    peak = readProcessStatusMb("VmHWM")
+    if peak is not None:
+        return peak
+    # ru_maxrss is in kB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def countRows(result):
+    """
+    This function returns the number of rows of the datasets returned by an ETL function
+
+    :param result: A dataframe or a tuple of dataframes
+    :return: The list of the numbers of rows
+    """
+    results = result if isinstance(result, tuple) else (result,)
+    return [len(df) for df in results]
+
+
+########################################################################################
+def measureStage(name: str, mode: str, repeat: int = REPEAT):
+    """
+    This function measures one stage in the current process (called in the child process started by runStage)
+
+    :param name: The name of the stage
+    :param mode: "time" for the wall time and the peak RSS, "allocations" for the tracemalloc peak
+    :param repeat: The number of timed runs (the best one is kept)
+    :return: Dictionary of the measures
+    """
+    stages = {stage.name: stage for stage in getStages()}
+    stage = stages[name]
+
+    # Upstream datasets, computed before the measurement
+    datasets = {}
+    for upstream_stage in sortStages(selectStages(list(stages.values()), [name])):
+        if upstream_stage.name == name:
+            continue
+        result = upstream_stage.function()
+        results = result if isinstance(result, tuple) else (result,)
+        datasets.update(zip(upstream_stage.outputs, results))
+    kwargs = {argument: datasets[dataset] for argument, dataset in stage.upstream.items()}
+
+    if mode == "allocations":
+        clearSourceCache()
+        tracemalloc.start()
+        stage.function(**kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {"peak_allocated_mb": peak / (1024 * 1024)}
+
+    timings = []
+    peak_rss_mb = rss_increase_mb = 0
+    rows = []
+    for _ in range(repeat):
+        clearSourceCache()
+        resetPeakRss()
+        rss_before_mb = readProcessStatusMb("VmRSS") or getPeakRssMb()
+        start = time.perf_counter()
+        result = stage.function(**kwargs)
+        timings.append(time.perf_counter() - start)
+        peak_rss_mb = max(peak_rss_mb, getPeakRssMb())
+        rss_increase_mb = max(rss_increase_mb, peak_rss_mb - rss_before_mb)
+        rows = countRows(result)
+        del result
+    return {"seconds": min(timings), "peak_rss_mb": peak_rss_mb, "rss_increase_mb": rss_increase_mb, "rows": rows}
+
+
+def runStage(name: str, root: Path, repeat: int = REPEAT, allocations: bool = True):
+    """
+    This function measures one stage in child processes run from the folder of the raw inputs
+
+    :param name: The name of the stage
+    :param root: The folder containing the sample_datasets/ folder of raw inputs
+    :param repeat: The number of timed runs
+    :param allocations: If True, also measure the tracemalloc peak in a separate process
+    :return: Dictionary of the measures, or of the error if the stage failed
+    """
+    environment = dict(os.environ, ETL_OFFLINE="1",
+                       PYTHONPATH=os.pathsep.join(filter(None, [str(RepositoryFolder), os.environ.get("PYTHONPATH")])))
+    measures = {}
+    for mode in ["time", "allocations"] if allocations else ["time"]:
+        process = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--child", name, "--mode", mode,
+                                  "--repeat", str(repeat)],
+                                 cwd=root, env=environment, capture_output=True, text=True)
+        if process.returncode != 0:
+            error = process.stderr.strip().splitlines()
+            return {"error": error[-1] if error else f"exit status {process.returncode}"}
+        measures.update(json.loads(process.stdout.strip().splitlines()[-1]))
+    return measures
+
+
+########################################################################################
+def getBaselinePath(label: str):
+    """
+    :param label: The label of the raw inputs (e.g. "sample")
+    :return: The path of the baseline file of these inputs
+    """
+    return BaselineFolder / f"etl_{label}.json"
+
+
+def saveBaseline(label: str, results: dict):
+    """
+    This function saves the results of a run as the baseline of its inputs, keeping the baseline of the stages that
+    were not run
+
+    :param label: The label of the raw inputs
+    :param results: Stage name -> measures
+    :return: The path of the baseline file
+    """
+    path = getBaselinePath(label)
+    baseline = json.loads(path.read_text()) if path.exists() else {"stages": {}}
+    baseline["stages"].update({name: measures for name, measures in results.items() if "error" not in measures})
+    baseline.update(created=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    python=platform.python_version(), machine=platform.machine(), processor=platform.processor())
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+    return path
+
+
+def compareWithBaseline(label: str, results: dict, threshold: float = REGRESSION_THRESHOLD):
+    """
+    This function compares the results of a run with the baseline of its inputs
+
+    :param label: The label of the raw inputs
+    :param results: Stage name -> measures
+    :param threshold: The relative increase above which a metric is a regression (0.2 for 20%)
+    :return: The list of regressions as (stage, metric, baseline value, new value)
+    """
+    path = getBaselinePath(label)
+    if not path.exists():
+        raise FileNotFoundError(f"No baseline for the inputs {label}, run with --save-baseline first")
+    baseline = json.loads(path.read_text())["stages"]
+    regressions = []
+    for name, measures in results.items():
+        for metric, minimum_increase in COMPARED_METRICS.items():
+            before, after = baseline.get(name, {}).get(metric), measures.get(metric)
+            if before is not None and after is not None and after > before * (1 + threshold) \
+                    and after - before > minimum_increase:
+                regressions.append((name, metric, before, after))
+    return regressions
+
+
+def printResults(results: dict):
+    """
+    This function prints the measures of the stages as a table
+
+    :param results: Stage name -> measures
+    :return: None
+    """
+    print(f"{'stage':35} {'seconds':>9} {'peak RSS MB':>12} {'RSS increase MB':>16} {'allocated MB':>13}  rows")
+    for name, measures in results.items():
+        if "error" in measures:
+            print(f"{name:35} failed: {measures['error']}")
+            continue
+        allocated = measures.get("peak_allocated_mb")
+        print(f"{name:35} {measures['seconds']:9.3f} {measures['peak_rss_mb']:12.1f} "
+              f"{measures['rss_increase_mb']:16.1f} "
+              f"{'' if allocated is None else f'{allocated:13.1f}':>13}  {measures['rows']}")
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Benchmark the ETL functions of the packaging pipeline")
+    parser.add_argument("--stage", action="append", default=None,
+                        help="only benchmark the given stage (can be repeated)")
+    parser.add_argument("--root", type=Path, default=RepositoryFolder,
+                        help="folder containing the sample_datasets/ folder of raw inputs (default the repository)")
+    parser.add_argument("--label", default="sample",
+                        help="label of the raw inputs, naming their baseline file (default sample)")
+    parser.add_argument("--scale", type=float, action="append", default=None,
+                        help="measure on synthetic inputs with this multiple of the sample rows, labelled x<scale> "
+                             "(can be repeated)")
+    parser.add_argument("--synthetic-folder", type=Path, default=Path(tempfile.gettempdir()) / "etl-synthetic",
+                        help="folder of the generated synthetic inputs, kept for the following runs")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="number of timed runs of each stage")
+    parser.add_argument("--no-allocations", action="store_true",
+                        help="skip the tracemalloc run measuring the allocated memory")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the baseline")
+    parser.add_argument("--compare", action="store_true", help="compare the results with the baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="relative increase reported as a regression (default 0.2)")
+    parser.add_argument("--output", type=Path, default=None, help="also write the results to this JSON file")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--mode", default="time", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        setOfflineMode(True)
+        print(json.dumps(measureStage(args.child, args.mode, args.repeat)))
+        sys.exit(0)
+
+    names = [stage.name for stage in getStages()]
+    unknown = set(args.stage or []) - set(names)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+    inputs = [(args.label, args.root.resolve())]
+    if args.scale is not None:
+        from synthetic_datasets import generateDatasets, getScaledSize
+        inputs = []
+        for scale in args.scale:
+            label = f"x{scale:g}"
+            root = (args.synthetic_folder / label).resolve()
+            if not (root / "sample_datasets").exists():
+                counties, span = getScaledSize(scale)
+                print(f"Generating the {label} inputs ({counties} counties, date spans x{span}) in {root}")
+                generateDatasets(root, counties, span)
+            inputs.append((label, root))
+
+    all_results = {}
+    regressions = []
+    for label, root in inputs:
+        results = {}
+        for name in names if args.stage is None else [name for name in names if name in args.stage]:
+            results[name] = runStage(name, root, args.repeat, allocations=not args.no_allocations)
+        print(f"Inputs {label} ({root})")
+        printResults(results)
+        all_results[label] = results
+
+        if args.save_baseline:
+            print(f"Baseline saved in {saveBaseline(label, results)}")
+        if args.compare:
+            for name, metric, before, after in compareWithBaseline(label, results, args.threshold):
+                print(f"REGRESSION {label} {name} {metric}: {before:.3f} -> {after:.3f} (+{after / before - 1:.0%})")
+                regressions.append((label, name, metric))
+
+    if args.output is not None:
+        args.output.write_text(json.dumps(all_results, indent=2, sort_keys=True))
+    sys.exit(1 if regressions else 0)
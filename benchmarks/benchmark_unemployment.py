@@ -0,0 +1,56 @@
+import sys
+import timeit
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from ETL.EtlBase import DataFolder, clearSourceCache
+from ETL.EtlUnemployment import getUnemploymentRates
+
+#
+# This script compares the preparation of the monthly unemployment rates (month period, county FIPS and number of
+# months since the start) on the full bls_unemployment_rates.csv file, between the former row-wise apply version
+# and the vectorized ETL.EtlUnemployment.getUnemploymentRates function. Both must return the same dataframe.
+#
+# Run it from the root folder of the repository: python benchmarks/benchmark_unemployment.py
+#
+
+REPEAT = 5
+
+
+def getUnemploymentRatesRowWise(start_month: str):
+    """
+    This function is the former row-wise version of the unemployment rates preparation, kept as the baseline
+
+    :param start_month: The first month to keep, as "YYYY-MM"
+    :return: The same dataframe as getUnemploymentRates
+    """
+    unemployment_df = pd.read_csv(DataFolder / r"bls_unemployment_rates.csv",
+                                  names=["LAUS_code","state_fips","county_fips","year","month","unemployment_rate","footnotes"],
+                                  header=0)
+    unemployment_df["month"] = unemployment_df.apply(lambda x: pd.to_datetime(f"{x['year']}-{x['month']}", format="%Y-%m").to_period('M'), axis=1)
+    unemployment_df = unemployment_df[(unemployment_df["month"]>=pd.to_datetime(start_month, format="%Y-%m").to_period('M'))]
+    concatenate_fips = lambda x : int(str(x["state_fips"]) + "{:03d}".format(x["county_fips"]))
+    unemployment_df["COUNTYFP"] = unemployment_df.apply(concatenate_fips, axis=1)
+    unemployment_df = unemployment_df[unemployment_df["COUNTYFP"] < 57000]
+    first_month = unemployment_df["month"].min()
+    calculate_month_since_start = lambda x : (x - first_month).n + 1
+    unemployment_df["month_since_start"] = unemployment_df["month"].apply(calculate_month_since_start)
+    unemployment_df["unemployment_rate"] = unemployment_df["unemployment_rate"].astype("float64")
+    unemployment_df.drop(columns=["state_fips", "county_fips", "LAUS_code","year","footnotes"], inplace=True)
+    return unemployment_df
+
+
+if __name__ == '__main__':
+    for start_month in ["2019-12", "2020-01"]:
+        row_wise_df = getUnemploymentRatesRowWise(start_month)
+        vectorized_df = getUnemploymentRates(start_month)
+        pd.testing.assert_frame_equal(row_wise_df, vectorized_df)
+
+        row_wise_time = min(timeit.repeat(lambda: getUnemploymentRatesRowWise(start_month), number=1, repeat=REPEAT))
+        # Clear the raw source registry so that both versions parse the CSV file on every run
+        vectorized_time = min(timeit.repeat(lambda: (clearSourceCache(), getUnemploymentRates(start_month)),
+                                            number=1, repeat=REPEAT))
+        print(f"Since {start_month} ({len(vectorized_df)} rows) - row-wise: {row_wise_time:.3f}s, "
+              f"vectorized: {vectorized_time:.3f}s, speedup: x{row_wise_time / vectorized_time:.1f}")
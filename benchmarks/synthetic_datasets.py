@@ -0,0 +1,383 @@
+import argparse
+import json
+import math
+import shutil
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RepositoryFolder = Path(__file__).resolve().parents[1]
+sys.path.append(str(RepositoryFolder))
+from ETL.EtlFetch import getCachePaths
+
+#
+# This script generates synthetic versions of the raw datasets of sample_datasets/, with more counties and longer date
+# spans, to measure how the ETL functions (see benchmark_etl.py) and the charts scale as the data grows.
+#
+# The synthetic files keep the names, columns, types and formats of the sample files, so that the ETL functions read
+# them unchanged:
+# - Counties: the counties of the sample files are kept and new counties are added as copies of them, numbered with
+#   the free county codes of the same state (the county part of a FIPS code has 3 digits, which bounds the number of
+#   counties to about 16 times the sample). A copy has the values of its template county in every file, with its own
+#   FIPS code (and LAUS code, GEOID) and its name followed by the copy number, so that all the files still join.
+# - Dates: the dated files (NYT rolling averages, CDC vaccinations, BLS monthly rates) are repeated span times, each
+#   repetition shifted by the date range of the sample file, so that data accumulated over a longer period is read.
+# The remote files read by the ETL functions (NYT mask use and US and state rolling averages) are written to the HTTP
+# cache of the output folder (see ETL/EtlFetch.py), the state and US rolling averages being aggregated from the
+# synthetic county ones. The files read from ./data/ are also written there.
+#
+# Run it from the root folder of the repository, e.g. for 10 times the sample counties over 3 times the date spans:
+#   python benchmarks/synthetic_datasets.py /tmp/etl-synthetic --county-factor 10 --span 3
+# and benchmark the ETL functions on the result with:
+#   python benchmarks/benchmark_etl.py --root /tmp/etl-synthetic --label synthetic
+# The payload sizes of the page charts are checked at a larger scale by tests/test_chart_payloads.py.
+#
+
+SampleFolder = RepositoryFolder / "sample_datasets"
+MAX_COUNTY_CODE = 999
+
+MASK_URL = "https://raw.githubusercontent.com/nytimes/covid-19-data/master/mask-use/mask-use-by-county.csv"
+US_ROLLING_AVERAGE_URL = "https://raw.githubusercontent.com/nytimes/covid-19-data/master/rolling-averages/us.csv"
+STATES_ROLLING_AVERAGE_URL = \
+    "https://raw.githubusercontent.com/nytimes/covid-19-data/master/rolling-averages/us-states.csv"
+
+
+########################################################################################
+# Synthetic counties
+########################################################################################
+def getTemplateCounties(sample_folder: Path = SampleFolder):
+    """
+    This function returns the counties of the sample datasets, the templates of the synthetic counties
+
+    :param sample_folder: The folder of the sample datasets
+    :return: The sorted array of the county FIPS codes of the county election results
+    """
+    election_df = pd.read_csv(sample_folder / "countypres_2000-2020.csv", usecols=["county_fips"])
+    return np.sort(election_df["county_fips"].dropna().astype(int).unique())
+
+
+def getMaxCounties(templates: np.ndarray):
+    """
+    This function returns the largest number of counties that can be generated: every county code of the states of
+    the template counties
+
+    :param templates: The FIPS codes of the template counties
+    :return: The maximum number of counties
+    """
+    return len(np.unique(templates // 1000)) * MAX_COUNTY_CODE + int(np.sum(templates % 1000 == 0))
+
+
+def getSyntheticCounties(templates: np.ndarray, counties: int):
+    """
+    This function numbers the synthetic counties. The template counties come first, then their copies, a round of
+    copies at a time, each copy taking the next free county code of the state of its template.
+
+    :param templates: The FIPS codes of the template counties
+    :param counties: The number of counties to generate
+    :return: Dataframe of the synthetic counties: fips, template (FIPS of the copied county) and copy (0 for the
+             template county itself, then 1, 2...). With fewer counties than the templates, the templates left out
+             have the copy -1.
+    """
+    if counties <= len(templates):
+        return pd.DataFrame({"fips": templates, "template": templates,
+                             "copy": np.where(np.arange(len(templates)) < counties, 0, -1)})
+    if counties > getMaxCounties(templates):
+        raise ValueError(f"At most {getMaxCounties(templates)} counties can be generated, {counties} requested")
+
+    used = set(templates.tolist())
+    next_code = {}
+    rows = [(fips, fips, 0) for fips in templates]
+    copy = 0
+    while len(rows) < counties:
+        copy += 1
+        for template in templates:
+            state, code = divmod(int(template), 1000)
+            if code == 0:
+                continue
+            code = next_code.get(state, 1)
+            while code <= MAX_COUNTY_CODE and state * 1000 + code in used:
+                code += 1
+            next_code[state] = code + 1
+            if code > MAX_COUNTY_CODE:
+                continue
+            used.add(state * 1000 + code)
+            rows.append((state * 1000 + code, template, copy))
+            if len(rows) == counties:
+                break
+    return pd.DataFrame(rows, columns=["fips", "template", "copy"])
+
+
+def cloneCountyRows(df: pd.DataFrame, fips: pd.Series, counties: pd.DataFrame, name_columns: list = ()):
+    """
+    This function copies the rows of each template county for each of its synthetic counties. The rows without
+    county (missing FIPS) or of a county unknown to the election results are kept once, unchanged.
+
+    :param df: The rows of a county dataset
+    :param fips: The county FIPS code of each row (NaN for the rows without county)
+    :param counties: The synthetic counties (see getSyntheticCounties)
+    :param name_columns: The columns of the county name, followed by the copy number in the copies
+    :return: The dataframe of the synthetic rows and the FIPS code of each of them
+    """
+    rows = pd.DataFrame({"row": np.arange(len(df)), "template": pd.to_numeric(fips, errors="coerce").to_numpy()})
+    without_county = rows[~rows["template"].isin(counties["template"])]
+    without_county = without_county.assign(fips=without_county["template"], copy=0)
+    rows = rows.dropna(subset=["template"]).astype({"template": int}).merge(counties, on="template")
+    rows = pd.concat([rows[rows["copy"] >= 0], without_county]).sort_values(["copy", "row"], kind="stable")
+
+    synthetic_df = df.iloc[rows["row"].to_numpy()].reset_index(drop=True)
+    copies = rows["copy"].to_numpy()
+    for column in name_columns:
+        names = synthetic_df[column].astype(str)
+        synthetic_df[column] = synthetic_df[column].where(copies == 0, names + " " + pd.Series(copies).astype(str))
+    return synthetic_df, pd.Series(rows["fips"].to_numpy())
+
+
+########################################################################################
+# Longer date spans
+########################################################################################
+def tileDates(df: pd.DataFrame, dates: pd.Series, span: int):
+    """
+    This function repeats the rows of a dated dataset span times, each repetition shifted by the date range of the
+    dataset (e.g. 50 days of data with span 3 give 150 days)
+
+    :param df: The rows of a dated dataset
+    :param dates: The date of each row (datetime or monthly period)
+    :param span: The number of repetitions
+    :return: The dataframe of the repeated rows and the date of each of them
+    """
+    dates = dates.reset_index(drop=True)
+    if isinstance(dates.dtype, pd.PeriodDtype):
+        shift = (dates.max() - dates.min()).n + 1
+    else:
+        shift = dates.max() - dates.min() + pd.Timedelta(days=1)
+    shifts = [dates + shift * repetition for repetition in range(span)]
+    return (pd.concat([df.reset_index(drop=True)] * span, ignore_index=True),
+            pd.concat(shifts, ignore_index=True))
+
+
+def formatShortDates(dates: pd.Series):
+    """
+    :param dates: Datetime series
+    :return: The dates formatted as in the NYT and CDC files (e.g. 1/21/2020)
+    """
+    return (dates.dt.month.astype(str) + "/" + dates.dt.day.astype(str) + "/" + dates.dt.year.astype(str))
+
+
+def formatSocrataDates(dates: pd.Series):
+    """
+    :param dates: Datetime series
+    :return: The dates formatted as in the CDC Socrata API answers (e.g. 2021-07-01T00:00:00.000)
+    """
+    return dates.dt.strftime("%Y-%m-%dT%H:%M:%S.000")
+
+
+########################################################################################
+# Synthetic datasets
+########################################################################################
+def writeCsv(df: pd.DataFrame, paths: list, **to_csv_kwargs):
+    """
+    This function writes a dataset to one or more CSV files (zipped if the name ends with .zip)
+
+    :param df: The dataset
+    :param paths: The paths of the files
+    :param to_csv_kwargs: Keyword arguments passed to pandas to_csv
+    :return: The number of rows
+    """
+    for path in paths:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix == ".zip":
+            compression = {"method": "zip", "archive_name": path.with_suffix(".csv").name}
+            df.to_csv(path, compression=compression, **to_csv_kwargs)
+        else:
+            df.to_csv(path, **to_csv_kwargs)
+    return len(df)
+
+
+def writeCachedUrl(df: pd.DataFrame, url: str, cache_folder: Path):
+    """
+    This function writes a dataset as the cached copy of a remote file (see ETL.EtlFetch.fetchUrl)
+
+    :param df: The dataset
+    :param url: The URL of the remote file
+    :param cache_folder: The HTTP cache folder
+    :return: The number of rows
+    """
+    content_path, metadata_path = getCachePaths(url, cache_folder)
+    writeCsv(df, [content_path], index=False)
+    metadata_path.write_text(json.dumps({"url": url, "etag": None, "last_modified": None}, indent=2))
+    return len(df)
+
+
+def aggregateRollingAverages(county_rolling_df: pd.DataFrame):
+    """
+    This function aggregates the county rolling averages into the NYT US and state rolling averages files
+
+    :param county_rolling_df: The synthetic county rolling averages
+    :return: The dataframes of the US (us.csv) and state (us-states.csv) rolling averages
+    """
+    df = county_rolling_df.assign(date=pd.to_datetime(county_rolling_df["date"], format="%m/%d/%Y"),
+                                  STATEFP=county_rolling_df["geoid"].str.slice(4).astype(int) // 1000)
+    aggregations = {"cases": "sum", "cases_avg": "sum", "cases_avg_per_100k": "mean",
+                    "deaths": "sum", "deaths_avg": "sum", "deaths_avg_per_100k": "mean"}
+    us_df = df.groupby("date").agg(aggregations).reset_index()
+    us_df.insert(1, "geoid", "USA")
+    states_df = df.groupby(["date", "STATEFP", "state"]).agg(aggregations).reset_index()
+    states_df.insert(1, "geoid", "USA-" + states_df.pop("STATEFP").map("{:02d}".format))
+    for rolling_df in [us_df, states_df]:
+        rolling_df["date"] = rolling_df["date"].dt.strftime("%Y-%m-%d")
+    return us_df, states_df
+
+
+def generateDatasets(output_folder: Path, counties: int = None, span: int = 1, sample_folder: Path = SampleFolder):
+    """
+    This function writes the synthetic raw datasets in the sample_datasets/ and data/ folders of the output folder
+
+    :param output_folder: The output folder, to be used as the --root of benchmark_etl.py
+    :param counties: The number of counties (default the number of counties of the sample datasets)
+    :param span: The date spans of the dated datasets, as a multiple of the sample date spans
+    :param sample_folder: The folder of the sample datasets
+    :return: Dictionary of the written file names -> number of rows
+    """
+    data_folder = Path(output_folder) / "sample_datasets"
+    local_data_folder = Path(output_folder) / "data"
+    cache_folder = data_folder / "http_cache"
+    templates = getTemplateCounties(sample_folder)
+    counties_df = getSyntheticCounties(templates, len(templates) if counties is None else counties)
+    written = {}
+
+    # County presidential election results
+    df = pd.read_csv(sample_folder / "countypres_2000-2020.csv")
+    df, fips = cloneCountyRows(df, df["county_fips"], counties_df, ["county_name"])
+    df["county_fips"] = fips.to_numpy()
+    written["countypres_2000-2020.csv"] = writeCsv(df, [data_folder / "countypres_2000-2020.csv"], index=False)
+
+    # NYT county rolling averages, and the US and state ones aggregated from them
+    df = pd.read_csv(sample_folder / "sept_4_rolling_average_us-counties.zip")
+    df, fips = cloneCountyRows(df, df["geoid"].str.slice(4), counties_df, ["county"])
+    df["geoid"] = "USA-" + fips.astype(int).map("{:05d}".format).to_numpy()
+    df, dates = tileDates(df, pd.to_datetime(df["date"], format="%m/%d/%Y"), span)
+    df["date"] = formatShortDates(dates)
+    written["sept_4_rolling_average_us-counties.zip"] = writeCsv(
+        df, [data_folder / "sept_4_rolling_average_us-counties.zip"], index=False)
+    us_df, states_df = aggregateRollingAverages(df)
+    written["us.csv (HTTP cache)"] = writeCachedUrl(us_df, US_ROLLING_AVERAGE_URL, cache_folder)
+    written["us-states.csv (HTTP cache)"] = writeCachedUrl(states_df, STATES_ROLLING_AVERAGE_URL, cache_folder)
+
+    # CDC county vaccinations
+    df = pd.read_csv(sample_folder / "COVID-19_Vaccinations_in_the_United_States_County.zip", dtype={"FIPS": str})
+    df, fips = cloneCountyRows(df, df["FIPS"], counties_df, ["Recip_County"])
+    df["FIPS"] = df["FIPS"].where(fips.isna().to_numpy(), fips.astype("Int64").astype(str).to_numpy())
+    df, dates = tileDates(df, pd.to_datetime(df["Date"], format="%m/%d/%Y"), span)
+    df["Date"] = formatShortDates(dates)
+    written["COVID-19_Vaccinations_in_the_United_States_County.zip"] = writeCsv(
+        df, [data_folder / "COVID-19_Vaccinations_in_the_United_States_County.zip"], index=False)
+
+    df = pd.read_csv(sample_folder / "CountyVaccineDataFile1.csv", index_col=0)
+    df, fips = cloneCountyRows(df, df["fips"], counties_df, ["recip_county"])
+    df["fips"] = fips.astype(int).to_numpy()
+    df, dates = tileDates(df, pd.to_datetime(df["date"]), span)
+    df["date"] = formatSocrataDates(dates)
+    written["CountyVaccineDataFile1.csv"] = writeCsv(df, [data_folder / "CountyVaccineDataFile1.csv"])
+
+    # CDC state (jurisdiction) vaccinations
+    df = pd.read_csv(sample_folder / "COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv")
+    df, dates = tileDates(df, pd.to_datetime(df["Date"], format="%m/%d/%Y"), span)
+    df["Date"] = formatShortDates(dates)
+    written["COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv"] = writeCsv(
+        df, [data_folder / "COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv",
+             local_data_folder / "COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv"], index=False)
+
+    df = pd.read_csv(sample_folder / "StateVaccineDataFile1.csv", index_col=0)
+    df, dates = tileDates(df, pd.to_datetime(df["date"]), span)
+    df["date"] = formatSocrataDates(dates)
+    written["StateVaccineDataFile1.csv"] = writeCsv(df, [data_folder / "StateVaccineDataFile1.csv"])
+
+    # Census population estimates (the state rows are kept once)
+    df = pd.read_csv(sample_folder / "County Data Till 2020 co-est2020-alldata.csv", encoding="latin-1")
+    county_rows = df["SUMLEV"] == 50
+    county_df = df[county_rows]
+    county_df, fips = cloneCountyRows(county_df, county_df["STATE"] * 1000 + county_df["COUNTY"], counties_df,
+                                      ["CTYNAME"])
+    county_df["STATE"], county_df["COUNTY"] = np.divmod(fips.astype(int).to_numpy(), 1000)
+    df = pd.concat([df[~county_rows], county_df], ignore_index=True).sort_values(["STATE", "SUMLEV"], kind="stable")
+    written["County Data Till 2020 co-est2020-alldata.csv"] = writeCsv(
+        df, [data_folder / "County Data Till 2020 co-est2020-alldata.csv",
+             local_data_folder / "County Data Till 2020 co-est2020-alldata.csv"], index=False, encoding="latin-1")
+
+    # Census rural lookup: 4 rows of title and header, the counties and 6 rows of footnotes
+    df = pd.read_excel(sample_folder / "County_Rural_Lookup.xlsx", header=None, dtype={0: str})
+    county_df, fips = cloneCountyRows(df.iloc[4:-6], df.iloc[4:-6, 0], counties_df, [2])
+    county_df[0] = fips.astype(int).map("{:05d}".format).to_numpy()
+    df = pd.concat([df.iloc[:4], county_df, df.iloc[-6:]], ignore_index=True)
+    (data_folder / "County_Rural_Lookup.xlsx").parent.mkdir(parents=True, exist_ok=True)
+    df.to_excel(data_folder / "County_Rural_Lookup.xlsx", header=False, index=False)
+    written["County_Rural_Lookup.xlsx"] = len(county_df)
+
+    # BLS monthly unemployment rates (LAUS code, state FIPS, county FIPS, year, month, rate, footnote) and LAUS codes
+    df = pd.read_csv(sample_folder / "bls_unemployment_rates.csv", header=None, dtype={0: str, 6: str})
+    df, fips = cloneCountyRows(df, df[1] * 1000 + df[2], counties_df)
+    df[1], df[2] = np.divmod(fips.astype(int).to_numpy(), 1000)
+    df[0] = "LAUCN" + fips.astype(int).map("{:05d}".format).to_numpy() + "0000000003"
+    df, months = tileDates(df, pd.to_datetime(pd.DataFrame({"year": df[3], "month": df[4], "day": 1}))
+                           .dt.to_period("M"), span)
+    df[3], df[4] = months.dt.year.to_numpy(), months.dt.month.to_numpy()
+    written["bls_unemployment_rates.csv"] = writeCsv(df, [data_folder / "bls_unemployment_rates.csv"],
+                                                     header=False, index=False)
+
+    df = pd.read_csv(sample_folder / "bls_laus_codes.csv", header=None, dtype=str)
+    df, fips = cloneCountyRows(df, df[0].str.slice(5, 10), counties_df)
+    df[0] = "LAUCN" + fips.astype(int).map("{:05d}".format).to_numpy() + "0000000003"
+    written["bls_laus_codes.csv"] = writeCsv(df, [data_folder / "bls_laus_codes.csv"], header=False, index=False)
+
+    # NYT mask use, local copy (with an index column) and remote file
+    df = pd.read_csv(sample_folder / "mask-use-by-county.csv", index_col=0)
+    df, fips = cloneCountyRows(df, df["COUNTYFP"], counties_df)
+    df["COUNTYFP"] = fips.astype(int).to_numpy()
+    written["mask-use-by-county.csv"] = writeCsv(df, [data_folder / "mask-use-by-county.csv"])
+    writeCachedUrl(df, MASK_URL, cache_folder)
+
+    # State level datasets, copied unchanged
+    for name, folders in [("1976-2020-president.csv", [data_folder]),
+                          ("covid19_vaccinations_in_the_united_states.csv", [data_folder, local_data_folder])]:
+        for folder in folders:
+            folder.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(sample_folder / name, folder / name)
+        written[name] = None
+    return written
+
+
+def getScaledSize(scale: float, sample_folder: Path = SampleFolder):
+    """
+    This function splits a scale factor of the number of rows into a number of counties and a date span: the
+    counties are multiplied first, up to the maximum number of counties, then the date spans
+
+    :param scale: The scale factor (e.g. 10 or 100)
+    :param sample_folder: The folder of the sample datasets
+    :return: The number of counties and the date span
+    """
+    templates = getTemplateCounties(sample_folder)
+    county_factor = min(scale, getMaxCounties(templates) / len(templates))
+    return int(len(templates) * county_factor), max(1, math.ceil(scale / county_factor))
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description="Generate synthetic raw datasets at a larger scale than the samples")
+    parser.add_argument("output", type=Path, help="output folder (its sample_datasets/ and data/ folders are written)")
+    parser.add_argument("--counties", type=int, default=None, help="number of counties")
+    parser.add_argument("--county-factor", type=float, default=None,
+                        help="number of counties as a multiple of the sample counties")
+    parser.add_argument("--span", type=int, default=1, help="date spans as a multiple of the sample date spans")
+    parser.add_argument("--scale", type=float, default=None,
+                        help="multiple of the sample rows, split into counties and date spans (overrides the above)")
+    args = parser.parse_args()
+
+    counties, span = args.counties, args.span
+    if args.county_factor is not None:
+        counties = int(len(getTemplateCounties()) * args.county_factor)
+    if args.scale is not None:
+        counties, span = getScaledSize(args.scale)
+    for name, rows in generateDatasets(args.output, counties, span).items():
+        print(f"{name}: {'copied' if rows is None else f'{rows} rows'}")
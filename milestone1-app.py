@@ -36,11 +36,23 @@ from Visualization.VizUrbanRural import (
     UrbanRuralMaskPlots
 )
 
+# The load_* functions share one copy of each dataset per process, not to be modified, see ETL.EtlStore.loadCachedData
+from ETL.EtlStore import loadCachedData
+from Visualization.VizData import showChart
+
 DataFolder = Path("./data/")
 
 # Set streamlit page to wide format
 st.set_page_config(layout="wide")
 
+
+# The sections with charts are rendered only once opened: their datasets are loaded and their charts built on demand.
+# The content of a st.expander runs on every rerun even when collapsed, hence a checkbox opening each section.
+def show_section(render_section, key, opened=False):
+    if st.checkbox("Show the charts", value=opened, key=key):
+        render_section()
+
+
 # Show the header image
 
 #Remove some caching to reduce memory usage due to Streamlit limitations
@@ -97,8 +109,9 @@ st.subheader(
     anchor="partyandcovid",
 )
 
-st.markdown(
-    """
+def show_case_trend():
+    st.markdown(
+        """
 The basis of this project began with the observations derived from the visualization below. 
 The **task** is to determine if there is a significant difference in the rate of rise of COVID cases between 
 normalized (per 100K) populations that professes affiliation to one party or another (Republican, Democrat and Other). 
@@ -112,43 +125,46 @@ rolling average rather than **raw numbers** which can reflect data collection an
 From the visualization we observed that the rate of rise of the infection was markedly higher, towards the end of 
 the first year of the pandemic, in the populations that voted Republican (remained loyal in 2020 or switched from 2016).  
 """
-)
+    )
 
-# Get rolling average of cases by segment
-#@st.cache #Remove some caching to reduce memory usage due to Streamlit limitations
-def load_case_rolling_df():
-    df = pd.read_csv("./data/case_rolling_df.csv")
-    return df
+    # Get rolling average of cases by segment
+    def load_case_rolling_df():
+        df = loadCachedData("case_rolling_df")
+        return df
 
-case_rolling_df = load_case_rolling_df()
-# Create the chart
-(
-    base,
-    make_selector,
-    highlight_segment,
-    radio_select,
-) = createCovidConfirmedTimeseriesChart(case_rolling_df)
-selectors, rules, points, tooltip_text = createTooltip(
-    base, radio_select, case_rolling_df
-)
+    case_rolling_df = load_case_rolling_df()
+    # Create the chart
+    (
+        base,
+        make_selector,
+        highlight_segment,
+        radio_select,
+    ) = createCovidConfirmedTimeseriesChart(case_rolling_df)
+    selectors, rules, points, tooltip_text = createTooltip(
+        base, radio_select, case_rolling_df
+    )
 
 
-st.markdown("""---""")
-# Bring all the layers together with layering and concatenation
-st.altair_chart(
-    (
-        alt.layer(highlight_segment, selectors, points, rules, tooltip_text)
-        | make_selector
-    ).configure_title(align="left", anchor="start")
-)
+    st.markdown("""---""")
+    # Bring all the layers together with layering and concatenation
+    showChart(
+        (
+            alt.layer(highlight_segment, selectors, points, rules, tooltip_text)
+            | make_selector
+        ).configure_title(align="left", anchor="start")
+    )
+
+show_section(show_case_trend, key="case_trend", opened=True)
 
 st.markdown("""---""")
 
 # Strength of affiliation and COVID deaths at County level
 ###########################################
 st.subheader("Strength of affiliation and COVID deaths at County level")
-st.markdown(
-    """
+
+def show_deaths_by_affiliation():
+    st.markdown(
+        """
 Does strength of affiliation, as determined by the percentile point change in votes received by a party in 2020 
 over 2016, show any correlation to the number of COVID related deaths in that county? 
 With the below visual, we compared the counties voting for each party that suffered the most deaths per 100K population.
@@ -160,59 +176,59 @@ Stayed Republican.
 
 > [Chart Design Credit to NPR](https://www.npr.org/sections/health-shots/2020/11/06/930897912/many-places-hard-hit-by-covid-19-leaned-more-toward-trump-in-2020-than-2016)
 """
-)
-
-st.markdown("""---""")
+    )
 
-# election_change_and_covid_death_df = pd.read_csv(
-#     "./data/election_change_and_covid_death_df.csv"
-#
-#Remove some caching to reduce memory usage due to Streamlit limitations)
-#@st.cache
-def load_percentile_point_deaths():
-    df = pd.read_csv("./data/percentile_point_deaths.csv")
-    return df
+    st.markdown("""---""")
 
-election_change_and_covid_death_df = pd.read_csv("./data/percentile_point_deaths.csv")
-st.altair_chart(
-    createPercentPointChangeAvgDeathsChart(
-        election_change_and_covid_death_df
-    ).configure_title(align="left", anchor="start")
-)
+    # election_change_and_covid_death_df = pd.read_csv(
+    #     "./data/election_change_and_covid_death_df.csv"
+    # )
+    def load_percentile_point_deaths():
+        df = loadCachedData("election_change_and_covid_death_df")
+        return df
 
-df = election_change_and_covid_death_df.copy()
-df["deaths_avg_per_100k"] = df["deaths_avg_per_100k"].astype("float")
-df["pct_increase"] = df["pct_increase"].astype("float")
-col1, col2, col3, col4 = st.beta_columns(4)
-formatted_string = "{:.2f}".format(
-    election_change_and_covid_death_df["deaths_avg_per_100k"].mean()
-)
-st.write(f"All counties Average Deaths = {formatted_string}")
-
-for segmentname in [
-    "Stayed Democrat",
-    "Stayed Republican",
-]:
-    num = len(
-        df[
-            (df["deaths_avg_per_100k"] >= 1.25)
-            & (df["pct_increase"] >= 0)
-            & (df["segmentname"] == segmentname)
-        ]
+    election_change_and_covid_death_df = load_percentile_point_deaths()
+    showChart(
+        createPercentPointChangeAvgDeathsChart(
+            election_change_and_covid_death_df
+        ).configure_title(align="left", anchor="start")
     )
-    denom = len(
-        df[
-            (df["segmentname"].str.contains(segmentname.replace("To ", "")))
-            | (df["segmentname"].str.contains(segmentname.replace("Stayed ", "")))
-        ]
+
+    df = election_change_and_covid_death_df.copy()
+    df["deaths_avg_per_100k"] = df["deaths_avg_per_100k"].astype("float")
+    df["pct_increase"] = df["pct_increase"].astype("float")
+    col1, col2, col3, col4 = st.beta_columns(4)
+    formatted_string = "{:.2f}".format(
+        election_change_and_covid_death_df["deaths_avg_per_100k"].mean()
     )
-    formatted_string = "{:.4f}".format(num / denom)
+    st.write(f"All counties Average Deaths = {formatted_string}")
+
+    for segmentname in [
+        "Stayed Democrat",
+        "Stayed Republican",
+    ]:
+        num = len(
+            df[
+                (df["deaths_avg_per_100k"] >= 1.25)
+                & (df["pct_increase"] >= 0)
+                & (df["segmentname"] == segmentname)
+            ]
+        )
+        denom = len(
+            df[
+                (df["segmentname"].str.contains(segmentname.replace("To ", "")))
+                | (df["segmentname"].str.contains(segmentname.replace("Stayed ", "")))
+            ]
+        )
+        formatted_string = "{:.4f}".format(num / denom)
 
-    if segmentname == "Stayed Democrat":
-        col1.write(f"Fraction of counties in fourth quadrant(per party): ")
-        col2.write(f"{segmentname} = {formatted_string}")
-    else:
-        col3.write(f"{segmentname} = {formatted_string}")
+        if segmentname == "Stayed Democrat":
+            col1.write(f"Fraction of counties in fourth quadrant(per party): ")
+            col2.write(f"{segmentname} = {formatted_string}")
+        else:
+            col3.write(f"{segmentname} = {formatted_string}")
+
+show_section(show_deaths_by_affiliation, key="deaths_by_affiliation")
 
 
 st.markdown("""---""")
@@ -220,8 +236,10 @@ st.markdown("""---""")
 # Affiliation and Vaccine Adoption Rates By State
 ###########################################
 st.subheader("Affiliation and Vaccine Adoption Rates By State")
-st.markdown(
-    """To allow the user to wield the power to pause and view the rate at which states in the U.S. adopted the COVID 
+
+def show_vaccine_adoption():
+    st.markdown(
+        """To allow the user to wield the power to pause and view the rate at which states in the U.S. adopted the COVID 
 vaccines after it became available, the below visual offers a slider bar with a duration from first shot as range. 
 As Cassie Kozyrkov writes [here](https://towardsdatascience.com/analytics-is-not-storytelling-a1fe61b1ab6c), 
 "As an analyst, I’m not here to funnel you towards my opinion. I’m here to help you form your own."
@@ -233,24 +251,30 @@ The size of the bubbles in the chart below is scaled by population of each state
 The X-axis positions each state by the percent of its population with at least one shot (since some vaccines require 
 only one shot).
 """
-)
+    )
 
-st.markdown("""---""")
+    st.markdown("""---""")
+
+    def load_daily_vaccination_percent_df():
+        df = loadCachedData("daily_vaccination_percent_df",
+                            dtype={"Total population": int, "day_num": int, "Percent with one dose": float})
+        return df
 
-daily_vaccination_percent_df = pd.read_csv("./data/daily_vaccination_percent_df.csv")
-daily_vaccination_percent_df["Total population"] = daily_vaccination_percent_df["Total population"].astype("int")
-daily_vaccination_percent_df["day_num"] = daily_vaccination_percent_df["day_num"].astype("int")
-daily_vaccination_percent_df["Percent with one dose"] = daily_vaccination_percent_df["Percent with one dose"].astype("float")
+    daily_vaccination_percent_df = load_daily_vaccination_percent_df()
 
-st.altair_chart(createDailyInteractiveVaccinationChart(daily_vaccination_percent_df))
+    showChart(createDailyInteractiveVaccinationChart(daily_vaccination_percent_df))
+
+show_section(show_vaccine_adoption, key="vaccine_adoption")
 
 st.markdown("""---""")
 
 # Vaccinations and the Delta Variant Case Resurgence
 ###########################################
 st.subheader("Vaccinations and the Delta Variant Case Resurgence")
-st.markdown(
-    """The chart below allows for selection of a state in the map to learn about case trend
+
+def show_delta_variant():
+    st.markdown(
+        """The chart below allows for selection of a state in the map to learn about case trend
 for the period after the first Delta variant was detected in the US. The US average and per political affiliation 
 averages are also plotted for baseline comparison.
 
@@ -263,97 +287,87 @@ states such as Louisiana, Missouri, and Florida where the numbers rose well abov
 Vermont has a high vaccination adoption and a notably lower trend. Most of the states that voted Democrat also have 
 trends that initially spiked and later settled closer to their mean.
 """
-)
+    )
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
-def load_state_vaccine_df():
-    df = pd.read_csv("./data/state_vaccine_df.csv")
-    df["STATEFP"] = df["STATEFP"].astype("int")
-    return df
+    def load_state_vaccine_df():
+        df = loadCachedData("state_vaccine_df", dtype={"STATEFP": int})
+        return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
-def load_us_case_rolling_df():
-    df = pd.read_csv("./data/us_case_rolling_df.csv")
-    return df
+    def load_us_case_rolling_df():
+        df = loadCachedData("us_case_rolling_df")
+        return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
-def load_state_case_rolling_df():
-    df = pd.read_csv("./data/state_case_rolling_df.csv")
-    df["cases_avg_per_100k"] = df["cases_avg_per_100k"].astype("float")
-    df["STATEFP"] = df["STATEFP"].astype("int")
-    return df
+    def load_state_case_rolling_df():
+        df = loadCachedData("state_case_rolling_df", dtype={"cases_avg_per_100k": float, "STATEFP": int})
+        return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
-def load_state_election_df():
-    df = pd.read_csv("./data/state_election_df.csv")
-    df["state_fips"] = df["state_fips"].astype("int")
-    df["candidatevotes"] = df["candidatevotes"].astype("int")
-    df["totalvotes"] = df["totalvotes"].astype("int")
-    df["fractionalvotes"] = df["fractionalvotes"].astype("float")
-    return df
+    def load_state_election_df():
+        df = loadCachedData("state_election_df",
+                               dtype={"state_fips": int, "candidatevotes": int, "totalvotes": int, "fractionalvotes": float})
+        return df
 
-state_vaccine_df = load_state_vaccine_df()
-us_case_rolling_df = load_us_case_rolling_df()
-state_case_rolling_df = load_state_case_rolling_df()
-state_election_df = load_state_election_df()
-
-(
-    vaccine_chart,
-    us_timeseries,
-    stayed_democrat_timeseries,
-    stayed_republican_timeseries,
-    state_cases_delta_chart,
-    state_selectors,
-    rules,
-    tooltip_text2,
-    tooltip_text3,
-    tooltip_text4,
-    tooltip_text5,
-    points,
-    rect_area,
-    delta_rect_area,
-    just_line_state_cases_delta,
-) = createCombinedVaccinationAndDeltaVariantTrend(
-    state_vaccine_df, us_case_rolling_df, state_case_rolling_df, state_election_df
-)
+    state_vaccine_df = load_state_vaccine_df()
+    us_case_rolling_df = load_us_case_rolling_df()
+    state_case_rolling_df = load_state_case_rolling_df()
+    state_election_df = load_state_election_df()
 
+    (
+        vaccine_chart,
+        us_timeseries,
+        stayed_democrat_timeseries,
+        stayed_republican_timeseries,
+        state_cases_delta_chart,
+        state_selectors,
+        rules,
+        tooltip_text2,
+        tooltip_text3,
+        tooltip_text4,
+        tooltip_text5,
+        points,
+        rect_area,
+        delta_rect_area,
+        just_line_state_cases_delta,
+    ) = createCombinedVaccinationAndDeltaVariantTrend(
+        state_vaccine_df, us_case_rolling_df, state_case_rolling_df, state_election_df
+    )
 
-st.markdown("""---""")
 
-st.altair_chart(
-    (
-        vaccine_chart
-        & alt.layer(
-            (
-                state_cases_delta_chart
-                + us_timeseries
-                + stayed_democrat_timeseries
-                + stayed_republican_timeseries
-                + rect_area
-                + delta_rect_area
-            ),
-            state_selectors,
-            rules,
-            tooltip_text2,
-            tooltip_text3,
-            tooltip_text4,
-            tooltip_text5,
-            points,
-        )
-    ).configure_title()
-    # .properties(width=200, height=100)
-)
+    st.markdown("""---""")
+
+    showChart(
+        (
+            vaccine_chart
+            & alt.layer(
+                (
+                    state_cases_delta_chart
+                    + us_timeseries
+                    + stayed_democrat_timeseries
+                    + stayed_republican_timeseries
+                    + rect_area
+                    + delta_rect_area
+                ),
+                state_selectors,
+                rules,
+                tooltip_text2,
+                tooltip_text3,
+                tooltip_text4,
+                tooltip_text5,
+                points,
+            )
+        ).configure_title()
+        # .properties(width=200, height=100)
+    )
+
+show_section(show_delta_variant, key="delta_variant")
 
 st.markdown("""---""")
 
 # Mask Usage by political affiliation
 ###########################################
 st.subheader("Frequent and Infrequent Mask Usage by Political affiliation")
-st.markdown("""
+
+def show_mask_usage():
+    st.markdown("""
 Mask usage data was collected in a survey by New York Times (through a professional survey firm). The data was 
 gathered from 250,000 people surveyed in a two week period in July 2020 (please see details in Appendix). 
 The five choices offered: Never, Rarely, Sometimes, Frequently Always. The estimations of all five for every county, 
@@ -375,89 +389,83 @@ mask usage chart. In the heartland, a lukewarm acceptance to the guidelines is o
 Low mask usage in Infrequent mask usage chart. 
 """)
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
-def load_mask_distribution_df():
-    df = pd.read_csv("./data/mask_distribution_df.csv")
-    return df
+    def load_mask_distribution_df():
+        df = loadCachedData("mask_distribution_df")
+        return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
-def load_county_pop_mask_df():
-    df = pd.read_csv("./data/county_pop_mask_df.csv")
-    return df
+    def load_county_pop_mask_df():
+        df = loadCachedData("county_pop_mask_df")
+        return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
-def load_county_pop_mask_freq_df():
-    df = pd.read_csv("./data/county_pop_mask_freq_df.csv")
-    return df
+    def load_county_pop_mask_freq_df():
+        df = loadCachedData("county_pop_mask_freq_df")
+        return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
-def load_county_pop_mask_infreq_df():
-    df = pd.read_csv("./data/county_pop_mask_infreq_df.csv")
-    return df
+    def load_county_pop_mask_infreq_df():
+        df = loadCachedData("county_pop_mask_infreq_df")
+        return df
 
-mask_distribution_df = load_mask_distribution_df()
-st.altair_chart(createMaskUsageDistributionChart(mask_distribution_df))
-
-county_pop_mask_df = load_county_pop_mask_df()
-county_pop_mask_freq_df = load_county_pop_mask_freq_df()
-county_pop_mask_infreq_df = load_county_pop_mask_infreq_df()
-
-freq, infreq = st.beta_columns(2)
-(
-    county_mask_chart,
-    legend_republican,
-    legend_democrat,
-    average_mask_chart,
-) = createFreqCountyMaskUsageWithRanges(
-    "FREQUENT",
-    county_pop_mask_df,
-    county_pop_mask_freq_df,
-    county_pop_mask_infreq_df,
-    mask_distribution_df,
-)
-freq.altair_chart(
-    (
-        (county_mask_chart)
-        & (average_mask_chart | legend_republican | legend_democrat).resolve_scale(
-            color="independent"
-        )
-    ).configure_title(align="left", anchor="start")
-)
+    mask_distribution_df = load_mask_distribution_df()
+    showChart(createMaskUsageDistributionChart(mask_distribution_df))
 
-(
-    county_mask_chart,
-    legend_republican,
-    legend_democrat,
-    average_mask_chart,
-) = createFreqCountyMaskUsageWithRanges(
-    "INFREQUENT",
-    county_pop_mask_df,
-    county_pop_mask_freq_df,
-    county_pop_mask_infreq_df,
-    mask_distribution_df,
-)
+    county_pop_mask_df = load_county_pop_mask_df()
+    county_pop_mask_freq_df = load_county_pop_mask_freq_df()
+    county_pop_mask_infreq_df = load_county_pop_mask_infreq_df()
 
-infreq.altair_chart(
+    freq, infreq = st.beta_columns(2)
     (
-        (county_mask_chart)
-        & (average_mask_chart | legend_republican | legend_democrat).resolve_scale(
-            color="independent"
-        )
-    ).configure_title(align="left", anchor="start")
-)
+        county_mask_chart,
+        legend_republican,
+        legend_democrat,
+        average_mask_chart,
+    ) = createFreqCountyMaskUsageWithRanges(
+        "FREQUENT",
+        county_pop_mask_df,
+        county_pop_mask_freq_df,
+        county_pop_mask_infreq_df,
+        mask_distribution_df,
+    )
+    showChart(
+        (
+            (county_mask_chart)
+            & (average_mask_chart | legend_republican | legend_democrat).resolve_scale(
+                color="independent"
+            )
+        ).configure_title(align="left", anchor="start"),
+        container=freq,
+    )
+
+    (
+        county_mask_chart,
+        legend_republican,
+        legend_democrat,
+        average_mask_chart,
+    ) = createFreqCountyMaskUsageWithRanges(
+        "INFREQUENT",
+        county_pop_mask_df,
+        county_pop_mask_freq_df,
+        county_pop_mask_infreq_df,
+        mask_distribution_df,
+    )
+
+    showChart(
+        (
+            (county_mask_chart)
+            & (average_mask_chart | legend_republican | legend_democrat).resolve_scale(
+                color="independent"
+            )
+        ).configure_title(align="left", anchor="start"),
+        container=infreq,
+    )
+
+show_section(show_mask_usage, key="mask_usage")
 st.markdown("""---""")
 
 # Unemployment rate and COVID
 ###########################################
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_urban_rural_election_df():
-    df = pd.read_csv(
-        "./data/urban_rural_election_df.csv",
+    df = loadCachedData(
+        "urban_rural_election_df",
         dtype={
             "state_po": str,
             "county_name": str,
@@ -472,11 +480,9 @@ def load_urban_rural_election_df():
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_urban_rural_rolling_avg_full_df():
-    df = pd.read_csv(
-        "./data/urban_rural_rolling_avg_full_df.csv",
+    df = loadCachedData(
+        "urban_rural_rolling_avg_full_df",
         dtype={
             "year": int,
             "state": str,
@@ -494,11 +500,9 @@ def load_urban_rural_rolling_avg_full_df():
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_urban_rolling_avg_full_df():
-    df = pd.read_csv(
-        "./data/urban_rolling_avg_full_df.csv",
+    df = loadCachedData(
+        "urban_rolling_avg_full_df",
         dtype={
             "year": int,
             "state": str,
@@ -518,11 +522,9 @@ def load_urban_rolling_avg_full_df():
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_rural_rolling_avg_full_df():
-    df = pd.read_csv(
-        "./data/rural_rolling_avg_full_df.csv",
+    df = loadCachedData(
+        "rural_rolling_avg_full_df",
         dtype={
             "year": int,
             "state": str,
@@ -542,11 +544,9 @@ def load_rural_rolling_avg_full_df():
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_urban_rural_avgdeaths_full_df():
-    df = pd.read_csv(
-        "./data/urban_rural_avgdeaths_full_df.csv",
+    df = loadCachedData(
+        "urban_rural_avgdeaths_full_df",
         dtype={
             "COUNTYFP": int,
             "deaths_avg_per_100k": float,
@@ -568,11 +568,9 @@ def load_urban_rural_avgdeaths_full_df():
     return df
 
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_urban_avgdeaths_full_df():
-    df = pd.read_csv(
-        "./data/urban_avgdeaths_full_df.csv",
+    df = loadCachedData(
+        "urban_avgdeaths_full_df",
         dtype={
             "COUNTYFP": int,
             "deaths_avg_per_100k": float,
@@ -593,11 +591,9 @@ def load_urban_avgdeaths_full_df():
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_rural_avgdeaths_full_df():
-    df = pd.read_csv(
-        "./data/rural_avgdeaths_full_df.csv",
+    df = loadCachedData(
+        "rural_avgdeaths_full_df",
         dtype={
             "COUNTYFP": int,
             "deaths_avg_per_100k": float,
@@ -618,11 +614,9 @@ def load_rural_avgdeaths_full_df():
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_urban_mask_df():
-    df = pd.read_csv(
-        "./data/urban_mask_df.csv",
+    df = loadCachedData(
+        "urban_mask_df",
         dtype={
             "state_po": str,
             "county_name": str,
@@ -639,11 +633,9 @@ def load_urban_mask_df():
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_rural_mask_df():
-    df = pd.read_csv(
-        "./data/rural_mask_df.csv",
+    df = loadCachedData(
+        "rural_mask_df",
         dtype={
             "state_po": str,
             "county_name": str,
@@ -661,19 +653,6 @@ def load_rural_mask_df():
     return df
 
 
-urban_rural_election_df = load_urban_rural_election_df()
-
-urban_rural_rolling_avg_full_df = load_urban_rural_rolling_avg_full_df()
-urban_rolling_avg_full_df = load_urban_rolling_avg_full_df()
-rural_rolling_avg_full_df = load_rural_rolling_avg_full_df()
-
-urban_rural_avgdeaths_full_df = load_urban_rural_avgdeaths_full_df()
-urban_avgdeaths_full_df = load_urban_avgdeaths_full_df()
-rural_avgdeaths_full_df = load_rural_avgdeaths_full_df()
-
-urban_mask_df = load_urban_mask_df()
-rural_mask_df = load_rural_mask_df()
-
 st.header(
     "Does the Urban/Rural Demographic Influence the COVID Response?",
     anchor="urbanruralandcovid",
@@ -691,7 +670,10 @@ living in rural areas.
 
 st.subheader("Political affiliation")
 
-st.markdown("""
+def show_urban_rural_affiliation():
+    urban_rural_election_df = load_urban_rural_election_df()
+
+    st.markdown("""
 Since we want to see the effect of political affiliation on the COVID response, the next question is: How strongly 
 democrat or republican were those counties? For that, we used the ratio of winning party votes to total votes, which 
 we call the ‘vote fraction’. Plotting against the Percent Rural designation of each county, we find no correlation 
@@ -699,9 +681,9 @@ we call the ‘vote fraction’. Plotting against the Percent Rural designation
 republican candidate.
 """)
 
-st.altair_chart(ElectionUrbanRuralDensityPlot(urban_rural_election_df))
+    showChart(ElectionUrbanRuralDensityPlot(urban_rural_election_df))
 
-st.markdown("""
+    st.markdown("""
 Merging that with the presidential election county results, we see there seems to be a clear divide in political 
 affiliation between rural areas and urban centers. Counties less than about 32% rural were more likely to vote democrat,
  while those above were more likely to vote republican.
@@ -710,7 +692,9 @@ The merge was done on the county FIPS code, and about 40 counties were lost in t
 more than 3000 counties, this was considered an acceptable loss.
 """)
 
-st.altair_chart(UrbanRuralCorrelation(urban_rural_election_df))
+    showChart(UrbanRuralCorrelation(urban_rural_election_df))
+
+show_section(show_urban_rural_affiliation, key="urban_rural_affiliation")
 
 st.markdown("""
 This is a positive initial result, since it implies that the urban/rural nature of a county has little to no effect 
@@ -722,28 +706,37 @@ COVID pandemic, indicated by the rolling case average and the deaths.
 
 st.subheader("COVID effects")
 
-st.markdown("""
+def show_urban_rural_effects():
+    urban_rural_rolling_avg_full_df = load_urban_rural_rolling_avg_full_df()
+    urban_rolling_avg_full_df = load_urban_rolling_avg_full_df()
+    rural_rolling_avg_full_df = load_rural_rolling_avg_full_df()
+
+    urban_rural_avgdeaths_full_df = load_urban_rural_avgdeaths_full_df()
+    urban_avgdeaths_full_df = load_urban_avgdeaths_full_df()
+    rural_avgdeaths_full_df = load_rural_avgdeaths_full_df()
+
+    st.markdown("""
 The Census Bureau classifies counties with 50% or more of their population living in rural areas as ‘mostly rural’, 
 while the remainder are classified as ‘mostly urban’. We split the counties by that designation, and for each, we repeat 
 the analyses performed above.
 """)
 
 
-st.altair_chart(
-    UrbanRuralRollingAvgCompChart(
-        urban_rural_rolling_avg_full_df,
-        urban_rolling_avg_full_df,
-        rural_rolling_avg_full_df,
+    showChart(
+        UrbanRuralRollingAvgCompChart(
+            urban_rural_rolling_avg_full_df,
+            urban_rolling_avg_full_df,
+            rural_rolling_avg_full_df,
+        )
     )
-)
 
-st.altair_chart(
-    UrbanRuralAvgDeathsCompChart(
-        urban_rural_avgdeaths_full_df, urban_avgdeaths_full_df, rural_avgdeaths_full_df
+    showChart(
+        UrbanRuralAvgDeathsCompChart(
+            urban_rural_avgdeaths_full_df, urban_avgdeaths_full_df, rural_avgdeaths_full_df
+        )
     )
-)
 
-st.markdown("""
+    st.markdown("""
 For COVID rolling case average, we find that the same trends hold as those found earlier for all counties: Initially, 
 the case numbers are higher for counties that voted Democrat, but in September 2020, the rise in case numbers for 
 counties that voted Republican is steeper.
@@ -753,19 +746,25 @@ the complete set of counties: The number of deaths per 100K population is higher
 republican.
 """)
 
+show_section(show_urban_rural_effects, key="urban_rural_effects")
+
 st.subheader("COVID response")
 
-st.markdown("""
+def show_urban_rural_response():
+    urban_mask_df = load_urban_mask_df()
+    rural_mask_df = load_rural_mask_df()
+
+    st.markdown("""
 For influence of the urban/rural nature of the counties on the COVID response, we look at frequency of mask usage, 
 as defined earlier.
 """)
 
 
-st.altair_chart(
-    UrbanRuralMaskPlots(urban_mask_df, rural_mask_df)
-)
+    showChart(
+        UrbanRuralMaskPlots(urban_mask_df, rural_mask_df)
+    )
 
-st.markdown("""
+    st.markdown("""
 We find the same trends, unchanged, as in the analysis of total counties: Counties won by the Democratic candidate, 
 compared to those won by the Republican candidate, were more likely to use masks frequently, and less likely to use 
 them infrequently. This trend held for both counties classified as urban and those classified as rural.
@@ -776,15 +775,15 @@ So we can conclude that the urban or rural nature of a county does not have an i
 
 """)
 
+show_section(show_urban_rural_response, key="urban_rural_response")
+
 st.markdown("""---""")
 
 # Unemployment rate and COVID
 ###########################################
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_unemployment_rate_since_2019_df():
-    df = pd.read_csv(
-        "./data/unemployment_rate_since_2019_df.csv",
+    df = loadCachedData(
+        "unemployment_rate_since_2019_df",
         dtype={
             "month": str,
             "unemployment_rate": float,
@@ -795,17 +794,13 @@ def load_unemployment_rate_since_2019_df():
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_unemployment_covid_correlation_df():
-    df = pd.read_csv(
-        "./data/unemployment_covid_correlation_df.csv",
+    df = loadCachedData(
+        "unemployment_covid_correlation_df",
         dtype={"month": str, "party": str, "variable": str, "value": float},
     )
     return df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_unemployment_and_mask_df():
     dtypes = {
         "COUNTYFP": int,
@@ -819,31 +814,20 @@ def load_unemployment_and_mask_df():
         "FREQUENTLY": float,
         "ALWAYS": float,
     }
-    freq_df = pd.read_csv("./data/unemployment_freq_mask_july_df.csv", dtype=dtypes,)
-    infreq_df = pd.read_csv(
-        "./data/unemployment_infreq_mask_july_df.csv", dtype=dtypes,
+    freq_df = loadCachedData("unemployment_freq_mask_july_df", dtype=dtypes,)
+    infreq_df = loadCachedData(
+        "unemployment_infreq_mask_july_df", dtype=dtypes,
     )
     return freq_df, infreq_df
 
-#Remove some caching to reduce memory usage due to Streamlit limitations
-#@st.cache
 def load_unemployment_vaccine_correlation_df():
-    df = pd.read_csv(
-        "./data/unemployment_vaccine_correlation_df.csv",
+    df = loadCachedData(
+        "unemployment_vaccine_correlation_df",
         dtype={"month": str, "party": str, "variable": str, "value": float},
     )
     return df
 
 
-unemployment_rate_since_2019_df = load_unemployment_rate_since_2019_df()
-unemployment_covid_correlation_df = load_unemployment_covid_correlation_df()
-(
-    unemployment_freq_mask_july_df,
-    unemployment_infreq_mask_july_df,
-) = load_unemployment_and_mask_df()
-unemployment_vaccine_correlation_df = load_unemployment_vaccine_correlation_df()
-
-
 st.header(
     "Does Unemployment Influence the COVID Response?",
     anchor="unemploymentandcovid",
@@ -851,8 +835,11 @@ st.header(
 
 st.subheader("COVID effects")
 
-st.markdown(
-    """
+def show_unemployment_effects():
+    unemployment_rate_since_2019_df = load_unemployment_rate_since_2019_df()
+
+    st.markdown(
+        """
 Stark unemployment increase was a major side effect of the COVID pandemic. In December 2019 (Elapsed month = 1 in the 
 visualization below) the mean of the unemployment rate was 3.79% with an inter-quartile range (the range between 
 the 25th and 75th percentile of 2.7% to 4.4%. By April 2020 (Elapsed month = 4), 
@@ -862,21 +849,31 @@ Both the numbers and the visualization clearly show an increase in unemployment
 between counties as the inter-quartile distance (visualized as the width of the distribution) increased from a 
 narrow 1.7 points to 6.8 points.
 """
-)
+    )
 
-st.altair_chart(createUnemploymentChart(unemployment_rate_since_2019_df))
+    showChart(createUnemploymentChart(unemployment_rate_since_2019_df))
 
-st.markdown(
-    """
+    st.markdown(
+        """
 Could unemployment rate have a bigger impact than political affiliation on the response to the COVID, by 
 pushing more people to wear masks or get vaccinated?
 """
-)
+    )
+
+show_section(show_unemployment_effects, key="unemployment_effects")
 
 st.subheader("COVID response")
 
-st.markdown(
-    """
+def show_unemployment_response():
+    unemployment_covid_correlation_df = load_unemployment_covid_correlation_df()
+    (
+        unemployment_freq_mask_july_df,
+        unemployment_infreq_mask_july_df,
+    ) = load_unemployment_and_mask_df()
+    unemployment_vaccine_correlation_df = load_unemployment_vaccine_correlation_df()
+
+    st.markdown(
+        """
 When we look at the Republican and Democrat counties' monthly average unemployment rate and COVID cases 
 (per 100k people)  since the beginning of the pandemic, we see clearly that they both follow very 
 different trends. The correlation between unemployment rate and COVID cases also oscillates erratically between 
@@ -886,22 +883,22 @@ What we see however is that the average unemployment rate is constantly higher i
 *Republican* counties, while at the peak of the pandemic the average COVID cases number was higher in 
 *Republican* counties.
 """
-)
+    )
 
-st.altair_chart(
-    createUnemploymentCorrelationLineChart(
-        unemployment_covid_correlation_df,
-        title="Counties Average Unemployment Rate and COVID Cases Since January 2020",
-        sort=[
-            "Average COVID Cases per 100k",
-            "Average Unemployment Rate",
-            "Correlation",
-        ],
+    showChart(
+        createUnemploymentCorrelationLineChart(
+            unemployment_covid_correlation_df,
+            title="Counties Average Unemployment Rate and COVID Cases Since January 2020",
+            sort=[
+                "Average COVID Cases per 100k",
+                "Average Unemployment Rate",
+                "Correlation",
+            ],
+        )
     )
-)
 
-st.markdown(
-    """
+    st.markdown(
+        """
 If there is no correlation between unemployment rate and COVID cases, could there still be one with the COVID 
 response like mask usage and vaccination?
 
@@ -916,16 +913,16 @@ However, more than a clear correlation, there appears to be a more clear divide
 It seems that political affiliation is a stronger differentiator in following CDC mask-wearing guidelines than 
 unemployment rate.
 """
-)
+    )
 
-st.altair_chart(
-    createUnemploymentMaskChart(
-        unemployment_freq_mask_july_df, unemployment_infreq_mask_july_df
+    showChart(
+        createUnemploymentMaskChart(
+            unemployment_freq_mask_july_df, unemployment_infreq_mask_july_df
+        )
     )
-)
 
-st.markdown(
-    """
+    st.markdown(
+        """
 When we look at vaccination, the above pattern seems even more clear. The correlation between the percentage of the 
 population with at least 1 dose of vaccination and the unemployment rate is even less clear. However, as for 
 mask-wearing behaviors, we also see that 
@@ -935,22 +932,22 @@ mask-wearing behaviors, we also see that
 As for mask-wearing, the political affiliation seems to be a stronger differentiator in following CDC vaccination 
 guidelines than unemployment rate.
 """
-)
+    )
 
-st.altair_chart(
-    createUnemploymentCorrelationLineChart(
-        unemployment_vaccine_correlation_df,
-        title="Counties Average Unemployment Rate and Vaccination Rate Since December 2020",
-        sort=[
-            "Average Unemployment Rate",
-            "Average % of People with 1 Dose of Vaccine",
-            "Correlation",
-        ],
+    showChart(
+        createUnemploymentCorrelationLineChart(
+            unemployment_vaccine_correlation_df,
+            title="Counties Average Unemployment Rate and Vaccination Rate Since December 2020",
+            sort=[
+                "Average Unemployment Rate",
+                "Average % of People with 1 Dose of Vaccine",
+                "Correlation",
+            ],
+        )
     )
-)
 
 
-st.markdown("""
+    st.markdown("""
 As we wanted to verify if unemployment rate could have a stronger impact on the COVID response than political 
 affiliation, we see that 
 * there is no correlation between COVID case and unemployment rate, and between unemployment rate and COVID 
@@ -959,6 +956,8 @@ response behaviors like wearing a mask or getting vaccinated
 CDC guidelines while Republican counties show opposite trends and behaviors
 """)
 
+show_section(show_unemployment_response, key="unemployment_response")
+
 st.markdown("""---""")
 
 # Conclusion
@@ -1208,7 +1207,7 @@ widespread shortage of testing, however, the data is necessarily limited in the
 of the outbreak.
   
 This data is for cumulative cases
-    
+
 We can join the NYTime latest data with population data from census for 2020
 df = pd.read_csv('https://raw.githubusercontent.com/nytimes/covid-19-data/master/us-counties.csv')
 """
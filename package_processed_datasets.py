@@ -1,6 +1,9 @@
-import pandas as pd
+import argparse
+from functools import partial
 from pathlib import Path
 
+from ETL.EtlBase import (DataFolder, ProcessedDataFolder, getSourceCacheStats, setProfiling, getProfileRecords,
+                         summarizeProfile, writeProfileReport, writeProfileTrace)
 from ETL.EtlElection import getStateLevelElectionData2020
 from ETL.EtlCovid import (getRollingCaseAverageSegmentLevel,
                           getPercentilePointChageDeathsData)
@@ -17,90 +20,173 @@ from ETL.EtlUrbanRural import (MergeElectionUrbanRural,
                                CountyElecUrbanRuralSplit,
                                getUrbanRuralElectionRollingData,
                                getUrbanRuralAvgDeathsData)
+from ETL.EtlPipeline import Stage, runPipeline, selectStages
+from ETL.EtlFetch import setOfflineMode, isCached
+from ETL.EtlGeometry import US_10M_URL, ZOOM_LEVELS, GeometryFolder, packageGeometryBundle, getGeometryPath
 #
 # This script runs all the functions used to processed all the datasets used in the different visualizaionts
 # It then saves all those processed datasets in files to be used in Streamlit. This is done to speed-up the loading time
 # of the streamlit page by avoiding processing the data
+# The datasets are saved as typed Parquet files (see ETL/EtlStore.py) together with a CSV copy
+#
+# Each ETL function call is declared below as a stage of a dependency graph (see ETL/EtlPipeline.py) listing the raw
+# inputs it reads, so that only the datasets depending on a changed input are processed again
 #
 
-if __name__ == '__main__':
-
-    Path("../data").mkdir(exist_ok=True)
-
-    case_rolling_df = getRollingCaseAverageSegmentLevel()
-    case_rolling_df.to_csv(path_or_buf ="../data/case_rolling_df.csv", index=False)
-
-    election_change_and_covid_death_df = getPercentilePointChageDeathsData()
-    election_change_and_covid_death_df.to_csv(path_or_buf ="../data/election_change_and_covid_death_df.csv",
-                                              index=False)
-
-    daily_vaccination_percent_df = getDailyVaccinationPercentData()
-    daily_vaccination_percent_df.to_csv(path_or_buf ="../data/daily_vaccination_percent_df.csv",
-                                        index=False)
-
-    state_vaccine_df, us_case_rolling_df, state_case_rolling_df = getStateVaccinationDataWithAPI()
-    state_vaccine_df.to_csv(path_or_buf ="../data/state_vaccine_df.csv", index=False)
-    us_case_rolling_df.to_csv(path_or_buf ="../data/us_case_rolling_df.csv", index=False)
-    state_case_rolling_df.to_csv(path_or_buf ="../data/state_case_rolling_df.csv", index=False)
-
-    state_election_df = getStateLevelElectionData2020()
-    state_election_df.to_csv(path_or_buf ="../data/state_election_df.csv", index=False)
-
-    mask_distribution_df = createDataForMaskUsageDistribution()
-    mask_distribution_df.to_csv(path_or_buf ="../data/mask_distribution_df.csv", index=False)
-
-    county_pop_mask_df, county_pop_mask_freq_df, county_pop_mask_infreq_df = createDataForFreqAndInFreqMaskUse()
-    county_pop_mask_df.to_csv(path_or_buf ="../data/county_pop_mask_df.csv", index=False)
-    county_pop_mask_freq_df.to_csv(path_or_buf ="../data/county_pop_mask_freq_df.csv", index=False)
-    county_pop_mask_infreq_df.to_csv(path_or_buf ="../data/county_pop_mask_infreq_df.csv", index=False)
+# The folder read by the Streamlit app (run from the root folder of the repository like this script)
+OutputFolder = ProcessedDataFolder
 
+#
+# Raw inputs
+#
+ELECTION_FILE = DataFolder / "countypres_2000-2020.csv"
+STATE_ELECTION_FILE = DataFolder / "1976-2020-president.csv"
+POPULATION_FILE = DataFolder / "County Data Till 2020 co-est2020-alldata.csv"
+COUNTY_ROLLING_AVERAGE_FILE = DataFolder / "sept_4_rolling_average_us-counties.zip"
+URBAN_RURAL_FILE = DataFolder / "County_Rural_Lookup.xlsx"
+UNEMPLOYMENT_FILE = DataFolder / "bls_unemployment_rates.csv"
+MASK_FILE = DataFolder / "mask-use-by-county.csv"
+COUNTY_VACCINE_FILE = DataFolder / "COVID-19_Vaccinations_in_the_United_States_County.zip"
+STATE_VACCINE_FILES = DataFolder / "StateVaccineDataFile*"
+JURISDICTION_VACCINE_FILE = Path("./data/COVID-19_Vaccinations_in_the_United_States_Jurisdiction.csv")
+JURISDICTION_POPULATION_FILE = Path("./data/County Data Till 2020 co-est2020-alldata.csv")
+MASK_URL = "https://raw.githubusercontent.com/nytimes/covid-19-data/master/mask-use/mask-use-by-county.csv"
+US_ROLLING_AVERAGE_URL = "https://raw.githubusercontent.com/nytimes/covid-19-data/master/rolling-averages/us.csv"
+STATES_ROLLING_AVERAGE_URL = \
+    "https://raw.githubusercontent.com/nytimes/covid-19-data/master/rolling-averages/us-states.csv"
+
+STAGES = [
+    Stage("case_rolling", getRollingCaseAverageSegmentLevel,
+          outputs=["case_rolling_df"],
+          sources=[COUNTY_ROLLING_AVERAGE_FILE, ELECTION_FILE],
+          modules=["EtlBase", "EtlElection", "EtlCovid"]),
+    Stage("election_change_and_covid_death", getPercentilePointChageDeathsData,
+          outputs=["election_change_and_covid_death_df"],
+          sources=[COUNTY_ROLLING_AVERAGE_FILE, ELECTION_FILE],
+          modules=["EtlBase", "EtlElection", "EtlCovid"]),
+    Stage("daily_vaccination_percent", getDailyVaccinationPercentData,
+          outputs=["daily_vaccination_percent_df"],
+          sources=[JURISDICTION_VACCINE_FILE, JURISDICTION_POPULATION_FILE, STATE_ELECTION_FILE],
+          modules=["EtlBase", "EtlElection", "EtlVaccine"]),
+    Stage("state_vaccine", getStateVaccinationDataWithAPI,
+          outputs=["state_vaccine_df", "us_case_rolling_df", "state_case_rolling_df"],
+          sources=[STATE_VACCINE_FILES, POPULATION_FILE, US_ROLLING_AVERAGE_URL, STATES_ROLLING_AVERAGE_URL],
+          modules=["EtlBase", "EtlVaccine"]),
+    Stage("state_election", getStateLevelElectionData2020,
+          outputs=["state_election_df"],
+          sources=[STATE_ELECTION_FILE],
+          modules=["EtlBase", "EtlElection"]),
+    Stage("mask_distribution", createDataForMaskUsageDistribution,
+          outputs=["mask_distribution_df"],
+          sources=[POPULATION_FILE, MASK_URL, ELECTION_FILE],
+          modules=["EtlBase", "EtlElection", "EtlMask"]),
+    Stage("county_pop_mask", createDataForFreqAndInFreqMaskUse,
+          outputs=["county_pop_mask_df", "county_pop_mask_freq_df", "county_pop_mask_infreq_df"],
+          sources=[POPULATION_FILE, MASK_URL, ELECTION_FILE],
+          modules=["EtlBase", "EtlElection", "EtlMask"]),
     #
     # Package unemployments dataframse
     #
-
-    unemployment_rate_since_2019_df = getUnemploymentRateSince122019()
-    unemployment_rate_since_2019_df.to_csv(path_or_buf="../data/unemployment_rate_since_2019_df.csv",
-                                           index=False)
-
-    unemployment_covid_df = getUnemploymentCovidBase()
-    unemployment_covid_df.to_csv(path_or_buf="../data/unemployment_covid_df.csv", index=False)
-
-    unemployment_covid_correlation_df = getUnemploymentCovidCorrelationPerMonth(unemployment_covid_df)
-    unemployment_covid_correlation_df.to_csv(path_or_buf="../data/unemployment_covid_correlation_df.csv",
-                                             index=False)
-
-    unemployment_freq_mask_july_df, unemployment_infreq_mask_july_df = getJuly2020UnemploymentAndMask(
-        unemployment_covid_df)
-    unemployment_freq_mask_july_df.to_csv(path_or_buf="../data/unemployment_freq_mask_july_df.csv",
-                                          index=False)
-    unemployment_infreq_mask_july_df.to_csv(path_or_buf="../data/unemployment_infreq_mask_july_df.csv",
-                                          index=False)
-
-    unemployment_vaccine_correlation_df = getUnemploymentVaccineCorrelationPerMonth(df=unemployment_rate_since_2019_df)
-    unemployment_vaccine_correlation_df.to_csv(path_or_buf="../data/unemployment_vaccine_correlation_df.csv",
-                                               index=False)
-
+    Stage("unemployment_rate_since_2019", getUnemploymentRateSince122019,
+          outputs=["unemployment_rate_since_2019_df"],
+          sources=[UNEMPLOYMENT_FILE, ELECTION_FILE],
+          modules=["EtlBase", "EtlElection", "EtlUnemployment"]),
+    Stage("unemployment_covid", getUnemploymentCovidBase,
+          outputs=["unemployment_covid_df"],
+          sources=[UNEMPLOYMENT_FILE, COUNTY_ROLLING_AVERAGE_FILE, ELECTION_FILE],
+          modules=["EtlBase", "EtlElection", "EtlCovid", "EtlUnemployment"]),
+    Stage("unemployment_covid_correlation", getUnemploymentCovidCorrelationPerMonth,
+          outputs=["unemployment_covid_correlation_df"],
+          modules=["EtlUnemployment"],
+          upstream={"df": "unemployment_covid_df"}),
+    Stage("unemployment_mask_july", getJuly2020UnemploymentAndMask,
+          outputs=["unemployment_freq_mask_july_df", "unemployment_infreq_mask_july_df"],
+          sources=[MASK_FILE],
+          modules=["EtlBase", "EtlUnemployment"],
+          upstream={"df": "unemployment_covid_df"}),
+    Stage("unemployment_vaccine_correlation", getUnemploymentVaccineCorrelationPerMonth,
+          outputs=["unemployment_vaccine_correlation_df"],
+          sources=[COUNTY_VACCINE_FILE],
+          modules=["EtlBase", "EtlUnemployment"],
+          upstream={"df": "unemployment_rate_since_2019_df"}),
     #
     # Package urban/rural dataframse
     #
-    urban_rural_election_df = MergeElectionUrbanRural()
-    urban_rural_election_df.to_csv(path_or_buf="../data/urban_rural_election_df.csv",
-                                               index=False)
+    Stage("urban_rural_election", MergeElectionUrbanRural,
+          outputs=["urban_rural_election_df"],
+          sources=[URBAN_RURAL_FILE, ELECTION_FILE],
+          modules=["EtlBase", "EtlUrbanRural"]),
+    Stage("urban_rural_rolling_avg", partial(CountyElecUrbanRuralSplit, getUrbanRuralElectionRollingData),
+          outputs=["urban_rural_rolling_avg_full_df", "urban_rolling_avg_full_df", "rural_rolling_avg_full_df"],
+          sources=[ELECTION_FILE, URBAN_RURAL_FILE, COUNTY_ROLLING_AVERAGE_FILE],
+          modules=["EtlBase", "EtlElection", "EtlCovid", "EtlUrbanRural"]),
+    Stage("urban_rural_avgdeaths", partial(CountyElecUrbanRuralSplit, getUrbanRuralAvgDeathsData),
+          outputs=["urban_rural_avgdeaths_full_df", "urban_avgdeaths_full_df", "rural_avgdeaths_full_df"],
+          sources=[ELECTION_FILE, URBAN_RURAL_FILE, COUNTY_ROLLING_AVERAGE_FILE],
+          modules=["EtlBase", "EtlElection", "EtlCovid", "EtlUrbanRural"]),
+    #
+    # Simplified map geometry served with the processed datasets (see ETL/EtlGeometry.py)
+    #
+    Stage("geometry", packageGeometryBundle,
+          outputs=[],
+          sources=[US_10M_URL],
+          modules=["EtlFetch", "EtlGeometry"],
+          files=[getGeometryPath(level, GeometryFolder.name) for level in ZOOM_LEVELS]),
+]
 
-    urban_rural_rolling_avg_full_df, urban_rolling_avg_full_df, rural_rolling_avg_full_df = CountyElecUrbanRuralSplit(
-        getUrbanRuralElectionRollingData)
-    urban_rural_rolling_avg_full_df.to_csv(path_or_buf="../data/urban_rural_rolling_avg_full_df.csv",
-                                   index=False)
-    urban_rolling_avg_full_df.to_csv(path_or_buf="../data/urban_rolling_avg_full_df.csv",
-                                   index=False)
-    rural_rolling_avg_full_df.to_csv(path_or_buf="../data/rural_rolling_avg_full_df.csv",
-                                   index=False)
+if __name__ == '__main__':
 
-    urban_rural_avgdeaths_full_df, urban_avgdeaths_full_df, rural_avgdeaths_full_df = CountyElecUrbanRuralSplit(
-        getUrbanRuralAvgDeathsData)
-    urban_rural_avgdeaths_full_df.to_csv(path_or_buf="../data/urban_rural_avgdeaths_full_df.csv",
-                                           index=False)
-    urban_avgdeaths_full_df.to_csv(path_or_buf="../data/urban_avgdeaths_full_df.csv",
-                                     index=False)
-    rural_avgdeaths_full_df.to_csv(path_or_buf="../data/rural_avgdeaths_full_df.csv",
-                                     index=False)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Process the raw datasets used by the Streamlit pages")
+    parser.add_argument("--output", type=Path, default=OutputFolder,
+                        help=f"folder of the processed datasets (default {OutputFolder}, the folder read by the app)")
+    parser.add_argument("--force", action="store_true",
+                        help="process all the datasets even if their inputs did not change")
+    parser.add_argument("--stage", action="append", default=None,
+                        help="only process the given stage and the stages it depends on (can be repeated)")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="number of processes running independent stages concurrently")
+    parser.add_argument("--offline", action="store_true",
+                        help="only read the remote inputs from the local HTTP cache (no network access)")
+    parser.add_argument("--specs", action="store_true",
+                        help="also render the charts of the pages into a new version of the Vega-Lite spec bundle")
+    parser.add_argument("--profile", type=Path, default=None, metavar="REPORT",
+                        help="record the duration, rows and memory of each ETL step in the given JSON report")
+    parser.add_argument("--trace", type=Path, default=None, metavar="TRACE",
+                        help="also save the recorded steps as a Chrome trace-event file (flame graph)")
+    args = parser.parse_args()
+
+    if args.offline:
+        setOfflineMode(True)
+    if args.profile or args.trace:
+        setProfiling(True)
+    stages = STAGES if args.stage is None else selectStages(STAGES, args.stage)
+    # Without the us-10m file in the HTTP cache, an offline run keeps the current map geometry, the maps loading
+    # us-10m from the vega-datasets CDN when there is none
+    if args.offline and not isCached(US_10M_URL):
+        print(f"geometry - skipped, {US_10M_URL} is not in the HTTP cache")
+        stages = [stage for stage in stages if stage.name != "geometry"]
+
+    # The cache statistics and the profile are reported even if a stage fails
+    try:
+        runPipeline(stages, args.output, force=args.force, jobs=args.jobs)
+
+        # Finished Vega-Lite specs of the page charts, displayed by the pages without building them (see VizBundle.py)
+        if args.specs:
+            from Visualization.VizBundle import SpecBundleFolder, writeSpecBundle
+            from Visualization.VizPages import PAGE_CHARTS
+
+            writeSpecBundle(PAGE_CHARTS, args.output, args.output / SpecBundleFolder.name)
+    finally:
+        for source, stats in getSourceCacheStats().items():
+            print(f"{source} - read {stats['misses']} time(s), served {stats['hits']} time(s) from memory")
+
+        if args.profile or args.trace:
+            records = getProfileRecords()
+            print("Slowest steps (time spent outside of their nested steps):")
+            for entry in summarizeProfile(records)[:10]:
+                print(f"{entry['name']} ({entry['category']}) - {entry['self_seconds']:.3f}s in {entry['calls']} "
+                      f"call(s), {entry['rss_delta_mb']:+.1f}MB")
+            if args.profile:
+                writeProfileReport(args.profile, records)
+            if args.trace:
+                writeProfileTrace(args.trace, records)
@@ -9,33 +9,6 @@ from pathlib import Path
 import streamlit as st
 from PIL import Image
 
-from Visualization.VizBase import createTooltip, createCovidConfirmedTimeseriesChart
-from Visualization.VizCovid import createPercentPointChangeAvgDeathsChart
-from Visualization.VizVaccine import (
-    createStateVaccinationChart,
-    createDailyInteractiveVaccinationChart,
-    createCombinedVaccinationAndDeltaVariantTrend,
-    altairTestFunction,
-)
-from Visualization.VizMask import (
-    createMaskUsageDistributionChart,
-    createFreqCountyMaskUsageWithRanges,
-)
-from Visualization.VizUnemployment import (
-    createUnemploymentChart,
-    createUnemploymentCorrelationLineChart,
-    createUnemploymentCorrelationLineCombinedChart,
-    createUnemploymentMaskChart,
-)
-from Visualization.VizUrbanRural import (
-    ElectionUrbanRuralDensityPlot,
-    UrbanRuralCorrelation,
-    UrbanRuralRollingAvgCompChart,
-    UrbanRuralRollingAvgSingleChart,
-    UrbanRuralAvgDeathsCompChart,
-    UrbanRuralMaskPlots,
-)
-
 # Import necessary libraries
 import streamlit as st
 
@@ -4,275 +4,21 @@ import base64
 import re
 import time
 
-import altair as alt
 from pathlib import Path
 import streamlit as st
 from PIL import Image
 
-from Visualization.VizBase import createTooltip, createCovidConfirmedTimeseriesChart
-from Visualization.VizCovid import createPercentPointChangeAvgDeathsChart
-from Visualization.VizVaccine import (
-    createStateVaccinationChart,
-    createDailyInteractiveVaccinationChart,
-    createCombinedVaccinationAndDeltaVariantTrend,
-    altairTestFunction,
-)
-from Visualization.VizMask import (
-    createMaskUsageDistributionChart,
-    createFreqCountyMaskUsageWithRanges,
-)
-from Visualization.VizUnemployment import (
-    createUnemploymentChart,
-    createUnemploymentCorrelationLineChart,
-    createUnemploymentCorrelationLineCombinedChart,
-    createUnemploymentMaskChart,
-)
-from Visualization.VizUrbanRural import (
-    ElectionUrbanRuralDensityPlot,
-    UrbanRuralCorrelation,
-    UrbanRuralRollingAvgCompChart,
-    UrbanRuralRollingAvgSingleChart,
-    UrbanRuralAvgDeathsCompChart,
-    UrbanRuralMaskPlots,
-)
-
 # Import necessary libraries
 import streamlit as st
 
 from Multiapp import MultiPage
+# The charts are displayed from the spec bundle of the packager, or built by Visualization.VizPages without it
+from Visualization.VizBundle import showPageChart
 
 def app():
     
     # Unemployment rate and COVID
     ###########################################
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_urban_rural_election_df():
-        df = pd.read_csv(
-            "./data/urban_rural_election_df.csv",
-            dtype={
-                "state_po": str,
-                "county_name": str,
-                "county_fips": int,
-                "candidate": str,
-                "party": str,
-                "candidatevotes": float,
-                "totalvotes": float,
-                "UrbanRural": str,
-                "PctRural": float,
-            },
-        )
-        return df
-
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_urban_rural_rolling_avg_full_df():
-        df = pd.read_csv(
-            "./data/urban_rural_rolling_avg_full_df.csv",
-            dtype={
-                "year": int,
-                "state": str,
-                "state_po": str,
-                "county_name": str,
-                "county_fips": float,
-                "office": str,
-                "candidate": str,
-                "party": str,
-                "candidatevotes": float,
-                "totalvotes": float,
-                "version": int,
-                "mode": str,
-            },
-        )
-        return df
-
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_urban_rolling_avg_full_df():
-        df = pd.read_csv(
-            "./data/urban_rolling_avg_full_df.csv",
-            dtype={
-                "year": int,
-                "state": str,
-                "state_po": str,
-                "county_name": str,
-                "county_fips": float,
-                "office": str,
-                "candidate": str,
-                "party": str,
-                "candidatevotes": float,
-                "totalvotes": float,
-                "version": int,
-                "mode": str,
-                "UrbanRural": str,
-                "PctRural": float,
-            },
-        )
-        return df
-
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_rural_rolling_avg_full_df():
-        df = pd.read_csv(
-            "./data/rural_rolling_avg_full_df.csv",
-            dtype={
-                "year": int,
-                "state": str,
-                "state_po": str,
-                "county_name": str,
-                "county_fips": float,
-                "office": str,
-                "candidate": str,
-                "party": str,
-                "candidatevotes": float,
-                "totalvotes": float,
-                "version": int,
-                "mode": str,
-                "UrbanRural": str,
-                "PctRural": float,
-            },
-        )
-        return df
-
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_urban_rural_avgdeaths_full_df():
-        df = pd.read_csv(
-            "./data/urban_rural_avgdeaths_full_df.csv",
-            dtype={
-                "COUNTYFP": int,
-                "deaths_avg_per_100k": float,
-                "state": str,
-                "state_po": str,
-                "CTYNAME": str,
-                "party_winner_2020": str,
-                "totalvotes_2020": float,
-                "fractionalvotes_2020": float,
-                "party_winner_2016": str,
-                "totalvotes_2016": float,
-                "fractionalvotes_2016": float,
-                "changecolor": str,
-                "_merge": str,
-                "pct_increase": float,
-                "segmentname": str,
-            },
-        )
-        return df
-
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_urban_avgdeaths_full_df():
-        df = pd.read_csv(
-            "./data/urban_avgdeaths_full_df.csv",
-            dtype={
-                "COUNTYFP": int,
-                "deaths_avg_per_100k": float,
-                "state": str,
-                "state_po": str,
-                "CTYNAME": str,
-                "party_winner_2020": str,
-                "totalvotes_2020": float,
-                "fractionalvotes_2020": float,
-                "party_winner_2016": str,
-                "totalvotes_2016": float,
-                "fractionalvotes_2016": float,
-                "changecolor": str,
-                "_merge": str,
-                "pct_increase": float,
-                "segmentname": str,
-            },
-        )
-        return df
-
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_rural_avgdeaths_full_df():
-        df = pd.read_csv(
-            "./data/rural_avgdeaths_full_df.csv",
-            dtype={
-                "COUNTYFP": int,
-                "deaths_avg_per_100k": float,
-                "state": str,
-                "state_po": str,
-                "CTYNAME": str,
-                "party_winner_2020": str,
-                "totalvotes_2020": float,
-                "fractionalvotes_2020": float,
-                "party_winner_2016": str,
-                "totalvotes_2016": float,
-                "fractionalvotes_2016": float,
-                "changecolor": str,
-                "_merge": str,
-                "pct_increase": float,
-                "segmentname": str,
-            },
-        )
-        return df
-
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_urban_mask_df():
-        df = pd.read_csv(
-            "./data/urban_mask_df.csv",
-            dtype={
-                "state_po": str,
-                "county_name": str,
-                "county_fips": int,
-                "candidate": str,
-                "party": str,
-                "candidatevotes": float,
-                "totalvotes": float,
-                "UrbanRural": str,
-                "PctRural": float,
-                "Infrequent": float,
-                "Frequent": float,
-            },
-        )
-        return df
-
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_rural_mask_df():
-        df = pd.read_csv(
-            "./data/rural_mask_df.csv",
-            dtype={
-                "state_po": str,
-                "county_name": str,
-                "county_fips": int,
-                "candidate": str,
-                "party": str,
-                "candidatevotes": float,
-                "totalvotes": float,
-                "UrbanRural": str,
-                "PctRural": float,
-                "Infrequent": float,
-                "Frequent": float,
-            },
-        )
-        return df
-
-
-    urban_rural_election_df = load_urban_rural_election_df()
-
-    urban_rural_rolling_avg_full_df = load_urban_rural_rolling_avg_full_df()
-    urban_rolling_avg_full_df = load_urban_rolling_avg_full_df()
-    rural_rolling_avg_full_df = load_rural_rolling_avg_full_df()
-
-    urban_rural_avgdeaths_full_df = load_urban_rural_avgdeaths_full_df()
-    urban_avgdeaths_full_df = load_urban_avgdeaths_full_df()
-    rural_avgdeaths_full_df = load_rural_avgdeaths_full_df()
-
-    urban_mask_df = load_urban_mask_df()
-    rural_mask_df = load_rural_mask_df()
-
     st.header(
         "Does the Urban/Rural Demographic Influence the COVID Response?",
         anchor="urbanruralandcovid",
@@ -303,7 +49,7 @@ def app():
     )
 
     #COMMENTED OUT THE DENSITY PLOT
-    st.altair_chart(ElectionUrbanRuralDensityPlot(urban_rural_election_df))
+    showPageChart("demographics_density")
 
     st.markdown(
         """
@@ -316,7 +62,7 @@ def app():
     """
     )
 
-    st.altair_chart(UrbanRuralCorrelation(urban_rural_election_df))
+    showPageChart("demographics_correlation")
 
     st.markdown(
         """
@@ -339,19 +85,9 @@ def app():
     )
 
 
-    st.altair_chart(
-        UrbanRuralRollingAvgCompChart(
-            urban_rural_rolling_avg_full_df,
-            urban_rolling_avg_full_df,
-            rural_rolling_avg_full_df,
-        )
-    )
+    showPageChart("demographics_rolling_average")
 
-    st.altair_chart(
-        UrbanRuralAvgDeathsCompChart(
-            urban_rural_avgdeaths_full_df, urban_avgdeaths_full_df, rural_avgdeaths_full_df
-        )
-    )
+    showPageChart("demographics_deaths")
 
     st.markdown(
         """
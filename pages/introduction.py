@@ -6,7 +6,6 @@ import base64
 import re
 import time
 
-import altair as alt
 from pathlib import Path
 import streamlit as st
 from PIL import Image
@@ -4,42 +4,18 @@ import base64
 import re
 import time
 
-import altair as alt
 from pathlib import Path
 import streamlit as st
 from PIL import Image
 
-from Visualization.VizBase import createTooltip, createCovidConfirmedTimeseriesChart
-from Visualization.VizCovid import createPercentPointChangeAvgDeathsChart
-from Visualization.VizVaccine import (
-    createStateVaccinationChart,
-    createDailyInteractiveVaccinationChart,
-    createCombinedVaccinationAndDeltaVariantTrend,
-    altairTestFunction,
-)
-from Visualization.VizMask import (
-    createMaskUsageDistributionChart,
-    createFreqCountyMaskUsageWithRanges,
-)
-from Visualization.VizUnemployment import (
-    createUnemploymentChart,
-    createUnemploymentCorrelationLineChart,
-    createUnemploymentCorrelationLineCombinedChart,
-    createUnemploymentMaskChart,
-)
-from Visualization.VizUrbanRural import (
-    ElectionUrbanRuralDensityPlot,
-    UrbanRuralCorrelation,
-    UrbanRuralRollingAvgCompChart,
-    UrbanRuralRollingAvgSingleChart,
-    UrbanRuralAvgDeathsCompChart,
-    UrbanRuralMaskPlots,
-)
-
 # Import necessary libraries
 import streamlit as st
 
 from Multiapp import MultiPage
+# One copy of each dataset is shared per process and must not be modified, see ETL.EtlStore.loadCachedData
+from ETL.EtlStore import loadCachedData
+# The charts are displayed from the spec bundle of the packager, or built by Visualization.VizPages without it
+from Visualization.VizBundle import showPageChart
 
 # Party affiliation and COVID case trend
 ###########################################
@@ -71,32 +47,8 @@ def app():
     """
     )
 
-    # Get rolling average of cases by segment
-    # @st.cache #Remove some caching to reduce memory usage due to Streamlit limitations
-    def load_case_rolling_df():
-        df = pd.read_csv("./data/case_rolling_df.csv")
-        return df
-
-    case_rolling_df = load_case_rolling_df()
-    # Create the chart
-    (
-        base,
-        make_selector,
-        highlight_segment,
-        radio_select,
-    ) = createCovidConfirmedTimeseriesChart(case_rolling_df)
-    selectors, rules, points, tooltip_text = createTooltip(
-        base, radio_select, case_rolling_df
-    )
-
     st.markdown("""---""")
-    # Bring all the layers together with layering and concatenation
-    st.altair_chart(
-        (
-            alt.layer(highlight_segment, selectors, points, rules, tooltip_text)
-            | make_selector
-        ).configure_title(align="left", anchor="start")
-    )
+    showPageChart("political_case_trend")
 
     st.markdown("""---""")
 
@@ -120,24 +72,11 @@ def app():
 
     st.markdown("""---""")
 
-    # election_change_and_covid_death_df = pd.read_csv(
-    #     "./data/election_change_and_covid_death_df.csv"
-    #
-    # Remove some caching to reduce memory usage due to Streamlit limitations)
-    # @st.cache
-    def load_percentile_point_deaths():
-        df = pd.read_csv("./data/percentile_point_deaths.csv")
-        return df
+    showPageChart("political_deaths")
 
-    election_change_and_covid_death_df = pd.read_csv(
-        "./data/percentile_point_deaths.csv"
-    )
-    st.altair_chart(
-        createPercentPointChangeAvgDeathsChart(
-            election_change_and_covid_death_df
-        ).configure_title(align="left", anchor="start")
+    election_change_and_covid_death_df = loadCachedData(
+        "election_change_and_covid_death_df"
     )
-
     df = election_change_and_covid_death_df.copy()
     df["deaths_avg_per_100k"] = df["deaths_avg_per_100k"].astype("float")
     df["pct_increase"] = df["pct_increase"].astype("float")
@@ -194,22 +133,7 @@ def app():
 
     st.markdown("""---""")
 
-    daily_vaccination_percent_df = pd.read_csv(
-        "./data/daily_vaccination_percent_df.csv"
-    )
-    daily_vaccination_percent_df["Total population"] = daily_vaccination_percent_df[
-        "Total population"
-    ].astype("int")
-    daily_vaccination_percent_df["day_num"] = daily_vaccination_percent_df[
-        "day_num"
-    ].astype("int")
-    daily_vaccination_percent_df[
-        "Percent with one dose"
-    ] = daily_vaccination_percent_df["Percent with one dose"].astype("float")
-
-    st.altair_chart(
-        createDailyInteractiveVaccinationChart(daily_vaccination_percent_df)
-    )
+    showPageChart("political_daily_vaccination")
 
     st.markdown("""---""")
 
@@ -232,87 +156,9 @@ def app():
     """
     )
 
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_state_vaccine_df():
-        df = pd.read_csv("./data/state_vaccine_df.csv")
-        df["STATEFP"] = df["STATEFP"].astype("int")
-        return df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_us_case_rolling_df():
-        df = pd.read_csv("./data/us_case_rolling_df.csv")
-        return df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_state_case_rolling_df():
-        df = pd.read_csv("./data/state_case_rolling_df.csv")
-        df["cases_avg_per_100k"] = df["cases_avg_per_100k"].astype("float")
-        df["STATEFP"] = df["STATEFP"].astype("int")
-        return df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_state_election_df():
-        df = pd.read_csv("./data/state_election_df.csv")
-        df["state_fips"] = df["state_fips"].astype("int")
-        df["candidatevotes"] = df["candidatevotes"].astype("int")
-        df["totalvotes"] = df["totalvotes"].astype("int")
-        df["fractionalvotes"] = df["fractionalvotes"].astype("float")
-        return df
-
-    state_vaccine_df = load_state_vaccine_df()
-    us_case_rolling_df = load_us_case_rolling_df()
-    state_case_rolling_df = load_state_case_rolling_df()
-    state_election_df = load_state_election_df()
-
-    (
-        vaccine_chart,
-        us_timeseries,
-        stayed_democrat_timeseries,
-        stayed_republican_timeseries,
-        state_cases_delta_chart,
-        state_selectors,
-        rules,
-        tooltip_text2,
-        tooltip_text3,
-        tooltip_text4,
-        tooltip_text5,
-        points,
-        rect_area,
-        delta_rect_area,
-        just_line_state_cases_delta,
-    ) = createCombinedVaccinationAndDeltaVariantTrend(
-        state_vaccine_df, us_case_rolling_df, state_case_rolling_df, state_election_df
-    )
-
     st.markdown("""---""")
 
-    st.altair_chart(
-        (
-            vaccine_chart
-            & alt.layer(
-                (
-                    state_cases_delta_chart
-                    + us_timeseries
-                    + stayed_democrat_timeseries
-                    + stayed_republican_timeseries
-                    + rect_area
-                    + delta_rect_area
-                ),
-                state_selectors,
-                rules,
-                tooltip_text2,
-                tooltip_text3,
-                tooltip_text4,
-                tooltip_text5,
-                points,
-            )
-        ).configure_title()
-        # .properties(width=200, height=100)
-    )
+    showPageChart("political_delta_variant")
 
     st.markdown("""---""")
 
@@ -343,79 +189,7 @@ def app():
     """
     )
 
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_mask_distribution_df():
-        df = pd.read_csv("./data/mask_distribution_df.csv")
-        return df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_county_pop_mask_df():
-        df = pd.read_csv("./data/county_pop_mask_df.csv")
-        return df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_county_pop_mask_freq_df():
-        df = pd.read_csv("./data/county_pop_mask_freq_df.csv")
-        return df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_county_pop_mask_infreq_df():
-        df = pd.read_csv("./data/county_pop_mask_infreq_df.csv")
-        return df
-
-    mask_distribution_df = load_mask_distribution_df()
-    #NOTE THIS HAS BEEN COMMENTED OUT
-    st.altair_chart(createMaskUsageDistributionChart(mask_distribution_df))
-
-    county_pop_mask_df = load_county_pop_mask_df()
-    county_pop_mask_freq_df = load_county_pop_mask_freq_df()
-    county_pop_mask_infreq_df = load_county_pop_mask_infreq_df()
-
-#     freq, infreq = st.beta_columns(2)
-    (
-        county_mask_chart,
-        legend_republican,
-        legend_democrat,
-        average_mask_chart,
-    ) = createFreqCountyMaskUsageWithRanges(
-        "FREQUENT",
-        county_pop_mask_df,
-        county_pop_mask_freq_df,
-        county_pop_mask_infreq_df,
-        mask_distribution_df,
-    )
-    st.altair_chart(
-        (
-            (county_mask_chart)
-            & (average_mask_chart | legend_republican | legend_democrat).resolve_scale(
-                color="independent"
-            )
-        ).configure_title(align="left", anchor="start")
-    )
-
-    (
-        county_mask_chart,
-        legend_republican,
-        legend_democrat,
-        average_mask_chart,
-    ) = createFreqCountyMaskUsageWithRanges(
-        "INFREQUENT",
-        county_pop_mask_df,
-        county_pop_mask_freq_df,
-        county_pop_mask_infreq_df,
-        mask_distribution_df,
-    )
-
-    st.altair_chart(
-       (
-        (county_mask_chart)
-            & (average_mask_chart | legend_republican | legend_democrat).resolve_scale(
-                color="independent"
-            )
-        ).configure_title(align="left", anchor="start")
-    )
+    showPageChart("political_mask_distribution")
+    showPageChart("political_frequent_mask_usage")
+    showPageChart("political_infrequent_mask_usage")
     st.markdown("""---""")
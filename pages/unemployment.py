@@ -4,112 +4,22 @@ import base64
 import re
 import time
 
-import altair as alt
 from pathlib import Path
 import streamlit as st
 from PIL import Image
 
-from Visualization.VizBase import createTooltip, createCovidConfirmedTimeseriesChart
-from Visualization.VizCovid import createPercentPointChangeAvgDeathsChart
-from Visualization.VizVaccine import (
-    createStateVaccinationChart,
-    createDailyInteractiveVaccinationChart,
-    createCombinedVaccinationAndDeltaVariantTrend,
-    altairTestFunction,
-)
-from Visualization.VizMask import (
-    createMaskUsageDistributionChart,
-    createFreqCountyMaskUsageWithRanges,
-)
-from Visualization.VizUnemployment import (
-    createUnemploymentChart,
-    createUnemploymentCorrelationLineChart,
-    createUnemploymentCorrelationLineCombinedChart,
-    createUnemploymentMaskChart,
-)
-from Visualization.VizUrbanRural import (
-    ElectionUrbanRuralDensityPlot,
-    UrbanRuralCorrelation,
-    UrbanRuralRollingAvgCompChart,
-    UrbanRuralRollingAvgSingleChart,
-    UrbanRuralAvgDeathsCompChart,
-    UrbanRuralMaskPlots,
-)
-
 # Import necessary libraries
 import streamlit as st
 
 from Multiapp import MultiPage
+# The charts are displayed from the spec bundle of the packager, or built by Visualization.VizPages without it
+from Visualization.VizBundle import showPageChart
 
 
 def app():
 
     # Unemployment rate and COVID
     ###########################################
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_unemployment_rate_since_2019_df():
-        df = pd.read_csv(
-            "./data/unemployment_rate_since_2019_df.csv",
-            dtype={
-                "month": str,
-                "unemployment_rate": float,
-                "COUNTYFP": int,
-                "month_since_start": int,
-                "party": str,
-            },
-        )
-        return df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_unemployment_covid_correlation_df():
-        df = pd.read_csv(
-            "./data/unemployment_covid_correlation_df.csv",
-            dtype={"month": str, "party": str, "variable": str, "value": float},
-        )
-        return df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_unemployment_and_mask_df():
-        dtypes = {
-            "COUNTYFP": int,
-            "unemployment_rate": float,
-            "cases_avg_per_100k": float,
-            "deaths_avg_per_100k": float,
-            "party": str,
-            "NEVER": float,
-            "RARELY": float,
-            "SOMETIMES": float,
-            "FREQUENTLY": float,
-            "ALWAYS": float,
-        }
-        freq_df = pd.read_csv(
-            "./data/unemployment_freq_mask_july_df.csv", dtype=dtypes,
-        )
-        infreq_df = pd.read_csv(
-            "./data/unemployment_infreq_mask_july_df.csv", dtype=dtypes,
-        )
-        return freq_df, infreq_df
-
-    # Remove some caching to reduce memory usage due to Streamlit limitations
-    # @st.cache
-    def load_unemployment_vaccine_correlation_df():
-        df = pd.read_csv(
-            "./data/unemployment_vaccine_correlation_df.csv",
-            dtype={"month": str, "party": str, "variable": str, "value": float},
-        )
-        return df
-
-    unemployment_rate_since_2019_df = load_unemployment_rate_since_2019_df()
-    unemployment_covid_correlation_df = load_unemployment_covid_correlation_df()
-    (
-        unemployment_freq_mask_july_df,
-        unemployment_infreq_mask_july_df,
-    ) = load_unemployment_and_mask_df()
-    unemployment_vaccine_correlation_df = load_unemployment_vaccine_correlation_df()
-
     st.header(
         "Does Unemployment Influence the COVID Response?",
         anchor="unemploymentandcovid",
@@ -131,7 +41,7 @@ def app():
     )
 
     #COMMENTED OUT createUnemploymentChart
-    st.altair_chart(createUnemploymentChart(unemployment_rate_since_2019_df))
+    showPageChart("unemployment_rate")
 
     st.markdown(
         """
@@ -155,17 +65,7 @@ def app():
     """
     )
 
-    st.altair_chart(
-        createUnemploymentCorrelationLineChart(
-            unemployment_covid_correlation_df,
-            title="Counties Average Unemployment Rate and COVID Cases Since January 2020",
-            sort=[
-                "Average COVID Cases per 100k",
-                "Average Unemployment Rate",
-                "Correlation",
-            ],
-        )
-    )
+    showPageChart("unemployment_covid")
 
     st.markdown(
         """
@@ -185,11 +85,7 @@ def app():
     """
     )
 
-    st.altair_chart(
-        createUnemploymentMaskChart(
-            unemployment_freq_mask_july_df, unemployment_infreq_mask_july_df
-        )
-    )
+    showPageChart("unemployment_mask")
 
     st.markdown(
         """
@@ -204,17 +100,7 @@ def app():
     """
     )
 
-    st.altair_chart(
-        createUnemploymentCorrelationLineChart(
-            unemployment_vaccine_correlation_df,
-            title="Counties Average Unemployment Rate and Vaccination Rate Since December 2020",
-            sort=[
-                "Average Unemployment Rate",
-                "Average % of People with 1 Dose of Vaccine",
-                "Correlation",
-            ],
-        )
-    )
+    showPageChart("unemployment_vaccine")
 
     st.markdown(
         """
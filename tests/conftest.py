@@ -0,0 +1,105 @@
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ETL import EtlFetch
+
+#
+# Shared fixtures of the tests: a fake HTTP server standing in for the NYT GitHub files, the CDC Socrata API and the
+# BLS API, and an HTTP cache folder of the fetch layer (ETL.EtlFetch) reset for each test.
+#
+
+
+class FakeServer:
+    """
+    Local HTTP server serving in-memory files with an ETag and a Last-Modified date, answering the conditional GETs
+    whose validators still match with 304 Not Modified. The POST requests are answered by the function routed to
+    their path. Every request is recorded as (path, status), with the time it was received in request_times.
+    """
+
+    def __init__(self):
+        self.files = {}
+        self.routes = {}
+        self.requests = []
+        self.request_times = []
+        self.failing = False
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if server.failing:
+                    self.answer(503)
+                    return
+                if self.path not in server.files:
+                    self.answer(404)
+                    return
+                body, etag, last_modified = server.files[self.path]
+                if self.headers.get("If-None-Match") == etag:
+                    self.answer(304)
+                    return
+                self.answer(200, body, {"ETag": etag, "Last-Modified": last_modified})
+
+            def do_POST(self):
+                received = time.monotonic()
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path not in server.routes:
+                    self.answer(404, received=received)
+                    return
+                status, answer = server.routes[self.path](body)
+                self.answer(status, answer, received=received)
+
+            def answer(self, status, body=b"", headers=None, received=None):
+                server.requests.append((self.path, status))
+                server.request_times.append(time.monotonic() if received is None else received)
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{path}"
+
+    def publish(self, path, body: bytes, version: int = 1):
+        self.files[path] = (body, f'"{path}-{version}"', f"Mon, 0{version} Mar 2021 00:00:00 GMT")
+
+    def route(self, path, handler):
+        """Answers the POST requests of a path with handler(request body) -> (status, answer body)"""
+        self.routes[path] = handler
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.fixture
+def fake_server():
+    server = FakeServer()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def http_cache(tmp_path, monkeypatch):
+    cache_folder = tmp_path / "http_cache"
+    # The default cache folder of fetchUrl, used by the Socrata readers and readSourceData
+    monkeypatch.setattr(EtlFetch, "HttpCacheFolder", cache_folder)
+    EtlFetch.setOfflineMode(False)
+    EtlFetch.setTransport(None)
+    yield cache_folder
+    EtlFetch.setOfflineMode(False)
+    EtlFetch.setTransport(None)
@@ -0,0 +1,74 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from ETL import EtlFetch
+from ETL.EtlBase import clearSourceCache
+from ETL.EtlPipeline import runPipeline
+from package_processed_datasets import STAGES
+from Visualization.VizData import chartToSpec, getSpecBytes
+from Visualization.VizPages import PAGE_CHARTS
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "benchmarks"))
+from synthetic_datasets import generateDatasets, getTemplateCounties
+
+#
+# Payload sizes of the page charts built from synthetic datasets (see benchmarks/synthetic_datasets.py) at the sample
+# scale and at a larger one, to catch a chart whose spec sent to the browser grows faster than the data it shows.
+# The delta variant chart is left out: the dates of the sample NYT county rolling averages do not overlap the
+# vaccination dates, so the state rolling averages it shows are empty in the synthetic datasets.
+#
+
+COUNTY_FACTOR = 3
+SPAN = 2
+# Largest payload of a chart at the larger scale, the sample payloads being at most 250kB
+MAX_PAYLOAD_BYTES = 1_500_000
+# Charts showing a value per county, the others aggregating the counties by state, urban/rural class or date
+COUNTY_CHARTS = ["political_frequent_mask_usage", "political_infrequent_mask_usage", "demographics_correlation",
+                 "unemployment_mask"]
+EXCLUDED_CHARTS = ["political_delta_variant"]
+
+
+def getPayloads(root: Path, counties: int, span: int):
+    generateDatasets(root, counties, span)
+    current_folder = os.getcwd()
+    # The ETL functions read ./sample_datasets/ and the remote files from its HTTP cache
+    os.chdir(root)
+    EtlFetch.setOfflineMode(True)
+    clearSourceCache()
+    try:
+        runPipeline([stage for stage in STAGES if stage.outputs], root / "data")
+        return {name: getSpecBytes(chartToSpec(build(root / "data"), as_dataframes=True))
+                for name, build in PAGE_CHARTS.items() if name not in EXCLUDED_CHARTS}
+    finally:
+        clearSourceCache()
+        EtlFetch.setOfflineMode(False)
+        os.chdir(current_folder)
+
+
+@pytest.fixture(scope="module")
+def payloads(tmp_path_factory):
+    counties = len(getTemplateCounties())
+    return (getPayloads(tmp_path_factory.mktemp("sample_scale"), counties, 1),
+            getPayloads(tmp_path_factory.mktemp("larger_scale"), counties * COUNTY_FACTOR, SPAN))
+
+
+def test_chart_payloads_stay_under_the_budget(payloads):
+    _, large_payloads = payloads
+    assert {name: size for name, size in large_payloads.items() if size > MAX_PAYLOAD_BYTES} == {}
+
+
+def test_county_chart_payloads_grow_at_most_with_the_counties(payloads):
+    small_payloads, large_payloads = payloads
+    growth = {name: large_payloads[name] / small_payloads[name] for name in COUNTY_CHARTS}
+    assert all(ratio <= COUNTY_FACTOR * 1.1 for ratio in growth.values()), growth
+
+
+def test_aggregated_chart_payloads_do_not_grow_with_the_counties(payloads):
+    small_payloads, large_payloads = payloads
+    growth = {name: large_payloads[name] / small_payloads[name] for name in small_payloads
+              if name not in COUNTY_CHARTS}
+    # At most the growth of the date spans, with a margin for the longer date labels and axis domains
+    assert all(ratio <= SPAN * 1.25 for ratio in growth.values()), growth
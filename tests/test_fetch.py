@@ -0,0 +1,95 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+from ETL.EtlFetch import fetchUrl, getCachePaths, readSocrataPages, setOfflineMode
+
+
+def test_download_then_not_modified(fake_server, http_cache):
+    fake_server.publish("/us.csv", b"date,cases\n2021-01-01,1\n")
+    url = fake_server.url("/us.csv")
+
+    path = fetchUrl(url, cache_folder=http_cache)
+    assert path.read_bytes() == b"date,cases\n2021-01-01,1\n"
+    assert json.loads(getCachePaths(url, http_cache)[1].read_text())["etag"] == '"/us.csv-1"'
+
+    assert fetchUrl(url, cache_folder=http_cache) == path
+    assert fake_server.requests == [("/us.csv", 200), ("/us.csv", 304)]
+    assert path.read_bytes() == b"date,cases\n2021-01-01,1\n"
+
+
+def test_changed_file_is_downloaded_again(fake_server, http_cache):
+    url = fake_server.url("/us-states.csv")
+    fake_server.publish("/us-states.csv", b"old\n")
+    fetchUrl(url, cache_folder=http_cache)
+    fake_server.publish("/us-states.csv", b"new\n", version=2)
+
+    assert fetchUrl(url, cache_folder=http_cache).read_bytes() == b"new\n"
+    assert fake_server.requests[-1] == ("/us-states.csv", 200)
+    assert json.loads(getCachePaths(url, http_cache)[1].read_text())["etag"] == '"/us-states.csv-2"'
+
+
+def test_offline_mode_serves_the_cache(fake_server, http_cache):
+    fake_server.publish("/mask-use-by-county.csv", b"COUNTYFP,NEVER\n1001,0.1\n")
+    url = fake_server.url("/mask-use-by-county.csv")
+    fetchUrl(url, cache_folder=http_cache)
+    fake_server.stop()
+    setOfflineMode(True)
+
+    assert fetchUrl(url, cache_folder=http_cache).read_bytes() == b"COUNTYFP,NEVER\n1001,0.1\n"
+    with pytest.raises(FileNotFoundError):
+        fetchUrl(fake_server.url("/not-cached.csv"), cache_folder=http_cache)
+
+
+def test_server_error_falls_back_to_the_cache(fake_server, http_cache):
+    fake_server.publish("/us.csv", b"cached\n")
+    url = fake_server.url("/us.csv")
+    fetchUrl(url, cache_folder=http_cache)
+    fake_server.failing = True
+
+    assert fetchUrl(url, cache_folder=http_cache).read_bytes() == b"cached\n"
+    assert fake_server.requests[-1] == ("/us.csv", 503)
+
+
+def test_concurrent_fetches_leave_complete_cache_files(fake_server, http_cache):
+    fake_server.publish("/us.csv", b"x" * 100000)
+    url = fake_server.url("/us.csv")
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        paths = list(executor.map(lambda _: fetchUrl(url, cache_folder=http_cache), range(16)))
+
+    content_path, metadata_path = getCachePaths(url, http_cache)
+    assert set(paths) == {content_path}
+    assert content_path.read_bytes() == b"x" * 100000
+    assert json.loads(metadata_path.read_text())["etag"] == '"/us.csv-1"'
+    assert sorted(path.name for path in http_cache.iterdir()) == sorted([content_path.name, metadata_path.name])
+
+
+def test_socrata_shards_of_a_longer_previous_read_are_deleted(fake_server, http_cache, tmp_path):
+    resource = "/resource/unsk-b7fc.csv"
+    fake_server.publish(resource + "?$select=count(*)", b"count\n3\n")
+    for page in range(2):
+        fake_server.publish(f"{resource}?$order=:id&$limit=2&$offset={2 * page}",
+                            b"date,location\n" + b"2021-01-01,AL\n" * (2 - page))
+    shard_path = tmp_path / "StateVaccineDataFile{}.csv"
+    for number in (1, 2, 3, 10):
+        (tmp_path / f"StateVaccineDataFile{number}.csv").write_text("date,location\n2020-12-31,AK\n")
+
+    shards = readSocrataPages(fake_server.url(resource), page_size=2, shard_path=shard_path)
+
+    assert [path.name for path in shards] == ["StateVaccineDataFile1.csv", "StateVaccineDataFile2.csv"]
+    assert sorted(path.name for path in tmp_path.glob("StateVaccineDataFile*")) == [path.name for path in shards]
+    assert sum(len(pd.read_csv(path)) for path in shards) == 3
+
+
+def test_json_file_is_cached_apart_from_its_metadata(fake_server, http_cache):
+    fake_server.publish("/us-10m.json", b'{"type": "Topology"}')
+    url = fake_server.url("/us-10m.json")
+
+    content_path, metadata_path = getCachePaths(url, http_cache)
+    assert content_path != metadata_path
+    assert json.loads(fetchUrl(url, cache_folder=http_cache).read_text()) == {"type": "Topology"}
+    assert fetchUrl(url, cache_folder=http_cache).read_text() == '{"type": "Topology"}'
+    assert fake_server.requests == [("/us-10m.json", 200), ("/us-10m.json", 304)]
@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from ETL.EtlStore import clearDataCache, loadCachedData
+from Visualization import VizPages
+from Visualization.VizCache import clearChartCache
+from Visualization.VizPages import PAGE_CHARTS
+
+DataFolder = Path(__file__).resolve().parent.parent / "data"
+
+
+@pytest.mark.parametrize("chart_name", sorted(PAGE_CHARTS))
+def test_page_chart_builders_leave_the_shared_datasets_unchanged(chart_name, tmp_path, monkeypatch):
+    # The lookup data of the maps without geometry bundle is written in ./altair-data when the charts are built
+    monkeypatch.chdir(tmp_path)
+    # The factories must run on the shared dataframes, not return charts cached by another test
+    clearChartCache()
+    clearDataCache()
+    loaded = []
+
+    def loadAndRecord(name, *args, **kwargs):
+        df = loadCachedData(name, *args, **kwargs)
+        loaded.append((name, df, df.copy(deep=True)))
+        return df
+
+    monkeypatch.setattr(VizPages, "loadCachedData", loadAndRecord)
+    PAGE_CHARTS[chart_name](DataFolder)
+
+    assert loaded
+    for name, df, original_df in loaded:
+        pd.testing.assert_frame_equal(df, original_df, obj=name)
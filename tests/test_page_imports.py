@@ -0,0 +1,22 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+RepositoryFolder = Path(__file__).resolve().parent.parent
+
+# Modules that the first page of the app must not import: the other pages import them when they are selected
+DEFERRED_MODULES = ["Visualization", "ETL", "altair", "vega_datasets"]
+
+
+def test_introduction_page_does_not_import_the_chart_modules():
+    pytest.importorskip("streamlit")
+    pytest.importorskip("PIL")
+    # A fresh interpreter, the modules imported by the other tests being in sys.modules
+    code = ("import json, sys, Multiapp, pages.introduction; "
+            f"print(json.dumps(sorted(name for name in sys.modules if name.split('.')[0] in {DEFERRED_MODULES!r})))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=RepositoryFolder, capture_output=True, text=True,
+                            check=True)
+    assert json.loads(result.stdout.splitlines()[-1]) == []
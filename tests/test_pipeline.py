@@ -0,0 +1,37 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+from ETL import EtlPipeline
+from ETL.EtlPipeline import SHARED_MODULES, Stage, getStageFingerprint, runPipeline
+
+ETLFolder = EtlPipeline.ETLFolder
+
+
+def createCounts():
+    return pd.DataFrame({"county": ["a", "b"], "count": [1, 2]})
+
+
+@pytest.fixture
+def etl_folder(tmp_path, monkeypatch):
+    # A copy of the ETL modules, changed by the tests
+    folder = tmp_path / "ETL"
+    shutil.copytree(ETLFolder, folder, ignore=shutil.ignore_patterns("__pycache__"))
+    monkeypatch.setattr(EtlPipeline, "ETLFolder", folder)
+    return folder
+
+
+@pytest.mark.parametrize("module", SHARED_MODULES)
+def test_change_of_a_shared_module_makes_every_stage_stale(module, etl_folder, tmp_path):
+    stage = Stage("counts", createCounts, outputs=["counts_df"], modules=["EtlMask"])
+    fingerprint = getStageFingerprint(stage, {})
+    output_folder = tmp_path / "data"
+    assert runPipeline([stage], output_folder) == ["counts"]
+    assert runPipeline([stage], output_folder) == []
+
+    with open(etl_folder / f"{module}.py", "a") as file:
+        file.write("\n# Changed\n")
+
+    assert getStageFingerprint(stage, {}) != fingerprint
+    assert runPipeline([stage], output_folder) == ["counts"]
@@ -0,0 +1,43 @@
+import pandas as pd
+from pandas.core.groupby.generic import DataFrameGroupBy
+
+from ETL.EtlBase import isProfiling, recordProfile, setProfiling
+
+LEFT_DF = pd.DataFrame({"key": [1, 2, 3], "value": [1.0, 2.0, 3.0]})
+RIGHT_DF = pd.DataFrame({"key": [1, 2, 3], "other": ["a", "b", "c"]})
+
+
+def getPandasMethods():
+    return pd.merge, pd.DataFrame.merge, DataFrameGroupBy.__dict__.get("sum"), DataFrameGroupBy.__dict__.get("agg")
+
+
+def test_record_profile_restores_the_pandas_methods():
+    assert not isProfiling()
+    originals = getPandasMethods()
+    with recordProfile() as records:
+        assert getPandasMethods() != originals
+        pd.merge(LEFT_DF, RIGHT_DF, on="key").groupby("other").sum()
+    assert {record["category"] for record in records} == {"merge", "groupby"}
+    assert getPandasMethods() == originals
+
+
+def test_nested_record_profile_keeps_recording_until_the_outer_exit():
+    originals = getPandasMethods()
+    with recordProfile() as outer_records:
+        with recordProfile():
+            pass
+        LEFT_DF.merge(RIGHT_DF, on="key")
+    assert [record["name"] for record in outer_records] == ["merge"]
+    assert getPandasMethods() == originals
+
+
+def test_record_profile_keeps_the_process_profiling():
+    originals = getPandasMethods()
+    setProfiling(True)
+    try:
+        with recordProfile():
+            pass
+        assert getPandasMethods() != originals
+    finally:
+        setProfiling(False)
+    assert getPandasMethods() == originals
@@ -0,0 +1,72 @@
+import json
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+from package_processed_datasets import STAGES
+from Visualization import VizBundle
+from Visualization.VizBundle import loadBundledSpec, writeSpecBundle
+from Visualization.VizPages import PAGE_CHARTS
+
+RepositoryFolder = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture(scope="module")
+def bundle_folders(tmp_path_factory):
+    # Only the datasets produced by the pipeline stages, as in a folder written by the packager
+    data_folder = tmp_path_factory.mktemp("data")
+    for stage in STAGES:
+        for output in stage.outputs:
+            shutil.copyfile(RepositoryFolder / "data" / f"{output}.csv", data_folder / f"{output}.csv")
+    bundle_folder = data_folder / VizBundle.SpecBundleFolder.name
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        # The lookup data of the maps without geometry bundle is written in ./altair-data when the charts are built
+        monkeypatch.chdir(tmp_path_factory.mktemp("build"))
+        writeSpecBundle(PAGE_CHARTS, data_folder, bundle_folder)
+    return data_folder, bundle_folder
+
+
+def test_every_page_chart_is_served_from_the_bundle_without_altair(bundle_folders):
+    data_folder, bundle_folder = bundle_folders
+    # A fresh interpreter, the modules imported by the other tests being in sys.modules
+    code = ("import json, sys; from Visualization.VizBundle import loadBundledSpec; "
+            f"names = {sorted(PAGE_CHARTS)!r}; "
+            f"specs = [loadBundledSpec(name, {str(data_folder)!r}, {str(bundle_folder)!r}) for name in names]; "
+            "print(json.dumps({'missing': [name for name, spec in zip(names, specs) if spec is None], "
+            "'modules': sorted(name for name in sys.modules if name.split('.')[0] == 'altair' "
+            "or name == 'Visualization.VizPages')}))")
+    result = subprocess.run([sys.executable, "-c", code], cwd=RepositoryFolder, capture_output=True, text=True,
+                            check=True)
+    assert json.loads(result.stdout.splitlines()[-1]) == {"missing": [], "modules": []}
+
+
+def test_bundle_is_not_served_when_the_datasets_changed(bundle_folders, tmp_path):
+    data_folder, bundle_folder = bundle_folders
+    changed_folder = tmp_path / "data"
+    shutil.copytree(data_folder, changed_folder, ignore=shutil.ignore_patterns(bundle_folder.name))
+    with open(changed_folder / "case_rolling_df.csv", "a") as file:
+        file.write("\n")
+
+    assert loadBundledSpec("political_case_trend", data_folder, bundle_folder) is not None
+    assert loadBundledSpec("political_case_trend", changed_folder, bundle_folder) is None
+
+
+def test_show_page_chart_does_not_build_bundled_charts(bundle_folders, monkeypatch):
+    st = pytest.importorskip("streamlit")
+    data_folder, bundle_folder = bundle_folders
+    displayed = []
+
+    def failBuild(folder):
+        raise AssertionError("the chart was built instead of being read from the bundle")
+
+    monkeypatch.setattr(st, "vega_lite_chart", lambda spec, **kwargs: displayed.append(spec))
+    for name in PAGE_CHARTS:
+        monkeypatch.setitem(PAGE_CHARTS, name, failBuild)
+
+    for name in sorted(PAGE_CHARTS):
+        VizBundle.showPageChart(name, data_folder, bundle_folder=bundle_folder)
+    assert len(displayed) == len(PAGE_CHARTS)
+    assert all(spec.get("datasets") for spec in displayed)
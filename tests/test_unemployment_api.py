@@ -0,0 +1,173 @@
+import json
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from ETL import EtlUnemployment
+from ETL.EtlUnemployment import RateLimiter, get_unemployment_rates_from_api, post_bls_chunk
+
+#
+# Tests of the concurrent BLS API client against the fake server (see conftest.py) standing in for the BLS v2 API
+#
+
+BLS_PATH = "/publicAPI/v2/timeseries/data/"
+LAUS_CODES = [f"LAUCN{state:02d}{county:03d}0000000003" for state in (1, 6) for county in range(1, 121, 2)]
+
+
+class FakeBlsApi:
+    """Answers the queries of the fake server like the BLS v2 API, with one monthly rate per series"""
+
+    def __init__(self):
+        self.queried = []
+        self.failing_codes = set()
+        self.failures_before_success = 0
+        # Answers (status, body) given to the next queries before the normal ones
+        self.answers = []
+        self.lock = threading.Lock()
+
+    def __call__(self, body):
+        query = json.loads(body)
+        with self.lock:
+            self.queried.append(query["seriesid"])
+            if self.failing_codes.intersection(query["seriesid"]):
+                return 503, b""
+            if self.failures_before_success > 0:
+                self.failures_before_success -= 1
+                return 503, b""
+            if self.answers:
+                return self.answers.pop(0)
+        series = [{"seriesID": code, "data": [
+            {"year": "2020", "period": "M01", "value": str(int(code[5:10]) % 97 / 10), "footnotes": [{}]},
+            {"year": "2020", "period": "M13", "value": "0.0", "footnotes": [{}]}]}
+            for code in query["seriesid"]]
+        return 200, json.dumps({"status": "REQUEST_SUCCEEDED", "Results": {"series": series}}).encode()
+
+    def queriedCodes(self):
+        return [code for codes in self.queried for code in codes]
+
+
+@pytest.fixture
+def bls_api(fake_server, tmp_path, monkeypatch):
+    api = FakeBlsApi()
+    fake_server.route(BLS_PATH, api)
+    # The LAUS codes are read from the raw datasets folder
+    monkeypatch.setattr(EtlUnemployment, "DataFolder", tmp_path)
+    pd.Series(LAUS_CODES).to_csv(tmp_path / "bls_laus_codes.csv", header=None, index=None)
+    return api
+
+
+def getRates(fake_server, tmp_path, **kwargs):
+    arguments = dict(api_url=fake_server.url(BLS_PATH), output_file=tmp_path / "bls_unemployment_rates.csv",
+                     cache_folder=tmp_path / "bls_cache", calls_per_second=100, backoff=0.01)
+    arguments.update(kwargs)
+    return get_unemployment_rates_from_api("key", **arguments)
+
+
+def readRates(tmp_path):
+    return pd.read_csv(tmp_path / "bls_unemployment_rates.csv", header=None, names=EtlUnemployment.BLS_COLUMNS)
+
+
+def test_all_the_series_are_written_in_the_order_of_the_codes(fake_server, bls_api, tmp_path):
+    assert getRates(fake_server, tmp_path, max_workers=4)
+
+    rates_df = readRates(tmp_path)
+    assert rates_df["series_id"].tolist() == LAUS_CODES
+    assert (rates_df["month"] == 1).all()
+    assert sorted(len(codes) for codes in bls_api.queried) == [20, 50, 50]
+    assert not (tmp_path / "bls_unemployment_rates.csv.partial").exists()
+
+
+def test_rate_limiter_spaces_out_the_concurrent_queries(fake_server, bls_api, tmp_path):
+    pd.Series([code.replace("0000000003", f"000000{copy}003") for copy in range(3) for code in LAUS_CODES]).to_csv(
+        tmp_path / "bls_laus_codes.csv", header=None, index=None)
+    assert getRates(fake_server, tmp_path, max_workers=4, calls_per_second=20)
+
+    times = sorted(fake_server.request_times)
+    assert len(times) == 8
+    # At most one query starts every 1/20 second, with a margin for the delivery of the requests
+    assert min(later - earlier for earlier, later in zip(times, times[1:])) >= 0.03
+    assert times[-1] - times[0] >= 7 * 0.04
+
+
+def test_rate_limiter_is_shared_by_the_threads():
+    rate_limiter = RateLimiter(50)
+    starts = []
+    lock = threading.Lock()
+
+    def call():
+        for _ in range(5):
+            rate_limiter.wait()
+            with lock:
+                starts.append(time.monotonic())
+
+    threads = [threading.Thread(target=call) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    starts.sort()
+    assert min(later - earlier for earlier, later in zip(starts, starts[1:])) >= 0.015
+
+
+def test_failed_query_is_retried_with_a_growing_backoff(fake_server, bls_api, tmp_path):
+    bls_api.failures_before_success = 2
+
+    json_data = post_bls_chunk(LAUS_CODES[:50], 2019, 2021, "key", fake_server.url(BLS_PATH), retries=3,
+                               backoff=0.05, cache_folder=tmp_path / "bls_cache")
+
+    assert len(json_data["Results"]["series"]) == 50
+    assert [status for _, status in fake_server.requests] == [503, 503, 200]
+    first_delay, second_delay = (later - earlier for earlier, later in
+                                 zip(fake_server.request_times, fake_server.request_times[1:]))
+    assert first_delay >= 0.05 and second_delay >= 0.1
+    assert len(list((tmp_path / "bls_cache").glob("*.json"))) == 1
+
+
+def test_chunk_failing_every_retry_is_not_written_and_is_queried_again(fake_server, bls_api, tmp_path):
+    output_file = tmp_path / "bls_unemployment_rates.csv"
+    output_file.write_text("previous rates\n")
+    bls_api.failing_codes = {LAUS_CODES[60]}
+
+    assert not getRates(fake_server, tmp_path, retries=2)
+    # The chunk of the failing code was tried 3 times, the others once and cached
+    assert sum(LAUS_CODES[60] in codes for codes in bls_api.queried) == 3
+    assert len(bls_api.queried) == 5
+    assert len(list((tmp_path / "bls_cache").glob("*.json"))) == 2
+    # The previous file is only replaced by a full set of series
+    assert output_file.read_text() == "previous rates\n"
+    assert not (tmp_path / "bls_unemployment_rates.csv.partial").exists()
+
+    # Resumed from the cache: only the series of the failed chunk are queried again
+    bls_api.failing_codes = set()
+    bls_api.queried = []
+    assert getRates(fake_server, tmp_path)
+    assert bls_api.queriedCodes() == LAUS_CODES[50:100]
+    assert readRates(tmp_path)["series_id"].tolist() == LAUS_CODES
+
+
+def test_expired_cached_answers_are_queried_again(fake_server, bls_api, tmp_path):
+    assert getRates(fake_server, tmp_path)
+    bls_api.queried = []
+    assert getRates(fake_server, tmp_path)
+    assert bls_api.queried == []
+
+    assert getRates(fake_server, tmp_path, cache_max_age_days=0)
+    assert sorted(bls_api.queriedCodes()) == sorted(LAUS_CODES)
+
+
+def test_invalid_answers_are_retried_and_the_bls_message_is_printed(fake_server, bls_api, tmp_path, capsys):
+    bls_api.answers = [(200, b"<html>Service Unavailable</html>"),
+                       (200, b'{"status": "REQUEST_SUCCEEDED", "Results": {"ser'),
+                       (200, json.dumps({"status": "REQUEST_NOT_PROCESSED",
+                                         "message": ["Daily threshold for total number of requests allocated to "
+                                                     "API key has been reached."]}).encode())]
+
+    assert getRates(fake_server, tmp_path, max_workers=1)
+
+    output = capsys.readouterr().out
+    assert output.count("invalid JSON answer") == 2
+    assert "status = REQUEST_NOT_PROCESSED - message = ['Daily threshold" in output
+    assert len(bls_api.queried) == 6
+    assert readRates(tmp_path)["series_id"].tolist() == LAUS_CODES
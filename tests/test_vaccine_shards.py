@@ -0,0 +1,60 @@
+import os
+
+import pandas as pd
+import pytest
+
+from ETL import EtlVaccine
+from ETL.EtlBase import getSourceCacheStats
+from ETL.EtlVaccine import STATE_VACCINE_COLUMNS, readStateVaccinationShards
+
+
+@pytest.fixture
+def shard_folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(EtlVaccine, "DataFolder", tmp_path)
+    monkeypatch.setattr(EtlVaccine, "STATE_VACCINE_COMBINED_FILE", tmp_path / "StateVaccineData.feather")
+    monkeypatch.setattr(EtlVaccine, "STATE_VACCINE_COMBINED_SHARDS_FILE", tmp_path / "StateVaccineData.shards.json")
+    for number in range(1, 4):
+        pd.DataFrame({"date": [f"2021-0{number}-01T00:00:00.000"] * 2, "location": ["AL", "CA"],
+                      "mmwr_week": [number, number], "administered_dose1_recip": [10 * number, 20 * number],
+                      "administered_dose1_pop_pct": [1.5 * number, 2.5 * number]}).to_csv(
+            tmp_path / f"StateVaccineDataFile{number}.csv", index=False)
+    return tmp_path
+
+
+def countShardReads(monkeypatch):
+    reads = []
+    read_csv = pd.read_csv
+
+    def readAndCount(path, *args, **kwargs):
+        reads.append(path)
+        return read_csv(path, *args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", readAndCount)
+    return reads
+
+
+def test_combined_file_is_served_while_the_shards_are_unchanged(shard_folder, monkeypatch):
+    state_vaccine_df = readStateVaccinationShards(combined=True)
+    reads = countShardReads(monkeypatch)
+
+    pd.testing.assert_frame_equal(readStateVaccinationShards(combined=True), state_vaccine_df)
+    assert reads == []
+    assert list(state_vaccine_df.columns) == STATE_VACCINE_COLUMNS
+    assert state_vaccine_df["mmwr_week"].tolist() == [1, 1, 2, 2, 3, 3]
+
+
+def test_combined_file_is_built_again_when_a_shard_is_removed_or_renamed(shard_folder, monkeypatch):
+    readStateVaccinationShards(combined=True)
+    # The remaining shards are older than the combined file
+    (shard_folder / "StateVaccineDataFile3.csv").unlink()
+    assert readStateVaccinationShards(combined=True)["mmwr_week"].tolist() == [1, 1, 2, 2]
+
+    os.replace(shard_folder / "StateVaccineDataFile2.csv", shard_folder / "StateVaccineDataFile12.csv")
+    reads = countShardReads(monkeypatch)
+    assert readStateVaccinationShards(combined=True)["mmwr_week"].tolist() == [1, 1, 2, 2]
+    assert sorted(path.name for path in reads) == ["StateVaccineDataFile1.csv", "StateVaccineDataFile12.csv"]
+
+
+def test_shards_are_not_kept_in_the_source_registry(shard_folder):
+    readStateVaccinationShards()
+    assert not [source for source in getSourceCacheStats() if "StateVaccineDataFile" in source]
@@ -0,0 +1,112 @@
+import json
+import threading
+from pathlib import Path
+
+import altair as alt
+import pandas as pd
+import pytest
+
+from Visualization.VizCache import cachedChart, clearChartCache, getChartCacheStats
+from Visualization.VizData import chartToSpec, enableDataTransformer
+from Visualization.VizPages import PAGE_CHARTS, buildDailyVaccinationChart
+
+THREADS = 8
+DataFolder = Path(__file__).resolve().parent.parent / "data"
+
+
+@cachedChart
+def createTestChart(df: pd.DataFrame, title: str):
+    points = alt.Chart(df).mark_point().encode(x="x:Q", y="y:Q", color="group:N")
+    lookup = alt.Chart(df).mark_line().encode(x="x:Q", y="total:Q").transform_lookup(
+        lookup="group", from_=alt.LookupData(df[["group", "y"]].rename(columns={"y": "total"}), "group", ["total"]))
+    return alt.layer(points, lookup).properties(title=title)
+
+
+@cachedChart
+def createChangingTestChart(df: pd.DataFrame):
+    df["y_center"] = df["y"] + 0.5
+    return alt.Chart(df).mark_point().encode(x="x:Q", y="y_center:Q")
+
+
+def getTestData(seed: int):
+    return pd.DataFrame({"x": range(50), "y": [(seed * value) % 7 for value in range(50)],
+                         "group": [f"g{(seed + value) % 3}" for value in range(50)]})
+
+
+def getDataReferences(spec):
+    if isinstance(spec, list):
+        return [reference for item in spec for reference in getDataReferences(item)]
+    if not isinstance(spec, dict):
+        return []
+    references = [spec["data"]] if isinstance(spec.get("data"), dict) else []
+    return references + [reference for key, value in spec.items() if key != "datasets"
+                         for reference in getDataReferences(value)]
+
+
+def test_concurrent_specs_are_compiled_with_the_content_names(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    enableDataTransformer()
+    data = [getTestData(seed) for seed in range(THREADS)]
+    barrier = threading.Barrier(THREADS)
+    specs = [[] for _ in range(THREADS)]
+    errors = []
+
+    def render(index):
+        try:
+            barrier.wait()
+            for repeat in range(10):
+                # A new chart of the same data on odd repeats, the cached one on even repeats
+                df = data[index].copy() if repeat % 2 else data[index]
+                specs[index].append(chartToSpec(createTestChart(df, f"chart {index}")))
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=render, args=(index,)) for index in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert alt.data_transformers.active == "compact_json"
+    for index in range(THREADS):
+        expected = json.dumps(chartToSpec(createTestChart(getTestData(index), f"chart {index}")), sort_keys=True)
+        for spec in specs[index]:
+            assert json.dumps(spec, sort_keys=True) == expected
+            # No dataset referenced by URL instead of its content name
+            references = getDataReferences(spec)
+            assert references and all(set(reference) == {"name"} for reference in references)
+            assert {reference["name"] for reference in references} <= set(spec["datasets"])
+
+
+def test_same_chart_built_twice_is_served_from_the_cache(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    clearChartCache()
+    before = getChartCacheStats()
+    charts = [buildDailyVaccinationChart(DataFolder) for _ in range(3)]
+    after = getChartCacheStats()
+
+    assert (after["misses"] - before["misses"], after["hits"] - before["hits"]) == (1, 2)
+    assert after["entries"] == 1
+    assert charts[1] is charts[0] and charts[2] is charts[0]
+
+
+def test_factory_changing_its_arguments_is_cached_after_the_change():
+    clearChartCache()
+    df = getTestData(1)
+    with pytest.warns(UserWarning, match="createChangingTestChart modified its dataframe arguments"):
+        chart = createChangingTestChart(df)
+
+    assert createChangingTestChart(df) is chart
+    assert getChartCacheStats()["entries"] == 1
+
+
+@pytest.mark.parametrize("chart_name", sorted(PAGE_CHARTS))
+def test_rebuilt_page_chart_has_the_same_spec(chart_name, tmp_path, monkeypatch):
+    # The generated names of unnamed selections change with every chart built, and with them the spec
+    monkeypatch.chdir(tmp_path)
+    specs = []
+    for _ in range(2):
+        clearChartCache()
+        specs.append(json.dumps(chartToSpec(PAGE_CHARTS[chart_name](DataFolder)), sort_keys=True))
+    assert specs[1] == specs[0]